@@ -0,0 +1,79 @@
+"""
+Compare polling every TEMP_$(INPUT) and RAW_VOLT_$(INPUT) channel of a running Lksh336 emulator
+with one command per request (as the IOC does today) against one compound request per scan.
+
+Start the emulator first, e.g.:
+    lewis -a . -k lewis_emulators Lksh336 -p "stream: {port: 57677}"
+
+Then run from the system_tests directory:
+    python -m benchmarks.batched_polling --port 57677
+"""
+
+import argparse
+import time
+
+from .line_client import LineClient
+
+INPUTS = ["A", "B", "C", "D"]
+
+
+def single_scan(client, inputs):
+    """
+    Poll every channel with one request each, as the getKRDG/getSRDG protocols do.
+    """
+    for command in ("KRDG?", "SRDG?"):
+        for input in inputs:
+            client.query(f"{command} {input}")
+
+
+def batched_scan(client, inputs):
+    """
+    Poll every channel with a single compound request.
+    """
+    client.query(
+        ";".join(f"{command} {input}" for command in ("KRDG?", "SRDG?") for input in inputs)
+    )
+
+
+def run(client, scan, inputs, duration):
+    """
+    Run a scan function repeatedly for the given duration.
+
+    Returns:
+        tuple of the number of scans completed and the elapsed time in seconds
+    """
+    scans = 0
+    start = time.perf_counter()
+    end = start + duration
+    while time.perf_counter() < end:
+        scan(client, inputs)
+        scans += 1
+    return scans, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--host", default="localhost", help="Emulator host")
+    parser.add_argument("--port", type=int, required=True, help="Emulator stream port")
+    parser.add_argument("--duration", type=float, default=5.0, help="Seconds to run each mode")
+    parser.add_argument("--inputs", nargs="+", default=INPUTS, help="Inputs to poll")
+    args = parser.parse_args()
+
+    client = LineClient(args.host, args.port)
+    try:
+        channels = 2 * len(args.inputs)
+        for name, scan in (("single", single_scan), ("batched", batched_scan)):
+            scans, elapsed = run(client, scan, args.inputs, args.duration)
+            print(
+                f"{name:>8}: {scans / elapsed:10.1f} scans/s "
+                f"{scans * channels / elapsed:10.1f} channels/s "
+                f"{1000.0 * elapsed / scans:8.3f} ms/scan"
+            )
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Measure uploading a sensor calibration curve to a running Lksh336 emulator (or a controller),
+comparing one CRVPT request per breakpoint with compound requests of several breakpoints.
+Every breakpoint is read back with CRVPT? to verify the upload.
+
+Start the emulator first, e.g. from the system_tests directory:
+    lewis -a . -k lewis_emulators Lksh336 -p "stream: {port: 57677}"
+
+Then run from the system_tests directory:
+    python -m benchmarks.curve_upload --port 57677 --curve 21
+"""
+
+import argparse
+import time
+
+from .line_client import LineClient
+
+MAX_CURVE_POINTS = 200
+
+
+def calibration(num_points):
+    """
+    Make a monotonic stand-in calibration of sensor units against temperature.
+
+    Returns:
+        list of (units, temperature) tuples
+    """
+    return [
+        (round(0.09 + 1.5 * index / num_points, 5), round(500.0 - 495.0 * index / num_points, 3))
+        for index in range(num_points)
+    ]
+
+
+def upload(client, curve, points, batch_size):
+    """
+    Upload and verify a curve with batch_size breakpoints per request line.
+
+    Returns:
+        number of breakpoints which did not read back as written
+    """
+    mismatches = 0
+    client.write(f"CRVHDR {curve},STANDIN,BENCH,2,500.0,1")
+    for start in range(0, len(points), batch_size):
+        batch = list(enumerate(points[start : start + batch_size], start + 1))
+        commands = [f"CRVPT {curve},{index},{units},{temp}" for index, (units, temp) in batch]
+        commands += [f"CRVPT? {curve},{index}" for index, _ in batch]
+        replies = client.query(";".join(commands)).split(";")
+        for (_, (units, temperature)), reply in zip(batch, replies):
+            read_units, read_temperature = (float(value) for value in reply.split(","))
+            if read_units != units or read_temperature != temperature:
+                mismatches += 1
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--host", default="localhost", help="Device host")
+    parser.add_argument("--port", type=int, required=True, help="Device stream port")
+    parser.add_argument("--curve", type=int, default=21, help="User curve to overwrite")
+    parser.add_argument("--points", type=int, default=MAX_CURVE_POINTS, help="Breakpoints")
+    parser.add_argument(
+        "--batch-sizes", type=int, nargs="+", default=[1, 5, 20], help="Breakpoints per line"
+    )
+    args = parser.parse_args()
+
+    points = calibration(args.points)
+    client = LineClient(args.host, args.port, timeout=5.0)
+    try:
+        for batch_size in args.batch_sizes:
+            start = time.perf_counter()
+            mismatches = upload(client, args.curve, points, batch_size)
+            elapsed = time.perf_counter() - start
+            print(
+                f"{batch_size:4d} per line: {elapsed:8.3f} s "
+                f"{len(points) / elapsed:10.1f} points/s {mismatches} mismatches"
+            )
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+"""
+Reader of the IOC's database templates, which works out the records an IOC loads and the
+StreamDevice protocols its scanned records poll.
+"""
+
+import os
+import re
+
+# The support module's database templates.
+DB_DIRECTORY = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "..", "lakeshore336App", "Db"
+)
+
+OUTPUTS = [1, 2, 3, 4]
+INPUTS = ["A", "B", "C", "D"]
+SCANNER_INPUTS = ["D2", "D3", "D4", "D5"]
+
+_TOKEN = re.compile(r'\s+|#[^\n]*|"((?:[^"\\]|\\.)*)"|([(){},])|([^\s(){},"#]+)', re.DOTALL)
+_MACRO = re.compile(r"\$\((\w+)(?:=([^$()]*))?\)|\$\{(\w+)(?:=([^${}]*))?\}")
+_PERIODIC_SCAN = re.compile(r"^\s*([\d.]+)\s+seconds?\s*$")
+_STREAM_LINK = re.compile(r"^@(\S+)\s+(\w+)(?:\(([^)]*)\))?\s+(\S+)(?:\s+(\S+))?")
+
+
+class Record(object):
+    __slots__ = ("type", "name", "fields")
+
+    def __init__(self, type, name, fields):
+        self.type = type
+        self.name = name
+        self.fields = fields
+
+    @property
+    def scan_period(self):
+        """
+        Seconds between scans of the record, or None if it is not scanned periodically.
+        """
+        match = _PERIODIC_SCAN.match(self.fields.get("SCAN", ""))
+        return float(match.group(1)) if match else None
+
+    @property
+    def stream_link(self):
+        """
+        (protocol file, protocol, list of arguments, port) of the record's StreamDevice link, or
+        None if the record does not talk to the device.
+        """
+        if self.fields.get("DTYP") != "stream":
+            return None
+        link = self.fields.get("INP") or self.fields.get("OUT") or ""
+        match = _STREAM_LINK.match(link)
+        if match is None:
+            return None
+        protocol_file, protocol, arguments, port, _ = match.groups()
+        arguments = [argument.strip() for argument in arguments.split(",")] if arguments else []
+        return protocol_file, protocol, arguments, port
+
+
+def expand_macros(text, macros):
+    """
+    Args:
+        text: text with $(NAME) or $(NAME=default) macros, which may be nested
+        macros: dict of the macro values
+
+    Returns:
+        the text with the macros replaced; macros without a value or default are left in
+    """
+
+    def replace(match):
+        name = match.group(1) or match.group(3)
+        default = match.group(2) if match.group(1) else match.group(4)
+        if name in macros:
+            return str(macros[name])
+        return default if default is not None else match.group(0).replace("$", "\0")
+
+    while True:
+        expanded = _MACRO.sub(replace, text)
+        if expanded == text:
+            return expanded.replace("\0", "$")
+        text = expanded
+
+
+def _tokens(text):
+    for match in _TOKEN.finditer(text):
+        string, punctuation, word = match.groups()
+        if string is not None:
+            yield string
+        elif punctuation is not None or word is not None:
+            yield punctuation or word
+
+
+def _parse_substitutions(text, macros):
+    substitutions = {}
+    for assignment in text.split(","):
+        name, equals, value = assignment.partition("=")
+        if equals:
+            substitutions[name.strip()] = expand_macros(value.strip(), macros)
+    return substitutions
+
+
+def read_template(path, macros):
+    """
+    Read the records of a template, following its include and substitute statements as msi does.
+
+    Args:
+        path: path of the template file
+        macros: dict of the macro values
+
+    Returns:
+        list of the Records, with their names and fields expanded
+    """
+    with open(path) as template_file:
+        tokens = _tokens(template_file.read())
+    macros = dict(macros)
+    records = []
+    for token in tokens:
+        if token in ("record", "grecord"):
+            _, type, _, name, _, _ = [next(tokens) for _ in range(6)]
+            fields = {}
+            for keyword in tokens:
+                if keyword == "}":
+                    break
+                arguments = []
+                for token in tokens:
+                    if token == ")":
+                        break
+                    if token not in ("(", ","):
+                        arguments.append(token)
+                if keyword == "field" and len(arguments) == 2:
+                    fields[arguments[0]] = expand_macros(arguments[1], macros)
+            records.append(Record(type, expand_macros(name, macros), fields))
+        elif token == "substitute":
+            macros.update(_parse_substitutions(next(tokens), macros))
+        elif token == "include":
+            included = os.path.join(os.path.dirname(path), expand_macros(next(tokens), macros))
+            records.extend(read_template(included, macros))
+    return records
+
+
+def _braced(tokens):
+    """
+    Collect the tokens up to the closing brace, split into comma separated items.
+    """
+    items = [[]]
+    for token in tokens:
+        if token == "}":
+            break
+        if token == ",":
+            items.append([])
+        else:
+            items[-1].append(token)
+    return ["".join(item) for item in items if item]
+
+
+def read_substitutions(path):
+    """
+    Read the template instances of a substitutions file, in either of msi's forms:
+        file lakeshore336.template { pattern {P, PORT} {LS, L0} }
+        file lakeshore336.template { {P=LS, PORT=L0} }
+
+    Args:
+        path: path of the substitutions file
+
+    Returns:
+        list of (template file name, macros)
+    """
+    with open(path) as substitutions_file:
+        tokens = _tokens(substitutions_file.read())
+    global_macros = {}
+    instances = []
+    for token in tokens:
+        if token == "global":
+            next(tokens)
+            for item in _braced(tokens):
+                name, _, value = item.partition("=")
+                global_macros[name] = value
+        elif token == "file":
+            template = next(tokens)
+            next(tokens)
+            names = None
+            for token in tokens:
+                if token == "}":
+                    break
+                if token == "pattern":
+                    next(tokens)
+                    names = _braced(tokens)
+                elif token == "{":
+                    items = _braced(tokens)
+                    if names is not None:
+                        macros = dict(zip(names, items))
+                    else:
+                        macros = dict(item.partition("=")[::2] for item in items)
+                    instances.append((template, dict(global_macros, **macros)))
+    return instances
+
+
+def ioc_templates(prefix, port, scan, tempscan, outputs=OUTPUTS, scanner_inputs=()):
+    """
+    The templates an IOC for one controller loads and their macros.
+
+    Args:
+        prefix: PV prefix of the IOC's records, the P macro
+        port: asyn port of the controller, the PORT macro
+        scan: seconds between scans of the settings, the SCAN macro
+        tempscan: seconds between scans of the readings, the TEMPSCAN macro
+        outputs: numbers of the outputs loaded
+        scanner_inputs: the 3062 option's inputs polled (D2 to D5), if it is fitted
+
+    Returns:
+        list of (template file name, macros)
+    """
+    macros = {"P": prefix, "PORT": port, "ADDR": 0, "SCAN": scan, "TEMPSCAN": tempscan}
+    templates = [("lakeshore336.template", macros)]
+    for input in INPUTS + list(scanner_inputs):
+        templates.append(("lakeshore_input.template", dict(macros, INPUT=input, INDEX=input)))
+    for output in outputs:
+        output_macros = dict(macros, OUT=output)
+        templates.append(("lakeshore336output.template", output_macros))
+        if output <= 2:
+            templates.append(("lakeshore336loop.template", dict(output_macros, CMD="getHTR")))
+        else:
+            templates.append(("lakeshore336analog.template", output_macros))
+    return templates
+
+
+def read_ioc(templates, directory=DB_DIRECTORY):
+    """
+    Args:
+        templates: list of (template file name, macros), as ioc_templates gives
+        directory: directory of the templates
+
+    Returns:
+        list of the Records the IOC loads
+    """
+    records = []
+    for template, macros in templates:
+        records.extend(read_template(os.path.join(directory, template), macros))
+    return records
+
+
+def polled_records(records, protocol_file="ls336.proto"):
+    """
+    Args:
+        records: the Records of an IOC
+        protocol_file: name of the protocol file of the controller's records
+
+    Returns:
+        list of (record, seconds between scans, protocol, arguments) of the records the IOC
+        polls the controller with, in the order they are loaded
+    """
+    polled = []
+    for record in records:
+        period = record.scan_period
+        link = record.stream_link
+        if period is not None and link is not None and link[0] == protocol_file:
+            polled.append((record, period, link[1], link[2]))
+    return polled
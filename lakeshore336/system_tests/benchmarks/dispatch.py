@@ -0,0 +1,82 @@
+"""
+Measure how many requests per second the Lksh336 stream interface can dispatch, comparing
+Lewis' linear search over every command's regular expression with the mnemonic index and with
+the index of the protocol file's whole requests.
+
+Run from the system_tests directory:
+    python -m benchmarks.dispatch
+"""
+
+import argparse
+import time
+
+from lewis_emulators.Lksh336 import SimulatedLksh336
+from lewis_emulators.Lksh336.interfaces import Lksh336StreamInterface
+
+# The requests issued by one scan of the input and output records.
+REQUESTS = (
+    [f"KRDG? {input}".encode() for input in "ABCD"]
+    + [f"SRDG? {input}".encode() for input in "ABCD"]
+    + [f"RDGST? {input}".encode() for input in "ABCD"]
+    + [f"{command} {output}".encode() for command in ("SETP?", "RANGE?") for output in range(1, 5)]
+    + [f"{command} {output}".encode() for command in ("RAMP?", "MOUT?") for output in range(1, 5)]
+    + [f"{command} {output}".encode() for command in ("PID?", "OUTMODE?") for output in range(1, 5)]
+    + [b"HTR? 1", b"HTR? 2", b"AOUT? 3", b"AOUT? 4", b"HTRST? 1", b"HTRST? 2"]
+    + [f"ALARM? {input}".encode() for input in "ABCD"]
+    + [f"INTYPE? {input}".encode() for input in "ABCD"]
+)
+
+
+def linear_search(interface, request):
+    """
+    Dispatch a request the way Lewis does without an index.
+    """
+    commands = interface.bound_commands[1:]
+    cmd = next((cmd for cmd in commands if cmd.can_process(request)), None)
+    return cmd.process_request(request)
+
+
+def indexed(interface, request):
+    """
+    Dispatch a request through the interface's indexes.
+    """
+    return interface.dispatch(request)
+
+
+def measure(interface, dispatch, repeats):
+    """
+    Returns:
+        requests dispatched per second
+    """
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for request in REQUESTS:
+            dispatch(interface, request)
+    return repeats * len(REQUESTS) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--repeats", type=int, default=2000, help="Number of scans to dispatch")
+    args = parser.parse_args()
+
+    interface = Lksh336StreamInterface()
+    interface.device = SimulatedLksh336()
+    # Hide the index of whole requests from this interface, leaving the mnemonic index.
+    mnemonic_interface = Lksh336StreamInterface()
+    mnemonic_interface.device = interface.device
+    mnemonic_interface._commands_by_request = {}
+
+    for name, dispatch_interface, dispatch in (
+        ("linear", interface, linear_search),
+        ("mnemonic", mnemonic_interface, indexed),
+        ("request", interface, indexed),
+    ):
+        rate = measure(dispatch_interface, dispatch, args.repeats)
+        print(f"{name:>8}: {rate:12.0f} requests/s")
+
+
+if __name__ == "__main__":
+    main()
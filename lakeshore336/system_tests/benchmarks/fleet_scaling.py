@@ -0,0 +1,118 @@
+"""
+Measure the CPU and memory used by the Lksh336 fleet host as the number of simulated controllers
+grows, while every controller is polled like an IOC polls its temperatures. Linux only, as the
+host's usage is read from /proc.
+
+Run from the system_tests directory:
+    python -m benchmarks.fleet_scaling --devices 1 10 50 100
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+POLL_REQUEST = (
+    ";".join(f"{command} {input}" for command in ("KRDG?", "SRDG?") for input in "ABCD").encode()
+    + b"\r\n"
+)
+
+
+def cpu_seconds(pid):
+    """
+    Returns:
+        user plus system CPU time used by a process, in seconds
+    """
+    with open(f"/proc/{pid}/stat") as stat:
+        fields = stat.read().rpartition(")")[2].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def rss_megabytes(pid):
+    """
+    Returns:
+        resident memory of a process in MB
+    """
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024.0
+    return 0.0
+
+
+async def poll(host, port, rate, duration):
+    """
+    Poll one controller at the given rate for the duration.
+
+    Returns:
+        number of replies received
+    """
+    for _ in range(100):
+        try:
+            reader, writer = await asyncio.open_connection(host, port)
+            break
+        except OSError:
+            await asyncio.sleep(0.1)
+    else:
+        raise ConnectionError(f"Could not connect to port {port}")
+
+    replies = 0
+    end = time.monotonic() + duration
+    try:
+        while time.monotonic() < end:
+            writer.write(POLL_REQUEST)
+            await reader.readuntil(b"\r\n")
+            replies += 1
+            await asyncio.sleep(1.0 / rate)
+    finally:
+        writer.close()
+    return replies
+
+
+async def measure(num_devices, base_port, rate, duration):
+    host = await asyncio.create_subprocess_exec(
+        sys.executable,
+        "-m",
+        "lewis_emulators.Lksh336.fleet",
+        "--devices",
+        str(num_devices),
+        "--base-port",
+        str(base_port),
+        "--host",
+        "127.0.0.1",
+        "--thermal",
+    )
+    try:
+        # Wait for the host to come up before measuring.
+        await poll("127.0.0.1", base_port + num_devices - 1, rate, 0)
+        cpu_before = cpu_seconds(host.pid)
+        polls = [
+            poll("127.0.0.1", base_port + index, rate, duration) for index in range(num_devices)
+        ]
+        replies = sum(await asyncio.gather(*polls))
+        cpu = (cpu_seconds(host.pid) - cpu_before) / duration
+        return cpu, rss_megabytes(host.pid), replies / duration
+    finally:
+        host.terminate()
+        await host.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--devices", type=int, nargs="+", default=[1, 10, 50], help="Fleet sizes")
+    parser.add_argument("--base-port", type=int, default=57000, help="Port of the first device")
+    parser.add_argument("--rate", type=float, default=1.0, help="Polls per second per device")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds to measure")
+    args = parser.parse_args()
+
+    print(f"{'devices':>8} {'cpu %':>8} {'rss MB':>8} {'polls/s':>10}")
+    for num_devices in args.devices:
+        cpu, rss, rate = asyncio.run(measure(num_devices, args.base_port, args.rate, args.duration))
+        print(f"{num_devices:8d} {100 * cpu:8.1f} {rss:8.1f} {rate:10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+import socket
+
+TERMINATOR = b"\r\n"
+
+
+class LineClient(object):
+    """
+    Minimal blocking client for a line based stream device.
+    """
+
+    def __init__(self, host, port, timeout=1.0):
+        self._socket = socket.create_connection((host, port), timeout=timeout)
+        self._socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._buffer = b""
+
+    def write(self, request):
+        self._socket.sendall(request.encode() + TERMINATOR)
+
+    def query(self, request):
+        self.write(request)
+        return self._read_line()
+
+    def read_unexpected(self, timeout):
+        """
+        Read a reply to a request which should not have one, waiting at most timeout seconds for
+        it to arrive.
+
+        Returns:
+            the reply, or None if nothing arrived
+        """
+        if TERMINATOR not in self._buffer:
+            previous_timeout = self._socket.gettimeout()
+            self._socket.settimeout(timeout)
+            try:
+                self._receive()
+            except (TimeoutError, BlockingIOError):
+                return None
+            finally:
+                self._socket.settimeout(previous_timeout)
+        return self._read_line()
+
+    def _receive(self):
+        data = self._socket.recv(4096)
+        if not data:
+            raise ConnectionError("Connection closed by the device")
+        self._buffer += data
+
+    def _read_line(self):
+        while TERMINATOR not in self._buffer:
+            self._receive()
+        reply, self._buffer = self._buffer.split(TERMINATOR, 1)
+        return reply.decode()
+
+    def close(self):
+        self._socket.close()
@@ -0,0 +1,257 @@
+"""
+Generate the polling load of one or more Lksh336 IOCs against an emulator or a controller,
+without starting any IOC. The records each IOC scans periodically and the requests they send are
+read from the IOC's database templates and ls336.proto, then each simulated IOC scans them on its
+own connection as StreamDevice would: one request at a time per asyn port, each waiting up to
+the protocol's ReplyTimeout, and a record still waiting for its last reply skips its next scan.
+
+Start an emulator (or a fleet of them) first, e.g. from the system_tests directory:
+    lewis -a . -k lewis_emulators Lksh336 -p "async_stream: {port: 57677}"
+    python -m lewis_emulators.Lksh336.fleet --devices 20 --base-port 57000
+
+Then run from the system_tests directory, e.g. for 20 IOCs polling one emulator, or one each:
+    python -m benchmarks.load_generator localhost:57677 --iocs 20 --duration 30
+    python -m benchmarks.load_generator localhost:57000 --iocs 20 --port-stride 1
+"""
+
+import argparse
+import asyncio
+import random
+from collections import defaultdict
+
+from lewis_emulators.Lksh336.stream_protocol import format_output, read_protocol, unescape
+
+from .db_templates import SCANNER_INPUTS, ioc_templates, polled_records, read_ioc
+from .reply_latency import percentile, print_histogram
+
+
+class PolledRecord(object):
+    """
+    A record an IOC scans periodically, with the request it sends and its statistics.
+    """
+
+    __slots__ = (
+        "name",
+        "protocol",
+        "period",
+        "request",
+        "reply_timeout",
+        "busy",
+        "scans",
+        "skipped_scans",
+        "timeouts",
+        "latencies",
+    )
+
+    def __init__(self, name, protocol, period, request, reply_timeout):
+        self.name = name
+        self.protocol = protocol
+        self.period = period
+        self.request = request
+        self.reply_timeout = reply_timeout
+        self.busy = False
+        self.scans = 0
+        self.skipped_scans = 0
+        self.timeouts = 0
+        # Seconds from each scan to the reply, including the time queued behind other records.
+        self.latencies = []
+
+
+def poll_schedule(protocol_file, prefix, scan, tempscan, scanner_inputs=()):
+    """
+    Args:
+        protocol_file: the parsed ls336.proto
+        prefix: PV prefix of the IOC
+        scan: the IOC's SCAN macro, in seconds
+        tempscan: the IOC's TEMPSCAN macro, in seconds
+        scanner_inputs: the 3062 option's inputs polled
+
+    Returns:
+        list of the PolledRecords of the IOC, in the order it loads them
+    """
+    templates = ioc_templates(prefix, "L0", scan, tempscan, scanner_inputs=scanner_inputs)
+    schedule = []
+    for record, period, protocol, arguments in polled_records(read_ioc(templates)):
+        out_format = protocol_file.functions[protocol].out_format
+        if out_format is not None:
+            request = format_output(out_format, arguments)
+            timeout = protocol_file.reply_timeout(protocol)
+            schedule.append(PolledRecord(record.name, protocol, period, request, timeout))
+    return schedule
+
+
+class SimulatedIoc(object):
+    """
+    Polls a controller with the scanned records of one IOC over one connection.
+    """
+
+    def __init__(self, records, host, port, terminator, phase):
+        """
+        Args:
+            records: the IOC's PolledRecords
+            host: address of the controller
+            port: port of the controller
+            terminator: line terminator, as bytes
+            phase: seconds to wait before the first scan, so IOCs do not scan in step
+        """
+        self.records = records
+        self.host = host
+        self.port = port
+        self.terminator = terminator
+        self.phase = phase
+        self.requests = 0
+        self._queue = asyncio.Queue()
+
+    async def _scan(self, period, records):
+        loop = asyncio.get_running_loop()
+        next_scan = loop.time() + self.phase
+        while True:
+            await asyncio.sleep(max(0.0, next_scan - loop.time()))
+            now = loop.time()
+            for record in records:
+                record.scans += 1
+                if record.busy:
+                    record.skipped_scans += 1
+                else:
+                    record.busy = True
+                    self._queue.put_nowait((record, now))
+            next_scan += period
+
+    async def _poll(self, reader, writer):
+        loop = asyncio.get_running_loop()
+        flush = False
+        while True:
+            record, scan_time = await self._queue.get()
+            if flush:
+                # Throw away replies which arrived after their request timed out.
+                while True:
+                    try:
+                        await asyncio.wait_for(reader.readuntil(self.terminator), 0.001)
+                    except TimeoutError:
+                        break
+                flush = False
+            writer.write(record.request.encode() + self.terminator)
+            self.requests += 1
+            try:
+                await asyncio.wait_for(reader.readuntil(self.terminator), record.reply_timeout)
+                record.latencies.append(loop.time() - scan_time)
+            except TimeoutError:
+                record.timeouts += 1
+                flush = True
+            record.busy = False
+
+    async def run(self, duration):
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        records_by_period = defaultdict(list)
+        for record in self.records:
+            records_by_period[record.period].append(record)
+        tasks = [asyncio.ensure_future(self._poll(reader, writer))]
+        tasks.extend(
+            asyncio.ensure_future(self._scan(period, records))
+            for period, records in records_by_period.items()
+        )
+        try:
+            await asyncio.sleep(duration)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            writer.close()
+
+
+def print_report(iocs, duration):
+    scheduled_rate = sum(1.0 / record.period for ioc in iocs for record in ioc.records)
+    requests = sum(ioc.requests for ioc in iocs)
+    print(
+        f"{len(iocs)} IOCs: {scheduled_rate:.1f} requests/s scheduled, "
+        f"{requests / duration:.1f} requests/s sent"
+    )
+
+    by_protocol = defaultdict(list)
+    for ioc in iocs:
+        for record in ioc.records:
+            by_protocol[(record.period, record.protocol)].append(record)
+    print(
+        f"{'protocol':>14} {'period':>7} {'records':>8} {'scans':>7} {'skipped':>8} "
+        f"{'timeouts':>9} {'p50 ms':>8} {'p99 ms':>8}"
+    )
+    latencies = []
+    for (period, protocol), records in sorted(by_protocol.items()):
+        protocol_latencies = sorted(
+            1000.0 * latency for record in records for latency in record.latencies
+        )
+        latencies.extend(protocol_latencies)
+        p50, p99 = (
+            (percentile(protocol_latencies, 0.5), percentile(protocol_latencies, 0.99))
+            if protocol_latencies
+            else (float("nan"), float("nan"))
+        )
+        print(
+            f"{protocol:>14} {period:>6g}s {len(records):>8} "
+            f"{sum(record.scans for record in records):>7} "
+            f"{sum(record.skipped_scans for record in records):>8} "
+            f"{sum(record.timeouts for record in records):>9} {p50:>8.2f} {p99:>8.2f}"
+        )
+    if latencies:
+        latencies.sort()
+        print("Scan to reply latency:")
+        print_histogram(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("target", help="Controller or first emulator to poll as host:port")
+    parser.add_argument("--iocs", type=int, default=1, help="Number of IOCs to simulate")
+    parser.add_argument(
+        "--port-stride",
+        type=int,
+        default=0,
+        help="Port step between the IOCs' targets, 0 for all to poll the same one",
+    )
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds to poll for")
+    parser.add_argument("--scan", type=float, default=5.0, help="The IOCs' SCAN macro")
+    parser.add_argument("--tempscan", type=float, default=1.0, help="The IOCs' TEMPSCAN macro")
+    parser.add_argument(
+        "--scanner-inputs",
+        nargs="*",
+        default=[],
+        choices=SCANNER_INPUTS,
+        help="Inputs of the 3062 option to poll",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the IOCs' scan phases")
+    parser.add_argument("--show-schedule", action="store_true", help="Print each IOC's records")
+    args = parser.parse_args()
+
+    protocol_file = read_protocol()
+    terminator = unescape(protocol_file.variables.get("Terminator", r"\r\n")).encode()
+    host, _, port = args.target.rpartition(":")
+    host = host or "localhost"
+    phases = random.Random(args.seed)
+
+    iocs = []
+    for index in range(args.iocs):
+        prefix = f"LKSH336_{index + 1:02d}"
+        records = poll_schedule(
+            protocol_file, prefix, args.scan, args.tempscan, args.scanner_inputs
+        )
+        phase = phases.uniform(0.0, min(record.period for record in records))
+        ioc_port = int(port) + index * args.port_stride
+        iocs.append(SimulatedIoc(records, host, ioc_port, terminator, phase))
+
+    if args.show_schedule:
+        for record in iocs[0].records:
+            print(
+                f"{record.period:>6g}s {record.protocol:>14} {record.request!r:<20} {record.name}"
+            )
+
+    async def run():
+        await asyncio.gather(*(ioc.run(args.duration) for ioc in iocs))
+
+    asyncio.run(run())
+    print_report(iocs, args.duration)
+
+
+if __name__ == "__main__":
+    main()
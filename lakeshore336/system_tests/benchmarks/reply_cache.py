@@ -0,0 +1,99 @@
+"""
+Measure how fast the Lksh336 emulator answers the requests of the records scanned at the $(SCAN)
+rate, with the preformatted replies cached and with every reply formatted afresh.
+
+Run from the system_tests directory:
+    python -m benchmarks.reply_cache
+"""
+
+import argparse
+import contextlib
+import time
+
+from lewis_emulators.Lksh336 import SimulatedLksh336
+from lewis_emulators.Lksh336.interfaces import Lksh336StreamInterface
+from lewis_emulators.Lksh336.reply_cache import ReplyCache
+
+# The requests of one scan of the records with SCAN "$(SCAN) second".
+OUTPUT_COMMANDS = ("RAMP?", "RANGE?", "MOUT?", "PID?", "OUTMODE?")
+INPUT_COMMANDS = ("ALARMST?", "ALARM?", "INCRV?", "INTYPE?")
+REQUESTS = (
+    [f"{command} {output}".encode() for command in OUTPUT_COMMANDS for output in range(1, 5)]
+    + [f"{command} {input}".encode() for command in INPUT_COMMANDS for input in "ABCD"]
+    + [b"HTRST? 1", b"HTRST? 2", b"AOUT? 3", b"AOUT? 4"]
+)
+
+# The device getters of the multi-field replies and the channels they are polled for.
+GETTERS = [
+    (("get_output_ramp", "get_pid", "get_output_mode"), range(1, 5)),
+    (("get_input_alarm_status", "get_input_alarm", "get_input_type"), "ABCD"),
+]
+
+
+@contextlib.contextmanager
+def uncached_replies():
+    """
+    Format every reply afresh while in the context, as the device did before the cache.
+    """
+    cached_reply = ReplyCache.reply
+    ReplyCache.reply = lambda channel, name: channel.REPLY_FORMATS[name].format(channel)
+    try:
+        yield
+    finally:
+        ReplyCache.reply = cached_reply
+
+
+def measure_dispatch(interface, repeats):
+    """
+    Returns:
+        requests dispatched per second
+    """
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for request in REQUESTS:
+            interface.dispatch(request)
+    return repeats * len(REQUESTS) / (time.perf_counter() - start)
+
+
+def measure_getters(device, repeats):
+    """
+    Returns:
+        multi-field replies produced per second
+    """
+    calls = [
+        (getattr(device, getter), channel)
+        for getters, channels in GETTERS
+        for getter in getters
+        for channel in channels
+    ]
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for getter, channel in calls:
+            getter(channel)
+    return repeats * len(calls) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--repeats", type=int, default=2000, help="Number of scans to dispatch")
+    args = parser.parse_args()
+
+    interface = Lksh336StreamInterface()
+    interface.device = SimulatedLksh336()
+    interface.device.set_pid(1, 50.0, 20.0, 1.5)
+    interface.device.set_input_alarm("A", 1, 300.0, 1.5, 0.5, 0, 1, 1)
+
+    for name, context in (("formatted", uncached_replies), ("cached", contextlib.nullcontext)):
+        with context():
+            dispatch_rate = measure_dispatch(interface, args.repeats)
+            getter_rate = measure_getters(interface.device, args.repeats)
+        print(
+            f"{name:>10}: {dispatch_rate:10.0f} scan requests/s "
+            f"{getter_rate:10.0f} multi-field replies/s"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Measure the reply latency of one or more running Lksh336 emulators and print a histogram of it,
+e.g. to compare Lewis' stream adapter with the async_stream adapter.
+
+Start the emulators first, e.g. from the system_tests directory:
+    lewis -a . -k lewis_emulators Lksh336 -p "stream: {port: 57677}"
+    lewis -a . -k lewis_emulators Lksh336 -p "async_stream: {port: 57678}"
+
+Then run from the system_tests directory:
+    python -m benchmarks.reply_latency stream=localhost:57677 async_stream=localhost:57678
+"""
+
+import argparse
+import math
+import time
+
+from .line_client import LineClient
+
+# Histogram bucket upper bounds in ms, doubling from 1/16 ms.
+BUCKETS = [2.0**power for power in range(-4, 11)]
+BAR_WIDTH = 50
+
+
+def measure(client, request, count):
+    """
+    Returns:
+        sorted list of reply latencies in ms
+    """
+    latencies = []
+    for _ in range(count):
+        start = time.perf_counter()
+        client.query(request)
+        latencies.append(1000.0 * (time.perf_counter() - start))
+    return sorted(latencies)
+
+
+def percentile(latencies, fraction):
+    return latencies[min(len(latencies) - 1, math.ceil(fraction * len(latencies)) - 1)]
+
+
+def print_histogram(latencies):
+    counts = [0] * (len(BUCKETS) + 1)
+    for latency in latencies:
+        counts[next((i for i, bound in enumerate(BUCKETS) if latency <= bound), len(BUCKETS))] += 1
+    largest = max(counts)
+    for index, count in enumerate(counts):
+        if count:
+            label = f"<= {BUCKETS[index]:g} ms" if index < len(BUCKETS) else f"> {BUCKETS[-1]:g} ms"
+            print(f"{label:>14} {count:7d} {'#' * max(1, BAR_WIDTH * count // largest)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("targets", nargs="+", help="Emulators to measure as label=host:port")
+    parser.add_argument("--count", type=int, default=1000, help="Requests per emulator")
+    parser.add_argument("--request", default="KRDG? A", help="Request to send")
+    args = parser.parse_args()
+
+    for target in args.targets:
+        label, _, address = target.rpartition("=")
+        host, _, port = address.rpartition(":")
+        client = LineClient(host or "localhost", int(port))
+        try:
+            latencies = measure(client, args.request, args.count)
+        finally:
+            client.close()
+
+        print(
+            f"{label or address}: p50 {percentile(latencies, 0.5):.3f} ms "
+            f"p99 {percentile(latencies, 0.99):.3f} ms max {latencies[-1]:.3f} ms"
+        )
+        print_histogram(latencies)
+
+
+if __name__ == "__main__":
+    main()
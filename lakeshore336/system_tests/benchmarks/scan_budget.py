@@ -0,0 +1,329 @@
+"""
+Work out the polling load an IOC's configuration puts on each asyn port from the database
+templates and ls336.proto, flag ports the controller can not keep up with and suggest requests
+which could be consolidated.
+
+For each port it reports the requests and bytes per second of the periodically scanned records,
+the share of the controller's time they take, the longest a record waits for its reply when
+every scan falls due at once, and the same when the controller does not answer and every request
+waits out its ReplyTimeout. The controller's time per request is the serial timing model's: its
+command processing time plus the request and reply at the link's baud rate.
+
+Run from the system_tests directory, either for an IOC laid out as the system tests' one:
+    python -m benchmarks.scan_budget --scan 5 --tempscan 1 --scanner-inputs D2 D3
+or for the template instances of a substitutions file:
+    python -m benchmarks.scan_budget --substitutions ioc.substitutions
+
+The exit status is 1 if any port is overloaded, so it can gate a configuration change.
+"""
+
+import argparse
+import os
+import sys
+from collections import defaultdict
+
+from lewis_emulators.Lksh336.stream_protocol import (
+    CONVERSION,
+    format_output,
+    read_protocol,
+    unescape,
+)
+from lewis_emulators.Lksh336.timing import SerialTimingModel
+
+from .db_templates import (
+    DB_DIRECTORY,
+    OUTPUTS,
+    SCANNER_INPUTS,
+    ioc_templates,
+    polled_records,
+    read_ioc,
+    read_substitutions,
+)
+
+# Characters of a reply field when its format gives no width, as the 336 formats them (e.g.
+# "+273.150" for a reading).
+FIELD_WIDTHS = {"d": 1, "i": 1, "u": 1, "x": 2, "f": 8, "e": 12, "g": 8, "s": 15, "c": 1}
+
+# Share of the controller's time above which a port is reported as close to its capacity.
+WARNING_UTILISATION = 0.7
+
+
+def reply_length(in_format):
+    """
+    Args:
+        in_format: the protocol's input format, e.g. "%d,%(\\$2)d"
+
+    Returns:
+        the expected length of the reply without terminator
+    """
+    length = 0
+    position = 0
+    for match in CONVERSION.finditer(in_format):
+        length += len(unescape(in_format[position : match.start()]))
+        position = match.end()
+        if match.group(0) == "%%":
+            length += 1
+        else:
+            width = match.group(3)
+            length += int(width) if width else FIELD_WIDTHS.get(match.group(5), 1)
+    return length + len(unescape(in_format[position:]))
+
+
+class PortBudget(object):
+    """
+    The scanned requests of one asyn port and the controller time they need.
+    """
+
+    def __init__(self, port):
+        self.port = port
+        # (record name, protocol, request, seconds between scans, seconds of controller time,
+        # bytes sent and received, reply timeout).
+        self.requests = []
+
+    def add(self, name, protocol, request, period, service_time, num_bytes, reply_timeout):
+        self.requests.append(
+            (name, protocol, request, period, service_time, num_bytes, reply_timeout)
+        )
+
+    @property
+    def request_rate(self):
+        return sum(1.0 / period for _, _, _, period, _, _, _ in self.requests)
+
+    @property
+    def byte_rate(self):
+        return sum(num_bytes / period for _, _, _, period, _, num_bytes, _ in self.requests)
+
+    @property
+    def utilisation(self):
+        """
+        Share of the controller's time the scans take; above 1 the controller falls behind.
+        """
+        return sum(service / period for _, _, _, period, service, _, _ in self.requests)
+
+    @property
+    def worst_case_wait(self):
+        """
+        Seconds the last record waits for its reply when every scan falls due at once.
+        """
+        return sum(service for _, _, _, _, service, _, _ in self.requests)
+
+    @property
+    def disconnected_wait(self):
+        """
+        Seconds the last record waits when no request is answered.
+        """
+        return sum(timeout for _, _, _, _, _, _, timeout in self.requests)
+
+    @property
+    def shortest_period(self):
+        return min(period for _, _, _, period, _, _, _ in self.requests)
+
+    def problems(self):
+        """
+        Returns:
+            list of descriptions of the port's problems
+        """
+        problems = []
+        if self.utilisation > 1.0:
+            problems.append(
+                f"overloaded: the scans need {self.utilisation:.0%} of the controller's time, "
+                "so records fall further behind on every scan"
+            )
+        elif self.utilisation > WARNING_UTILISATION:
+            problems.append(f"the scans need {self.utilisation:.0%} of the controller's time")
+        if self.worst_case_wait > self.shortest_period:
+            problems.append(
+                f"a burst of every scan takes {self.worst_case_wait:.3f} s, longer than the "
+                f"{self.shortest_period:g} s scan, so records skip scans"
+            )
+        if self.disconnected_wait > self.shortest_period:
+            problems.append(
+                f"with the controller disconnected a burst takes {self.disconnected_wait:.1f} s "
+                "of reply timeouts"
+            )
+        for name, _, request, _, service, _, timeout in self.requests:
+            if service > timeout:
+                problems.append(f"{name} ({request!r}) takes longer than its reply timeout")
+        return problems
+
+
+def redundant_protocols(protocol_file):
+    """
+    Find protocols which send the same request, e.g. getRAMP and getRAMPSTATUS both send
+    "RAMP? \\$1" and read different fields of the reply.
+
+    Returns:
+        list of (request format, protocol reading every field or None, other protocols)
+    """
+    by_request = defaultdict(list)
+    for name, function in protocol_file.functions.items():
+        if function.out_format is not None and function.in_format is not None:
+            by_request[function.out_format].append(name)
+    redundant = []
+    for out_format, names in sorted(by_request.items()):
+        if len(names) > 1:
+            complete = [
+                name
+                for name in names
+                if "%*" not in protocol_file.functions[name].in_format
+                and protocol_file.functions[name].in_format.count("%") > 1
+            ]
+            covering = complete[0] if complete else None
+            redundant.append((out_format, covering, [name for name in names if name != covering]))
+    return redundant
+
+
+def suggestions(budgets, protocol_file):
+    """
+    Returns:
+        list of suggested consolidations: requests which more than one record of a port sends,
+        then protocols of the protocol file which repeat another's request
+    """
+    suggested = []
+    for budget in budgets:
+        senders = defaultdict(list)
+        for name, protocol, request, period, _, _, _ in budget.requests:
+            senders[request].append((name, protocol, period))
+        for request, records in sorted(senders.items()):
+            if len(records) > 1:
+                names = ", ".join(f"{name} ({protocol})" for name, protocol, _ in records)
+                period = min(period for _, _, period in records)
+                suggested.append(
+                    f"{budget.port}: {names} all send {request!r}; read it once every "
+                    f"{period:g} s and redirect the fields to the other records"
+                )
+    for out_format, covering, others in redundant_protocols(protocol_file):
+        request = unescape(out_format)
+        if covering is not None:
+            suggested.append(
+                f"ls336.proto: {covering} reads every field of {request!r}, which "
+                f"{', '.join(others)} also {'sends' if len(others) == 1 else 'send'}; records "
+                f"using {'it' if len(others) == 1 else 'them'} can use {covering} instead"
+            )
+        else:
+            suggested.append(
+                f"ls336.proto: {', '.join(others)} all send {request!r}; a single protocol "
+                "with redirects could read their fields with one request"
+            )
+    return suggested
+
+
+def analyse(templates, protocol_file, timing):
+    """
+    Args:
+        templates: list of (template file name, macros) the IOC loads
+        protocol_file: the parsed ls336.proto
+        timing: SerialTimingModel of the controller
+
+    Returns:
+        list of PortBudgets, by port name
+    """
+    terminator = unescape(protocol_file.variables.get("Terminator", r"\r\n"))
+    budgets = {}
+    for record, period, protocol, arguments in polled_records(read_ioc(templates)):
+        function = protocol_file.functions[protocol]
+        if function.out_format is None:
+            continue
+        request = format_output(function.out_format, arguments)
+        num_bytes = len(request) + len(terminator)
+        if function.in_format is not None:
+            num_bytes += reply_length(function.in_format) + len(terminator)
+        service_time = timing.service_time([request.split(" ", 1)[0].encode()], num_bytes)
+        port = record.stream_link[3]
+        budget = budgets.setdefault(port, PortBudget(port))
+        budget.add(
+            record.name,
+            protocol,
+            request,
+            period,
+            service_time,
+            num_bytes,
+            protocol_file.reply_timeout(protocol),
+        )
+    return [budgets[port] for port in sorted(budgets)]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--substitutions", help="Substitutions file of the IOC's templates")
+    parser.add_argument("--scan", type=float, default=5.0, help="The SCAN macro")
+    parser.add_argument("--tempscan", type=float, default=1.0, help="The TEMPSCAN macro")
+    parser.add_argument(
+        "--outputs", type=int, default=len(OUTPUTS), help="Number of outputs loaded"
+    )
+    parser.add_argument(
+        "--scanner-inputs",
+        nargs="*",
+        default=[],
+        choices=SCANNER_INPUTS,
+        help="Inputs of the 3062 option enabled",
+    )
+    parser.add_argument(
+        "--command-latency",
+        type=float,
+        default=None,
+        help="Seconds the controller takes to process a command",
+    )
+    parser.add_argument("--baud", type=float, default=None, help="Baud rate of the link")
+    parser.add_argument("--show-requests", action="store_true", help="List each port's requests")
+    args = parser.parse_args()
+
+    if args.substitutions:
+        templates = [
+            (template, macros)
+            for template, macros in read_substitutions(args.substitutions)
+            if os.path.exists(os.path.join(DB_DIRECTORY, template))
+        ]
+    else:
+        templates = ioc_templates(
+            "IOC",
+            "L0",
+            args.scan,
+            args.tempscan,
+            outputs=OUTPUTS[: args.outputs],
+            scanner_inputs=args.scanner_inputs,
+        )
+
+    timing = SerialTimingModel()
+    if args.command_latency is not None:
+        timing.command_latency = args.command_latency
+    if args.baud is not None:
+        timing.baud_rate = args.baud
+    protocol_file = read_protocol()
+    budgets = analyse(templates, protocol_file, timing)
+
+    overloaded = False
+    for budget in budgets:
+        print(
+            f"Port {budget.port}: {len(budget.requests)} records, "
+            f"{budget.request_rate:.1f} requests/s, {budget.byte_rate:.0f} bytes/s, "
+            f"{budget.utilisation:.0%} of the controller's time"
+        )
+        print(
+            f"  worst case reply wait {1000.0 * budget.worst_case_wait:.1f} ms, "
+            f"{budget.disconnected_wait:.1f} s with the controller disconnected"
+        )
+        if args.show_requests:
+            for name, protocol, request, period, service, num_bytes, _ in budget.requests:
+                print(
+                    f"    {period:>5g}s {protocol:>14} {request!r:<20} {num_bytes:>4} bytes "
+                    f"{1000.0 * service:7.2f} ms {name}"
+                )
+        for problem in budget.problems():
+            print(f"  ! {problem}")
+        overloaded = overloaded or budget.utilisation > 1.0
+    if not budgets:
+        print("No records poll the controller")
+
+    consolidations = suggestions(budgets, protocol_file)
+    if consolidations:
+        print("Consolidations:")
+        for suggestion in consolidations:
+            print(f"  - {suggestion}")
+    sys.exit(1 if overloaded else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,420 @@
+"""
+Measure how long setpoint changes take to settle against the Lksh336 emulator's thermal model,
+and how long the IOC's setpoint callbacks take to complete, over many runs of setpoint sequences.
+
+The emulator runs in-process with its thermal simulation on, stepped in simulated time, so runs
+take a fraction of the time they would against an IOC. The IOC's records are emulated around it
+as the database templates process them:
+  - each input's reading is scanned every TEMPSCAN with KRDG?,
+  - a put to an output's TEMPn:SP sends SETP, clears IN_WINDOWn, sets TEMPn:SP_BUSY and
+    evaluates CALC_IN_WINDOWn, which compares the control input's last reading with the setpoint
+    within TOLERANCE and is also scanned every second; the first IN_WINDOWn of 1 completes the
+    put's callback,
+  - a put to MS:SETP_S of linked outputs looks up MS:OFFSET in the offset table's windows
+    (param_window_ls.template), puts the setpoint to the master and setpoint + offset to the
+    slave, clears both IN_WINDOWs and sets MS:BUSY, which clears when MS:WINDOW_CALC sees both
+    outputs in their windows.
+
+For each change it reports the time for the control input's reading to enter the window and stay
+there (the settle time), the time for the callback to complete, and how many callbacks completed
+before the reading had settled or not at all.
+
+Run from the system_tests directory, e.g.:
+    python -m benchmarks.settle_time --runs 50
+    python -m benchmarks.settle_time --outputs 3 --link 1:2 --offset-table 0:50:0.5 50:1000:2
+"""
+
+import argparse
+import random
+
+from lewis_emulators.Lksh336 import SimulatedLksh336
+from lewis_emulators.Lksh336.interfaces import Lksh336StreamInterface
+
+from .db_templates import INPUTS, OUTPUTS
+from .reply_latency import percentile
+
+# Seconds between scans of CALC_IN_WINDOWn.
+WINDOW_SCAN = 1.0
+
+
+class OutputLoop(object):
+    """
+    The setpoint callback records of one output, as lakeshore336output.template has them.
+    """
+
+    def __init__(self, output, input, tolerance, phase):
+        """
+        Args:
+            output: number of the output
+            input: name of its control input
+            tolerance: the TOLERANCE macro, in kelvin
+            phase: seconds until the first scan of CALC_IN_WINDOWn
+        """
+        self.output = output
+        self.input = input
+        self.tolerance = tolerance
+        self.next_scan = phase
+        self.setpoint = 0.0
+        self.in_window = 0
+        self.busy = False
+        self.put_time = None
+        # Seconds from the put to the callback completing, or None until it does.
+        self.callback_time = None
+        # Last time the control input's reading was outside the window, or None if it has not
+        # been since the put.
+        self.last_outside = None
+
+    def put(self, interface, setpoint, reading, now):
+        """
+        Put a setpoint to TEMPn:SP.
+
+        Args:
+            interface: the emulator's stream interface
+            setpoint: the new setpoint
+            reading: the control input's last scanned reading
+            now: seconds of simulated time
+        """
+        interface.dispatch_request(f"SETP {self.output},{setpoint:.3f}".encode())
+        self.setpoint = setpoint
+        self.in_window = 0
+        self.busy = True
+        self.put_time = now
+        self.callback_time = None
+        self.last_outside = None
+        self.calculate(reading, now)
+
+    def calculate(self, reading, now):
+        """
+        Process CALC_IN_WINDOWn with the control input's last scanned reading.
+        """
+        self.in_window = int(abs(reading - self.setpoint) <= self.tolerance)
+        if self.in_window and self.busy:
+            self.busy = False
+            self.callback_time = now - self.put_time
+
+    def track(self, temperature, now):
+        """
+        Follow the control input's reading between scans, to find when it settled.
+        """
+        if abs(temperature - self.setpoint) > self.tolerance:
+            self.last_outside = now
+
+    def settle_time(self, now, dt, hold):
+        """
+        Returns:
+            seconds from the put until the reading entered the window for the last time, or None
+            if it has not stayed there for the hold time
+        """
+        if self.last_outside is None:
+            return 0.0 if now - self.put_time >= hold else None
+        if now - self.last_outside < hold:
+            return None
+        return self.last_outside + dt - self.put_time
+
+
+class LinkedOutputs(object):
+    """
+    The records of a master and slave output linked by lakeshore_link_output.template.
+    """
+
+    def __init__(self, master, slave, offset_table):
+        """
+        Args:
+            master: OutputLoop of the master output
+            slave: OutputLoop of the slave output
+            offset_table: list of (low, high, offset) windows of the enabled param_window_ls
+                instances, in order
+        """
+        self.master = master
+        self.slave = slave
+        self.offset_table = offset_table
+        self.window_flags = [0] * len(offset_table)
+        self.offset = 0.0
+        self.window_calc = 0
+        self.busy = False
+        self.put_time = None
+        self.callback_time = None
+
+    def put(self, interface, setpoint, readings, now):
+        """
+        Put a setpoint to MS:SETP_S.
+
+        Args:
+            interface: the emulator's stream interface
+            setpoint: the master's new setpoint
+            readings: dict of the last scanned reading of each input
+            now: seconds of simulated time
+        """
+        # A window writes its offset to MS:OFFSET when the setpoint enters it, so a setpoint
+        # outside every window keeps the last offset.
+        for index, (low, high, offset) in enumerate(self.offset_table):
+            in_window = int(low <= setpoint < high)
+            if in_window and not self.window_flags[index]:
+                self.offset = offset
+            self.window_flags[index] = in_window
+        # MS:UNSET_WINDOWS and MS:SET_BUSY run before the CA puts to the outputs are processed.
+        self.master.in_window = self.slave.in_window = 0
+        self.window_calc = 0
+        self.busy = True
+        self.put_time = now
+        self.callback_time = None
+        self.master.put(interface, setpoint, readings[self.master.input], now)
+        self.update(now)
+        self.slave.put(interface, setpoint + self.offset, readings[self.slave.input], now)
+        self.update(now)
+
+    def update(self, now):
+        """
+        Process MS:WINDOW_CALC after either output's IN_WINDOWn was processed. It only writes
+        MS:IN_WINDOW, which clears MS:BUSY, when its result changes.
+        """
+        value = int(self.master.in_window == 1 and self.slave.in_window == 1)
+        if value != self.window_calc:
+            self.window_calc = value
+            if value and self.busy:
+                self.busy = False
+                self.callback_time = now - self.put_time
+
+    def settle_time(self, now, dt, hold):
+        times = [output.settle_time(now, dt, hold) for output in (self.master, self.slave)]
+        return None if None in times else max(times)
+
+
+class SettleHarness(object):
+    """
+    An emulator with its thermal simulation on and the IOC's records of the outputs driven.
+    """
+
+    def __init__(self, outputs, links, pid, heater_range, tolerance, tempscan, dt, noise, rng):
+        """
+        Args:
+            outputs: numbers of the outputs driven on their own
+            links: list of (master, slave, offset table) of the linked outputs
+            pid: (P, I, D) of every output
+            heater_range: range of every output
+            tolerance: the TOLERANCE macro, in kelvin
+            tempscan: seconds between scans of the readings, the TEMPSCAN macro
+            dt: seconds of each simulation step
+            noise: standard deviation of the noise on the readings, 0 for none
+            rng: random.Random of the scan phases
+        """
+        self.device = SimulatedLksh336()
+        self.interface = Lksh336StreamInterface()
+        self.interface.device = self.device
+        self.tempscan = tempscan
+        self.dt = dt
+        self.now = 0.0
+
+        def loop(output):
+            input = INPUTS[output - 1]
+            self.device.set_input_kelvin_temperature(
+                input, self.device.thermal_model.base_temperature
+            )
+            self.device.set_output_mode(output, 1, output, 0)
+            self.device.set_output_range(output, heater_range)
+            self.device.set_pid(output, *pid)
+            return OutputLoop(output, input, tolerance, rng.uniform(0.0, WINDOW_SCAN))
+
+        self.loops = [loop(output) for output in outputs]
+        self.links = [
+            LinkedOutputs(loop(master), loop(slave), offset_table)
+            for master, slave, offset_table in links
+        ]
+        self.all_loops = self.loops + [
+            output for link in self.links for output in (link.master, link.slave)
+        ]
+        self.readings = {output.input: 0.0 for output in self.all_loops}
+        self.next_reads = {input: rng.uniform(0.0, tempscan) for input in self.readings}
+        if noise:
+            self.device.schedule_fault("noise", 0.0, 1e9, None, noise)
+        self.device.thermal_simulation = True
+
+    def advance(self):
+        """
+        Step the emulator and process the scans which fall due.
+        """
+        self.device.process(self.dt)
+        self.now += self.dt
+        now = self.now
+        for input, next_read in self.next_reads.items():
+            if next_read <= now:
+                reply = self.interface.dispatch_request(f"KRDG? {input}".encode())
+                if reply is not None:
+                    self.readings[input] = float(reply)
+                self.next_reads[input] = next_read + self.tempscan
+        for output in self.all_loops:
+            output.track(self.device.get_input_kelvin_temperature(output.input), now)
+            if output.next_scan <= now:
+                output.calculate(self.readings[output.input], now)
+                output.next_scan += WINDOW_SCAN
+        for link in self.links:
+            link.update(now)
+
+    def change(self, setpoints, timeout, hold):
+        """
+        Put new setpoints and run until every callback has completed and every reading has
+        stayed in its window for the hold time, or until the timeout.
+
+        Args:
+            setpoints: setpoint of each loop and link, in that order
+            timeout: seconds to wait at most
+            hold: seconds a reading has to stay in its window to count as settled
+
+        Returns:
+            list of (settle time or None, callback time or None) of each loop and link
+        """
+        for output, setpoint in zip(self.loops, setpoints):
+            output.put(self.interface, setpoint, self.readings[output.input], self.now)
+        for link, setpoint in zip(self.links, setpoints[len(self.loops) :]):
+            link.put(self.interface, setpoint, self.readings, self.now)
+        end = self.now + timeout
+        while self.now < end:
+            self.advance()
+            if (
+                not any(output.busy for output in self.loops)
+                and not any(link.busy for link in self.links)
+                and all(
+                    output.settle_time(self.now, self.dt, hold) is not None
+                    for output in self.all_loops
+                )
+            ):
+                break
+        return [
+            (driven.settle_time(self.now, self.dt, hold), driven.callback_time)
+            for driven in self.loops + self.links
+        ]
+
+
+def parse_offset_table(windows):
+    """
+    Args:
+        windows: list of "LOW:HIGH:OFFSET" strings
+
+    Returns:
+        list of (low, high, offset)
+    """
+    table = []
+    for window in windows:
+        low, high, offset = (float(value) for value in window.split(":"))
+        table.append((low, high, offset))
+    return table
+
+
+def _distribution(times, width):
+    if not times:
+        return f"{'-':>{width}} {'-':>7} {'-':>7}"
+    return f"{percentile(times, 0.5):>{width}.2f} {percentile(times, 0.9):>7.2f} {times[-1]:>7.2f}"
+
+
+def print_report(labels, results):
+    """
+    Args:
+        labels: name of each loop and link
+        results: list of (settle time or None, callback time or None) of each loop and link per
+            change
+    """
+    print(
+        f"{'':>12} {'changes':>8} {'settle p50':>11} {'p90':>7} {'max':>7} {'unsettled':>10} "
+        f"{'callback p50':>13} {'p90':>7} {'max':>7} {'timeouts':>9} {'early':>6}"
+    )
+    for index, label in enumerate(labels):
+        settles = sorted(result[index][0] for result in results if result[index][0] is not None)
+        callbacks = sorted(result[index][1] for result in results if result[index][1] is not None)
+        early = sum(
+            1
+            for settle, callback in (result[index] for result in results)
+            if callback is not None and (settle is None or callback < settle)
+        )
+        print(
+            f"{label:>12} {len(results):>8} {_distribution(settles, 11)} "
+            f"{len(results) - len(settles):>10} {_distribution(callbacks, 13)} "
+            f"{len(results) - len(callbacks):>9} {early:>6}"
+        )
+    print(
+        "Times in seconds from the put. Early callbacks completed before the reading settled, "
+        "timeouts never did."
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--runs", type=int, default=20, help="Number of setpoint sequences")
+    parser.add_argument("--changes", type=int, default=5, help="Setpoint changes per sequence")
+    parser.add_argument(
+        "--setpoints",
+        type=float,
+        nargs=2,
+        default=[10.0, 90.0],
+        metavar=("LOW", "HIGH"),
+        help="Range the setpoints are drawn from, in kelvin",
+    )
+    parser.add_argument(
+        "--outputs",
+        type=int,
+        nargs="*",
+        default=None,
+        choices=OUTPUTS,
+        help="Outputs driven on their own, by default 1 and 2 unless they are linked",
+    )
+    parser.add_argument(
+        "--link", default=None, metavar="MASTER:SLAVE", help="Outputs to drive linked"
+    )
+    parser.add_argument(
+        "--offset-table",
+        nargs="*",
+        default=[],
+        metavar="LOW:HIGH:OFFSET",
+        help="Enabled windows of the linked outputs' offset table",
+    )
+    parser.add_argument("--tolerance", type=float, default=1.0, help="The TOLERANCE macro")
+    parser.add_argument("--tempscan", type=float, default=1.0, help="The TEMPSCAN macro")
+    parser.add_argument(
+        "--pid", type=float, nargs=3, default=[10.0, 1.0, 0.0], help="P, I and D of the outputs"
+    )
+    parser.add_argument("--range", type=int, default=3, help="Heater range of the outputs")
+    parser.add_argument("--noise", type=float, default=0.0, help="Noise on the readings, in K")
+    parser.add_argument(
+        "--hold", type=float, default=10.0, help="Seconds a reading stays in window to settle"
+    )
+    parser.add_argument("--timeout", type=float, default=300.0, help="Seconds to wait at most")
+    parser.add_argument("--dt", type=float, default=0.05, help="Seconds of each simulation step")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the setpoints and phases")
+    args = parser.parse_args()
+
+    links = []
+    if args.link:
+        master, slave = (int(output) for output in args.link.split(":"))
+        links.append((master, slave, parse_offset_table(args.offset_table)))
+    linked = {output for master, slave, _ in links for output in (master, slave)}
+    outputs = args.outputs if args.outputs is not None else [1, 2]
+    outputs = [output for output in outputs if output not in linked]
+    labels = [f"output {output}" for output in outputs] + [
+        f"link {master}:{slave}" for master, slave, _ in links
+    ]
+    if not labels:
+        parser.error("No outputs to drive")
+
+    rng = random.Random(args.seed)
+    results = []
+    for _ in range(args.runs):
+        harness = SettleHarness(
+            outputs,
+            links,
+            args.pid,
+            args.range,
+            args.tolerance,
+            args.tempscan,
+            args.dt,
+            args.noise,
+            rng,
+        )
+        for _ in range(args.changes):
+            setpoints = [rng.uniform(*args.setpoints) for _ in labels]
+            results.append(harness.change(setpoints, args.timeout, args.hold))
+    print_report(labels, results)
+
+
+if __name__ == "__main__":
+    main()
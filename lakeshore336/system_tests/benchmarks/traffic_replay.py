@@ -0,0 +1,107 @@
+"""
+Replay a traffic log recorded by the Lksh336 emulator as fast as the target answers, and report
+the throughput, the reply latency and the replies that differ from the recording.
+
+Record the traffic of an IOC polling an emulator started with a backdoor (-r localhost:10000):
+    lewis-control -r localhost:10000 device start_recording "'/tmp/lksh336.trc'"
+    lewis-control -r localhost:10000 device stop_recording
+
+Then replay it against an emulator or a controller, from the system_tests directory:
+    python -m benchmarks.traffic_replay /tmp/lksh336.trc localhost:57677
+
+Readings which change over time (e.g. KRDG?) are expected to mismatch unless the target's state
+matches the recording.
+"""
+
+import argparse
+import time
+
+from lewis_emulators.Lksh336.recorder import read_traffic
+
+from .line_client import LineClient
+from .reply_latency import percentile, print_histogram
+
+
+def replay(client, records, repeats, unexpected_timeout=0.05):
+    """
+    Send the requests of a recording, waiting for a reply where the recording has one. After a
+    request the recording has no reply to, any reply the target gives within
+    unexpected_timeout seconds is read and counted as a mismatch, so it is not taken for the
+    reply to a later request.
+
+    Returns:
+        tuple of the number of requests sent, the seconds taken, the sorted reply latencies in
+        ms and a list of (request, recorded reply, reply) mismatches
+    """
+    latencies = []
+    mismatches = []
+    sent = 0
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for _, request, recorded_reply in records:
+            request = request.decode()
+            sent += 1
+            if recorded_reply is None:
+                client.write(request)
+                reply = client.read_unexpected(unexpected_timeout)
+                if reply is not None:
+                    mismatches.append((request, None, reply))
+                continue
+            sent_time = time.perf_counter()
+            reply = client.query(request)
+            latencies.append(1000.0 * (time.perf_counter() - sent_time))
+            if reply != recorded_reply.decode():
+                mismatches.append((request, recorded_reply.decode(), reply))
+    return sent, time.perf_counter() - start, sorted(latencies), mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("log", help="Traffic log to replay")
+    parser.add_argument("target", help="Device to replay against as host:port")
+    parser.add_argument("--repeats", type=int, default=1, help="Times to replay the log")
+    parser.add_argument("--timeout", type=float, default=2.0, help="Seconds to wait for a reply")
+    parser.add_argument(
+        "--unexpected-timeout",
+        type=float,
+        default=0.05,
+        help="Seconds to wait for a reply to a request which had none when it was recorded",
+    )
+    parser.add_argument("--show", type=int, default=10, help="Mismatches to print")
+    args = parser.parse_args()
+
+    recording_start, records = read_traffic(args.log)
+    records = list(records)
+    if not records:
+        parser.error(f"{args.log} holds no requests")
+    recorded_seconds = records[-1][0] - records[0][0]
+    print(
+        f"{len(records)} requests recorded over {recorded_seconds:.1f} s from "
+        f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(recording_start))}"
+    )
+
+    host, _, port = args.target.rpartition(":")
+    client = LineClient(host or "localhost", int(port), args.timeout)
+    try:
+        sent, seconds, latencies, mismatches = replay(
+            client, records, args.repeats, args.unexpected_timeout
+        )
+    finally:
+        client.close()
+
+    print(f"{sent} requests in {seconds:.3f} s: {sent / seconds:.0f} requests/s")
+    if latencies:
+        print(
+            f"{len(latencies)} replies: p50 {percentile(latencies, 0.5):.3f} ms "
+            f"p99 {percentile(latencies, 0.99):.3f} ms max {latencies[-1]:.3f} ms"
+        )
+        print_histogram(latencies)
+    print(f"{len(mismatches)} replies differ from the recording")
+    for request, recorded_reply, reply in mismatches[: args.show]:
+        print(f"  {request!r}: recorded {recorded_reply!r}, got {reply!r}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,13 @@
 from ..lewis_versions import LEWIS_LATEST
-from .device import SimulatedLksh336
+from .device import OPTION_3062_INPUTS, SimulatedLksh336
 
 framework_version = LEWIS_LATEST
+
+setups = {
+    "default": {"device_type": SimulatedLksh336},
+    "option_3062": {
+        "device_type": SimulatedLksh336,
+        "parameters": {"input_names": OPTION_3062_INPUTS},
+    },
+}
 __all__ = ["SimulatedLksh336"]
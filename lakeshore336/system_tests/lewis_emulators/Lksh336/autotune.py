@@ -0,0 +1,307 @@
+import math
+from array import array
+
+from .thermal import MODE_CLOSED_LOOP, MODE_ZONE
+
+# Autotune modes of ATUNE.
+MODE_P = 0
+MODE_PI = 1
+MODE_PID = 2
+
+# Stages reported by TUNEST?
+STAGE_IDLE = 0
+STAGE_SETTLING = 1
+STAGE_STEP = 2
+
+# Limits of the PID parameters the controller accepts.
+P_LIMITS = (0.1, 1000.0)
+I_LIMITS = (0.0, 1000.0)
+D_LIMITS = (0.0, 200.0)
+
+
+def _solve3(matrix, vector):
+    """
+    Solve a 3x3 linear system by Gaussian elimination with partial pivoting.
+
+    Returns:
+        list of the three unknowns, or None if the system is singular
+    """
+    rows = [list(row) + [value] for row, value in zip(matrix, vector)]
+    for column in range(3):
+        pivot = max(range(column, 3), key=lambda row: abs(rows[row][column]))
+        if abs(rows[pivot][column]) < 1e-12:
+            return None
+        rows[column], rows[pivot] = rows[pivot], rows[column]
+        for row in range(column + 1, 3):
+            factor = rows[row][column] / rows[column][column]
+            for index in range(column, 4):
+                rows[row][index] -= factor * rows[column][index]
+    solution = [0.0] * 3
+    for row in (2, 1, 0):
+        total = rows[row][3] - sum(
+            rows[row][index] * solution[index] for index in range(row + 1, 3)
+        )
+        solution[row] = total / rows[row][row]
+    return solution
+
+
+def identify_step_responses(responses, sample_period, max_delay):
+    """
+    Identify a first order plus dead time model from each of a batch of step responses, e.g. of
+    every output whose autotune finished in the same tick.
+
+    Each response is fitted with y[k+1] = a*y[k] + b*u[k-d] + c by least squares for every dead
+    time d up to max_delay samples, in one pass accumulating the normal equations of all delays,
+    and the delay with the smallest residual is kept.
+
+    Args:
+        responses: list of (outputs, readings) pairs of equally long sequences, sampled every
+            sample_period seconds; outputs in percent and readings in kelvin
+        sample_period: seconds between samples
+        max_delay: longest dead time to try, in samples
+
+    Returns:
+        list with a (gain in K/%, time constant in s, dead time in s) tuple for each response,
+        or None where no stable model with a positive gain fits
+    """
+    models = []
+    for outputs, readings in responses:
+        num_samples = len(readings)
+        delays = range(min(max_delay, num_samples - 4) + 1)
+        # Sums of the products of the regressors (y[k], u[k-d], 1) and the target y[k+1].
+        sums = [[0.0] * 10 for _ in delays]
+        for k in range(max(delays, default=0), num_samples - 1):
+            y, target = readings[k], readings[k + 1]
+            for d in delays:
+                u = outputs[k - d]
+                row = sums[d]
+                row[0] += y * y
+                row[1] += y * u
+                row[2] += y
+                row[3] += u * u
+                row[4] += u
+                row[5] += 1.0
+                row[6] += y * target
+                row[7] += u * target
+                row[8] += target
+                row[9] += target * target
+
+        best = None
+        for d in delays:
+            yy, yu, ys, uu, us, n, yt, ut, ts, tt = sums[d]
+            solution = _solve3([[yy, yu, ys], [yu, uu, us], [ys, us, n]], [yt, ut, ts])
+            if solution is None:
+                continue
+            a, b, c = solution
+            # Residual sum of squares from the normal equations.
+            residual = tt - a * yt - b * ut - c * ts
+            if 0.0 < a < 1.0 and b > 0.0 and (best is None or residual < best[0]):
+                best = (residual, a, b, d)
+
+        if best is None:
+            models.append(None)
+        else:
+            _, a, b, d = best
+            models.append((b / (1.0 - a), -sample_period / math.log(a), d * sample_period))
+    return models
+
+
+def tune_pid(mode, gain, time_constant, dead_time, sample_period):
+    """
+    Calculate PID parameters for a first order plus dead time model with the SIMC rules, in the
+    form output = P * (error + I * integral(error) + D * d(error)/dt).
+
+    Args:
+        mode: MODE_P, MODE_PI or MODE_PID
+        gain: gain of the plant in K per percent of output
+        time_constant: time constant of the plant in seconds
+        dead_time: dead time of the plant in seconds
+        sample_period: seconds between samples, the shortest closed loop time constant
+
+    Returns:
+        tuple of P, I and D
+    """
+    closed_loop_time_constant = max(dead_time, 0.2 * time_constant, sample_period)
+    p = time_constant / (gain * (closed_loop_time_constant + dead_time))
+    integral_time = min(time_constant, 4.0 * (closed_loop_time_constant + dead_time))
+    i = 1.0 / integral_time if mode != MODE_P else 0.0
+    d = dead_time / 2.0 if mode == MODE_PID else 0.0
+
+    def clamp(value, limits):
+        return min(max(value, limits[0]), limits[1])
+
+    return clamp(p, P_LIMITS), clamp(i, I_LIMITS), clamp(d, D_LIMITS)
+
+
+class AutotuneRun(object):
+    """
+    The autotune of one output: the output is held at its current level to settle, then stepped
+    while the control input's reading is sampled.
+    """
+
+    __slots__ = (
+        "mode",
+        "control_input",
+        "stage",
+        "elapsed",
+        "next_sample",
+        "bias",
+        "level",
+        "outputs",
+        "readings",
+    )
+
+    def __init__(self, mode, control_input, bias):
+        self.mode = mode
+        self.control_input = control_input
+        self.stage = STAGE_SETTLING
+        self.elapsed = 0.0
+        self.next_sample = 0.0
+        self.bias = bias
+        self.level = bias
+        self.outputs = array("d")
+        self.readings = array("d")
+
+
+class Autotuner(object):
+    """
+    Emulates ATUNE: excites the simulated plant of an output with a step of its heater output,
+    identifies a first order plus dead time model from the response and writes PID parameters
+    tuned for it back to the output. Outputs are tuned independently and the identification of
+    all outputs that finish in a tick is done as one batch.
+    """
+
+    def __init__(self, num_outputs):
+        self.sample_period = 0.1
+        self.settle_time = 2.0
+        # Size of the output step in percent.
+        self.step_size = 20.0
+        self.min_step_time = 2.0
+        self.max_step_time = 120.0
+        # The step ends once the reading has changed by less than this fraction of the response
+        # over the last fifth of the step.
+        self.settle_fraction = 0.01
+        self.max_delay_samples = 20
+
+        self.runs = [None] * num_outputs
+        self.results = [None] * num_outputs
+        self.last_output = 0
+        self.last_error = 0
+
+    @property
+    def active(self):
+        return any(run is not None for run in self.runs)
+
+    def start(self, device, output, mode):
+        """
+        Start tuning an output, as ATUNE does. The output must exist and be in closed loop or zone
+        mode with a control input, otherwise the tune fails at once.
+
+        Args:
+            device: the device being simulated
+            output: the output number, from 1
+            mode: MODE_P, MODE_PI or MODE_PID
+        """
+        self.last_output = output
+        if not 1 <= output <= len(device.outputs):
+            self.last_error = 1
+            return
+        index = output - 1
+        control = device.outputs[index]
+        self.last_error = 0
+        self.runs[index] = None
+        device.thermal_model.excitations[index] = None
+        if control.mode not in (
+            MODE_CLOSED_LOOP,
+            MODE_ZONE,
+        ) or not 1 <= control.control_input <= len(device.inputs):
+            self.last_error = 1
+            return
+
+        percent = control.heater_value if index < 2 else control.analog_output
+        self.runs[index] = AutotuneRun(mode, control.control_input, float(percent))
+        device.thermal_model.excitations[index] = float(percent)
+
+    def stop(self, device):
+        for index, run in enumerate(self.runs):
+            if run is not None:
+                self.runs[index] = None
+                device.thermal_model.excitations[index] = None
+
+    def status(self):
+        """
+        Returns:
+            the reply to TUNEST?: tuning active, output, error and stage
+        """
+        run = self.runs[self.last_output - 1] if 1 <= self.last_output <= len(self.runs) else None
+        stage = run.stage if run is not None else STAGE_IDLE
+        return f"{int(self.active)},{self.last_output},{self.last_error},{stage}"
+
+    def step(self, device, dt):
+        """
+        Advance every running autotune, and identify and tune the outputs whose step finished.
+
+        Args:
+            device: the device being simulated
+            dt: time step in seconds
+        """
+        if not self.active:
+            return
+
+        input_names = list(device.inputs)
+        finished = []
+        for index, run in enumerate(self.runs):
+            if run is None:
+                continue
+            run.elapsed += dt
+            while run.next_sample <= run.elapsed:
+                run.outputs.append(run.level)
+                reading = device.get_input_kelvin_temperature(input_names[run.control_input - 1])
+                run.readings.append(float(reading))
+                run.next_sample += self.sample_period
+
+            if run.stage == STAGE_SETTLING and run.elapsed >= self.settle_time:
+                run.stage = STAGE_STEP
+                step = self.step_size if run.bias + self.step_size <= 100.0 else -self.step_size
+                run.level = min(max(run.bias + step, 0.0), 100.0)
+                device.thermal_model.excitations[index] = run.level
+                run.elapsed = run.next_sample = self.settle_time
+            elif run.stage == STAGE_STEP and self._step_finished(run):
+                finished.append(index)
+
+        if not finished:
+            return
+        models = identify_step_responses(
+            [(self.runs[index].outputs, self.runs[index].readings) for index in finished],
+            self.sample_period,
+            self.max_delay_samples,
+        )
+        for index, model in zip(finished, models):
+            run = self.runs[index]
+            self.runs[index] = None
+            device.thermal_model.excitations[index] = None
+            error = 1 if model is None else 0
+            if model is not None:
+                p, i, d = tune_pid(run.mode, *model, self.sample_period)
+                device.set_pid(index + 1, p, i, d)
+            if index + 1 == self.last_output:
+                self.last_error = error
+            self.results[index] = {
+                "error": error,
+                "duration": run.elapsed,
+                "model": model,
+                "pid": None if model is None else device.get_pid(index + 1),
+            }
+
+    def _step_finished(self, run):
+        step_time = run.elapsed - self.settle_time
+        if step_time >= self.max_step_time:
+            return True
+        if step_time < self.min_step_time:
+            return False
+        readings = run.readings
+        settle_samples = int(self.settle_time / self.sample_period)
+        window = max((len(readings) - settle_samples) // 5, 2)
+        response = abs(readings[-1] - readings[settle_samples])
+        recent_change = abs(readings[-1] - readings[-window])
+        return response > 0 and recent_change <= self.settle_fraction * response
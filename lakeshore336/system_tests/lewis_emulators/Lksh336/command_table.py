@@ -0,0 +1,131 @@
+"""
+Command table of the emulator derived from the IOC's protocol file: the requests each protocol of
+ls336.proto sends, which of the emulator's commands answers them and which protocols the emulator
+can not answer.
+
+The queries the IOC polls (e.g. "KRDG? A") have no value in them, so every one it can send is
+known from the protocol file. They are matched against the commands once, when the interface is
+bound, and kept in an index of whole requests, so answering a poll skips the regular expressions.
+
+Run from the system_tests directory to check the emulator against the protocol file:
+    python -m lewis_emulators.Lksh336.command_table
+The exit status is 1 if any protocol has no command to answer it.
+"""
+
+import itertools
+import re
+import sys
+
+from .device import INPUT_ALIASES, OPTION_3062_INPUTS
+from .stream_protocol import CONVERSION, PROTOCOL_FILE, format_output
+from .zones import NUM_ZONES
+
+# Values tried for each \$n argument of a protocol: the input names, then the outputs, zones and
+# curve numbers up to the number of zones.
+ARGUMENT_VALUES = (
+    OPTION_3062_INPUTS + list(INPUT_ALIASES) + [str(number) for number in range(1, NUM_ZONES + 1)]
+)
+_ARGUMENT = re.compile(r"\\?\$(\d)")
+
+
+def protocol_requests(out_format, argument_values=ARGUMENT_VALUES):
+    """
+    Args:
+        out_format: output format of a protocol, e.g. 'ZONE? \\$1,\\$2'
+        argument_values: values tried for each argument
+
+    Returns:
+        list of the requests the protocol sends for every combination of argument values, as
+        bytes, with 1 written by each format conversion
+    """
+    # Arguments in a conversion name the record it reads the value from, not part of the request.
+    arguments = _ARGUMENT.findall(CONVERSION.sub("", out_format))
+    num_arguments = max((int(index) for index in arguments), default=0)
+    return [
+        format_output(out_format, arguments, 1).encode()
+        for arguments in itertools.product(argument_values, repeat=num_arguments)
+    ]
+
+
+class CommandTable(object):
+    """
+    The protocols of a protocol file matched against the emulator's commands.
+    """
+
+    def __init__(self, match, command_names, protocol_file, argument_values=ARGUMENT_VALUES):
+        """
+        Args:
+            match: function giving the (command, matched arguments) a request is dispatched to, or
+                None if no command matches it
+            command_names: names of all of the commands
+            protocol_file: the parsed protocol file
+            argument_values: values tried for each argument of a protocol
+        """
+        # (command, matched arguments) of each whole request a query protocol sends.
+        self.commands_by_request = {}
+        # Name of the command answering each protocol which sends a request, or None.
+        self.protocol_commands = {}
+        # An example request of each protocol, for reporting.
+        self.example_requests = {}
+        for name, function in protocol_file.functions.items():
+            out_format = function.out_format
+            if out_format is None:
+                continue
+            is_query = CONVERSION.search(_ARGUMENT.sub("", out_format)) is None
+            requests = protocol_requests(out_format, argument_values)
+            self.example_requests[name] = requests[0]
+            self.protocol_commands[name] = None
+            for request in requests:
+                matched = match(request)
+                if matched is None:
+                    continue
+                if self.protocol_commands[name] is None:
+                    self.protocol_commands[name] = matched[0].name
+                    self.example_requests[name] = request
+                if is_query:
+                    self.commands_by_request[request] = matched
+                else:
+                    break
+        self.unused_commands = sorted(set(command_names) - set(self.protocol_commands.values()))
+
+    @property
+    def unanswered_protocols(self):
+        return [name for name, command in self.protocol_commands.items() if command is None]
+
+    def report(self):
+        """
+        Returns:
+            list of the lines of the conformance report
+        """
+        lines = []
+        for name, command in self.protocol_commands.items():
+            request = self.example_requests[name].decode()
+            lines.append(f"{name:>16} {request!r:<30} {command or 'NOT ANSWERED'}")
+        unanswered = self.unanswered_protocols
+        lines.append(
+            f"{len(self.protocol_commands) - len(unanswered)} of {len(self.protocol_commands)} "
+            "protocols answered"
+        )
+        if unanswered:
+            lines.append(f"Not answered: {', '.join(unanswered)}")
+        if self.unused_commands:
+            lines.append(f"Commands no protocol uses: {', '.join(self.unused_commands)}")
+        return lines
+
+
+def main():
+    from .device import SimulatedLksh336
+    from .interfaces import Lksh336StreamInterface
+
+    interface = Lksh336StreamInterface()
+    interface.device = SimulatedLksh336()
+    table = interface.command_table
+    if table is None:
+        sys.exit(f"No protocol file at {PROTOCOL_FILE}")
+    for line in table.report():
+        print(line)
+    sys.exit(1 if table.unanswered_protocols else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,367 @@
+"""
+Bulk configuration of the simulated controller: its whole state as one dict, which can be saved to
+and loaded from a JSON or YAML file.
+
+A configuration may hold any of these keys; anything left out is not changed when it is applied:
+    {
+        "id": "...",
+        "outputs": {"1": {"setpoint": 10.0, "p": 50.0, ...}, ...},
+        "inputs": {"A": {"kelvin_temperature": 4.2, "curve_number": 21, ...}, ...},
+        "curves": {"21": {"header": {"name": "...", ...}, "points": [[units, kelvin], ...]}},
+        "zones": {"1": [[upper bound, P, I, D, manual output, range, input, rate], ...]},
+    }
+
+A batch of updates is a configuration which may also hold the device's run time attributes:
+    {"device": {"connected": False, "thermal_simulation": True}, "inputs": {...}, ...}
+
+Every value is converted to the type of its attribute (e.g. "12.5" or 12 to a float setpoint) and
+checked before anything is applied.
+"""
+
+import hashlib
+import json
+import math
+
+from .curves import NAME_LENGTH, NUM_CURVES, SERIAL_NUMBER_LENGTH, Curve
+from .thermal import RANGE_FRACTIONS
+
+
+class ConfigError(ValueError):
+    """
+    A configuration or batch of updates which can not be applied, because of a value of the
+    wrong type or out of range as well as an unknown key.
+    """
+
+
+# Attributes of the device itself which a batch of updates may set.
+DEVICE_ATTRIBUTES = ("id", "connected", "thermal_simulation")
+DEVICE_ATTRIBUTE_TYPES = {"id": str, "connected": bool, "thermal_simulation": bool}
+
+HEADER_ATTRIBUTES = (
+    "name",
+    "serial_number",
+    "data_format",
+    "temperature_limit",
+    "temperature_coefficient",
+)
+HEADER_ATTRIBUTE_TYPES = {
+    "name": str,
+    "serial_number": str,
+    "data_format": int,
+    "temperature_limit": float,
+    "temperature_coefficient": int,
+}
+
+# Attributes of the outputs and inputs which are not floats.
+CHANNEL_ATTRIBUTE_TYPES = {
+    "sensor_name": str,
+    **dict.fromkeys(
+        [
+            "range",
+            "ramp_status",
+            "mode",
+            "control_input",
+            "powerup",
+            "heater_status",
+            "alarm_high",
+            "alarm_low",
+            "alarm_enabled",
+            "alarm_latching",
+            "alarm_audible",
+            "alarm_visible",
+            "reading_status",
+            "curve_number",
+            "sensor_type",
+            "auto_range_setting",
+            "compensation",
+            "units",
+        ],
+        int,
+    ),
+}
+# Names and types of the values of a zone, in the order ZONE takes them.
+ZONE_VALUES = (
+    ("upper_bound", float),
+    ("p", float),
+    ("i", float),
+    ("d", float),
+    ("manual_output", float),
+    ("range", int),
+    ("input", int),
+    ("rate", float),
+)
+
+
+def _channel_attributes(channel):
+    return [attribute for attribute in type(channel).__slots__ if not attribute.startswith("_")]
+
+
+def export_config(device):
+    """
+    Args:
+        device: the simulated controller
+
+    Returns:
+        dict of the device's configuration, with the curves that have breakpoints
+    """
+    outputs = {
+        str(number): {
+            attribute: getattr(output, attribute) for attribute in _channel_attributes(output)
+        }
+        for number, output in enumerate(device.outputs, 1)
+    }
+    inputs = {
+        name: {attribute: getattr(input, attribute) for attribute in _channel_attributes(input)}
+        for name, input in device.inputs.items()
+    }
+    curves = {}
+    for number, curve in enumerate(device.curves):
+        num_points = curve.num_points
+        if number and num_points:
+            curves[str(number)] = {
+                "header": {
+                    attribute: getattr(curve.header, attribute) for attribute in HEADER_ATTRIBUTES
+                },
+                "points": [
+                    [curve.units[index], curve.temperatures[index]] for index in range(num_points)
+                ],
+            }
+    zones = {
+        str(number): [list(table.get(zone)) for zone in range(1, len(table.upper_bounds) + 1)]
+        for number, table in enumerate(device.zones, 1)
+    }
+    return {"id": device.id, "outputs": outputs, "inputs": inputs, "curves": curves, "zones": zones}
+
+
+def _output_index(device, number, key):
+    try:
+        index = int(number) - 1
+    except (TypeError, ValueError):
+        index = -1
+    if not 0 <= index < len(device.outputs):
+        raise ConfigError(f"{key} has no output {number}, outputs are 1 to {len(device.outputs)}")
+    return index
+
+
+def _section(values, kind, description):
+    """
+    Returns:
+        values, if they are a dict or a list (or tuple) as kind says
+    """
+    if not isinstance(values, (list, tuple) if kind is list else kind):
+        raise ConfigError(f"{description} must be a {kind.__name__}, not {values!r}")
+    return values
+
+
+def _convert(value, kind, description, lowest=None, highest=None):
+    """
+    Args:
+        value: value from a configuration
+        kind: the type of the attribute, str, bool, int or float
+        description: what the value is for, e.g. "Output 1 setpoint"
+        lowest: the lowest value an int may have, or None
+        highest: the highest value an int may have, or None
+
+    Returns:
+        the value as kind; an int or float may be given as a finite number or a string of one, and
+        an int is kept as it is for a float
+    """
+    if kind is str or kind is bool:
+        return _section(value, kind, description)
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        raise ConfigError(f"{description} must be a number, not {value!r}")
+    try:
+        number = float(value)
+    except ValueError:
+        raise ConfigError(f"{description} must be a number, not {value!r}") from None
+    if not math.isfinite(number):
+        raise ConfigError(f"{description} must be finite, not {value!r}")
+    if kind is float:
+        return value if isinstance(value, (int, float)) else number
+    if not number.is_integer():
+        raise ConfigError(f"{description} must be a whole number, not {value!r}")
+    number = int(number)
+    if (lowest is not None and number < lowest) or (highest is not None and number > highest):
+        raise ConfigError(f"{description} must be from {lowest} to {highest}, not {number}")
+    return number
+
+
+def _convert_attributes(channel, values, description):
+    """
+    Returns:
+        dict of the values converted to the types of the channel's attributes
+    """
+    unknown = set(_section(values, dict, description)) - set(_channel_attributes(channel))
+    if unknown:
+        raise ConfigError(f"{description} has no {', '.join(sorted(unknown))}")
+    limits = {"curve_number": (0, NUM_CURVES)}
+    return {
+        attribute: _convert(
+            value,
+            CHANNEL_ATTRIBUTE_TYPES.get(attribute, float),
+            f"{description} {attribute}",
+            *limits.get(attribute, ()),
+        )
+        for attribute, value in values.items()
+    }
+
+
+def apply_config(device, config):
+    """
+    Apply a configuration to the device. The whole configuration is checked and converted before
+    anything is changed, so a configuration with a mistake leaves the device as it was.
+
+    Args:
+        device: the simulated controller
+        config: dict of the configuration, see the module docstring
+    """
+    unknown = set(_section(config, dict, "A configuration")) - {
+        "id",
+        "outputs",
+        "inputs",
+        "curves",
+        "zones",
+    }
+    if unknown:
+        raise ConfigError(f"Unknown configuration keys: {', '.join(sorted(unknown))}")
+
+    outputs = []
+    for number, values in _section(config.get("outputs", {}), dict, "outputs").items():
+        output = device.outputs[_output_index(device, number, "outputs")]
+        outputs.append((output, _convert_attributes(output, values, f"Output {number}")))
+
+    inputs = []
+    for name, values in _section(config.get("inputs", {}), dict, "inputs").items():
+        input = device._input(name)
+        inputs.append((input, _convert_attributes(input, values, f"Input {name}")))
+
+    curves = []
+    for number, values in _section(config.get("curves", {}), dict, "curves").items():
+        device._curve(int(number))
+        curve = Curve()
+        description = f"Curve {number}"
+        header = _section(
+            _section(values, dict, description).get("header", {}), dict, f"{description} header"
+        )
+        unknown = set(header) - set(HEADER_ATTRIBUTES)
+        if unknown:
+            raise ConfigError(f"Curve header has no {', '.join(sorted(unknown))}")
+        for attribute, value in header.items():
+            kind = HEADER_ATTRIBUTE_TYPES[attribute]
+            setattr(curve.header, attribute, _convert(value, kind, f"Curve {number} {attribute}"))
+        curve.header.name = str(curve.header.name)[:NAME_LENGTH].ljust(NAME_LENGTH)
+        curve.header.serial_number = str(curve.header.serial_number)[:SERIAL_NUMBER_LENGTH].ljust(
+            SERIAL_NUMBER_LENGTH
+        )
+        points = _section(values.get("points", []), list, f"{description} points")
+        if any(len(_section(point, list, f"{description} point")) != 2 for point in points):
+            raise ConfigError(f"Curve {number} points must each be [units, kelvin]")
+        points = [
+            [_convert(value, float, f"Curve {number} point {index}") for value in point]
+            for index, point in enumerate(points, 1)
+        ]
+        curve.set_points([point[0] for point in points], [point[1] for point in points])
+        curves.append((int(number), curve))
+
+    zones = []
+    for number, table in _section(config.get("zones", {}), dict, "zones").items():
+        zone_table = device.zones[_output_index(device, number, "zones")]
+        limits = {"range": (0, len(RANGE_FRACTIONS) - 1), "input": (0, len(device.inputs))}
+        converted = []
+        for zone, values in enumerate(_section(table, list, f"Zones of output {number}"), 1):
+            zone_table._index(zone)
+            description = f"Zone {zone} of output {number}"
+            if len(_section(values, list, description)) != len(ZONE_VALUES):
+                raise ConfigError(f"{description} needs {len(ZONE_VALUES)} values")
+            converted.append(
+                [
+                    _convert(value, kind, f"{description} {name}", *limits.get(name, ()))
+                    for value, (name, kind) in zip(values, ZONE_VALUES)
+                ]
+            )
+        zones.append((zone_table, converted))
+
+    device_id = _convert(config["id"], str, "id") if "id" in config else device.id
+
+    device.id = device_id
+    for channel, values in outputs + inputs:
+        for attribute, value in values.items():
+            setattr(channel, attribute, value)
+    for number, curve in curves:
+        device.curves[number] = curve
+        device._curve_interpolators.pop(number, None)
+    for zone_table, table in zones:
+        for zone, values in enumerate(table, 1):
+            zone_table.set(zone, *values)
+
+
+def apply_updates(device, updates):
+    """
+    Apply a batch of updates to the device, all of them or, when any is wrong, none of them.
+
+    Args:
+        device: the simulated controller
+        updates: dict of a configuration, see the module docstring, which may also hold a
+            "device" dict of DEVICE_ATTRIBUTES
+    """
+    config = dict(_section(updates, dict, "A batch of updates"))
+    attributes = config.pop("device", {})
+    unknown = set(_section(attributes, dict, "device")) - set(DEVICE_ATTRIBUTES)
+    if unknown:
+        raise ConfigError(f"Device attributes can not be set: {', '.join(sorted(unknown))}")
+    attributes = {
+        attribute: _convert(value, DEVICE_ATTRIBUTE_TYPES[attribute], f"Device {attribute}")
+        for attribute, value in attributes.items()
+    }
+    apply_config(device, config)
+    for attribute, value in attributes.items():
+        setattr(device, attribute, value)
+
+
+def state_digest(device):
+    """
+    Args:
+        device: the simulated controller
+
+    Returns:
+        hex digest of the device's configuration and run time attributes, which is the same
+        whenever the device is in the same state
+    """
+    state = export_config(device)
+    state["device"] = {attribute: getattr(device, attribute) for attribute in DEVICE_ATTRIBUTES}
+    return hashlib.sha1(json.dumps(state, sort_keys=True).encode()).hexdigest()
+
+
+def _is_yaml(path):
+    return path.lower().endswith((".yaml", ".yml"))
+
+
+def read_config_file(path):
+    """
+    Args:
+        path: path to a .json, .yaml or .yml file; YAML needs PyYAML
+
+    Returns:
+        dict of the configuration in the file
+    """
+    with open(path) as config_file:
+        if _is_yaml(path):
+            import yaml
+
+            return yaml.safe_load(config_file) or {}
+        return json.load(config_file)
+
+
+def write_config_file(path, config):
+    """
+    Args:
+        path: path to a .json, .yaml or .yml file; YAML needs PyYAML
+        config: dict of the configuration
+    """
+    with open(path, "w") as config_file:
+        if _is_yaml(path):
+            import yaml
+
+            yaml.safe_dump(config, config_file, sort_keys=False)
+        else:
+            json.dump(config, config_file, indent=2)
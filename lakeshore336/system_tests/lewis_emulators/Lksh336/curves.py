@@ -0,0 +1,206 @@
+from array import array
+from bisect import bisect_left
+from typing import ClassVar
+
+from .reply_cache import ReplyCache
+
+# Curves are numbered from 1. Curve 0 stands for "no curve" but still has storage so that inputs
+# without a curve have a header to read.
+NUM_CURVES = 59
+MAX_CURVE_POINTS = 200
+
+NAME_LENGTH = 15
+SERIAL_NUMBER_LENGTH = 10
+
+
+class CurveHeader(ReplyCache):
+    """
+    Class representing the header information of a curve.
+    """
+
+    REPLY_FORMATS: ClassVar[dict] = {
+        "header": "{0.name},{0.serial_number},{0.data_format},{0.temperature_limit},"
+        "{0.temperature_coefficient}",
+    }
+
+    __slots__ = (
+        "name",
+        "serial_number",
+        "data_format",
+        "temperature_limit",
+        "temperature_coefficient",
+    )
+
+    def __init__(self):
+        super(CurveHeader, self).__init__()
+        # Needs to be 15 characters.
+        self.name = "".rjust(NAME_LENGTH, "#")
+        # Needs to be 10 characters.
+        self.serial_number = "".rjust(SERIAL_NUMBER_LENGTH, "#")
+        self.data_format = 0
+        self.temperature_limit = 0.0
+        self.temperature_coefficient = 0
+
+
+class Curve(object):
+    """
+    Class holding the header and breakpoints of a curve. The breakpoints are held in two arrays of
+    doubles, one for the sensor units and one for the temperatures. Unused breakpoints are zero.
+    """
+
+    __slots__ = ("header", "units", "temperatures")
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        """
+        Reset the header and all breakpoints, as CRVDEL does.
+        """
+        self.header = CurveHeader()
+        self.set_points([], [])
+
+    @property
+    def num_points(self):
+        """
+        The number of breakpoints in use. The curve ends at the first breakpoint which is zero.
+        """
+        for index, (units, temperature) in enumerate(zip(self.units, self.temperatures)):
+            if units == 0 and temperature == 0:
+                return index
+        return MAX_CURVE_POINTS
+
+    def set_points(self, units, temperatures):
+        """
+        Replace all of the breakpoints.
+
+        Args:
+            units: sequence of sensor unit values
+            temperatures: sequence of temperatures, the same length as units
+        """
+        if len(units) != len(temperatures):
+            raise ValueError("Curve needs the same number of units and temperatures")
+        if len(units) > MAX_CURVE_POINTS:
+            raise ValueError(f"Curve can hold at most {MAX_CURVE_POINTS} breakpoints")
+        padding = MAX_CURVE_POINTS - len(units)
+        self.units = array("d", units)
+        self.units.extend([0.0] * padding)
+        self.temperatures = array("d", temperatures)
+        self.temperatures.extend([0.0] * padding)
+
+
+class CurveInterpolator(object):
+    """
+    Converts between sensor units and temperature by linear interpolation between the breakpoints
+    of a curve, as the controller does. The breakpoints are copied and sorted once so that each
+    conversion is a binary search; readings beyond the ends of the curve are clamped to them.
+    Build a new interpolator when the curve changes.
+    """
+
+    __slots__ = ("_units", "_temperatures", "_inverse_temperatures", "_inverse_units")
+
+    def __init__(self, curve):
+        num_points = curve.num_points
+        if num_points < 2:
+            raise ValueError("Curve needs at least two breakpoints to interpolate")
+        points = list(zip(curve.units[:num_points], curve.temperatures[:num_points]))
+
+        points.sort()
+        self._units = array("d", [units for units, _ in points])
+        self._temperatures = array("d", [temperature for _, temperature in points])
+
+        points.sort(key=lambda point: point[1])
+        self._inverse_temperatures = array("d", [temperature for _, temperature in points])
+        self._inverse_units = array("d", [units for units, _ in points])
+
+    @staticmethod
+    def _interpolate(xs, ys, x):
+        index = min(max(bisect_left(xs, x), 1), len(xs) - 1)
+        x0, x1 = xs[index - 1], xs[index]
+        y0, y1 = ys[index - 1], ys[index]
+        if x <= x0:
+            return y0
+        if x >= x1:
+            return y1
+        return y0 + (y1 - y0) * (x - x0) / (x1 - x0)
+
+    def temperature(self, units):
+        """
+        Args:
+            units: a sensor reading
+
+        Returns:
+            the temperature in kelvin for the reading
+        """
+        return self._interpolate(self._units, self._temperatures, units)
+
+    def temperatures(self, units):
+        """
+        Convert a sequence of sensor readings, e.g. a recorded trace.
+
+        Args:
+            units: iterable of sensor readings
+
+        Returns:
+            list of temperatures in kelvin
+        """
+        interpolate, xs, ys = self._interpolate, self._units, self._temperatures
+        return [interpolate(xs, ys, value) for value in units]
+
+    def units(self, temperature):
+        """
+        Args:
+            temperature: a temperature in kelvin
+
+        Returns:
+            the sensor reading for the temperature
+        """
+        return self._interpolate(self._inverse_temperatures, self._inverse_units, temperature)
+
+
+def read_curve_file(path):
+    """
+    Read a Lakeshore .340 calibration file.
+
+    A .340 file has a header of "key: value" lines (Sensor Model, Serial Number, Data Format,
+    SetPoint Limit, Temperature coefficient, Number of Breakpoints) followed by a table of
+    breakpoint number, sensor units and temperature.
+
+    Args:
+        path: path to the file
+
+    Returns:
+        Curve: the curve in the file
+    """
+    curve = Curve()
+    header = curve.header
+    units = []
+    temperatures = []
+
+    with open(path) as curve_file:
+        for line in curve_file:
+            key, separator, value = line.partition(":")
+            if separator:
+                key = key.strip().lower()
+                value = value.strip()
+                # Values may be followed by a description, e.g. "2      (Volts/Kelvin)".
+                first_word = value.split()[0] if value.split() else ""
+                if key == "sensor model":
+                    header.name = value[:NAME_LENGTH].ljust(NAME_LENGTH)
+                elif key == "serial number":
+                    header.serial_number = value[:SERIAL_NUMBER_LENGTH].ljust(SERIAL_NUMBER_LENGTH)
+                elif key == "data format":
+                    header.data_format = int(first_word)
+                elif key == "setpoint limit":
+                    header.temperature_limit = float(first_word)
+                elif key == "temperature coefficient":
+                    header.temperature_coefficient = int(first_word)
+                continue
+
+            fields = line.split()
+            if len(fields) == 3 and fields[0].isdigit():
+                units.append(float(fields[1]))
+                temperatures.append(float(fields[2]))
+
+    curve.set_points(units, temperatures)
+    return curve
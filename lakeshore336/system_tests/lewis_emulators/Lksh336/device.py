@@ -1,34 +1,69 @@
+import json
+import time
 from collections import OrderedDict
+from typing import ClassVar
 
 from lewis.devices import StateMachineDevice
 
-from .states import DefaultState
+from .autotune import Autotuner
+from .config import (
+    apply_config,
+    apply_updates,
+    export_config,
+    read_config_file,
+    state_digest,
+    write_config_file,
+)
+from .curves import NUM_CURVES, Curve, CurveInterpolator, read_curve_file
+from .faults import FaultEngine
+from .metrics import CommandMetrics, MetricsServer, render_metrics
+from .recorder import TrafficRecorder
+from .replay import TraceReplay
+from .reply_cache import ReplyCache
+from .snapshot import read_snapshot_file, restore_snapshot, take_snapshot, write_snapshot_file
+from .states import DefaultState, ReplayState, ThermalState
+from .thermal import MODE_ZONE, RANGE_FRACTIONS, ThermalModel
+from .timing import SerialTimingModel
+from .zones import ZoneTable
 
 NUM_OUTPUTS = 4
 INPUTS = ["A", "B", "C", "D"]
+# With the 3062 option card input D becomes the first of five scanner inputs, so it can also be
+# addressed as D1.
+OPTION_3062_INPUTS = INPUTS + ["D2", "D3", "D4", "D5"]
+INPUT_ALIASES = {"D1": "D"}
 
 
-class CurveHeader(object):
-    """
-    Class representing the header information of a curve.
-    """
-
-    def __init__(self):
-        # Needs to be 15 characters.
-        self.name = "".rjust(15, "#")
-        # Needs to be 10 characters.
-        self.serial_number = "".rjust(10, "#")
-        self.data_format = 0
-        self.temperature_limit = 0.0
-        self.temperature_coefficient = 0
-
-
-class Outputs(object):
+class Outputs(ReplyCache):
     """
     Class holding all of the output variables.
     """
 
+    REPLY_FORMATS: ClassVar[dict] = {
+        "ramp": "{0.ramp_status},{0.ramp_rate}",
+        "pid": "{0.p},{0.i},{0.d}",
+        "mode": "{0.mode},{0.control_input},{0.powerup}",
+    }
+
+    __slots__ = (
+        "heater_value",
+        "analog_output",
+        "setpoint",
+        "range",
+        "ramp_rate",
+        "ramp_status",
+        "manual_value",
+        "p",
+        "i",
+        "d",
+        "mode",
+        "control_input",
+        "powerup",
+        "heater_status",
+    )
+
     def __init__(self) -> None:
+        super(Outputs, self).__init__()
         self.heater_value = 0
         self.analog_output = 0
         self.setpoint = 0.0
@@ -45,12 +80,42 @@ class Outputs(object):
         self.heater_status = 0
 
 
-class Inputs(object):
+class Inputs(ReplyCache):
     """
     Class holding all of the input variables.
     """
 
+    REPLY_FORMATS: ClassVar[dict] = {
+        "alarm_status": "{0.alarm_high},{0.alarm_low}",
+        "alarm": "{0.alarm_enabled},{0.alarm_high_setpoint},{0.alarm_low_setpoint},"
+        "{0.alarm_deadband},{0.alarm_latching},{0.alarm_audible},{0.alarm_visible}",
+        "type": "{0.sensor_type},{0.auto_range_setting},{0.range},{0.compensation},{0.units}",
+    }
+
+    __slots__ = (
+        "kelvin_temperature",
+        "voltage_input",
+        "sensor_name",
+        "alarm_high",
+        "alarm_low",
+        "alarm_enabled",
+        "alarm_high_setpoint",
+        "alarm_low_setpoint",
+        "alarm_deadband",
+        "alarm_latching",
+        "alarm_audible",
+        "alarm_visible",
+        "reading_status",
+        "curve_number",
+        "sensor_type",
+        "auto_range_setting",
+        "range",
+        "compensation",
+        "units",
+    )
+
     def __init__(self) -> None:
+        super(Inputs, self).__init__()
         self.kelvin_temperature = 0
         self.voltage_input = 0
         self.sensor_name = ""
@@ -73,24 +138,420 @@ class Inputs(object):
 
 
 class SimulatedLksh336(StateMachineDevice):
+    def __init__(self, input_names=None, snapshot=None, **kwargs):
+        """
+        Args:
+            input_names: names of the inputs fitted, defaults to INPUTS
+            snapshot: path of a snapshot file to start from and reset to, see save_snapshot
+            kwargs: passed to StateMachineDevice
+        """
+        self.input_names = list(input_names or INPUTS)
+        # Snapshots kept by store_snapshot, by name. They outlive resets.
+        self.snapshots = {}
+        self._initial_snapshot = read_snapshot_file(snapshot) if snapshot else None
+        super(SimulatedLksh336, self).__init__(**kwargs)
+        if self._initial_snapshot is not None:
+            restore_snapshot(self, self._initial_snapshot)
+
     def _initialize_data(self):
         self.connected = True
 
         self.id = ""
-        self.outputs = [Outputs()] * NUM_OUTPUTS
-        self.inputs = {k: v for k, v in zip(INPUTS, [Inputs()] * len(INPUTS))}
-        self.input_curve_header = CurveHeader()
+        # Each channel needs its own instance, otherwise writing one channel changes them all.
+        self.outputs = [Outputs() for _ in range(NUM_OUTPUTS)]
+        self.inputs = {input: Inputs() for input in self.input_names}
+        # Number of commands each input has been addressed by.
+        self.input_query_counts = {input: 0 for input in self.input_names}
+        self.zones = [ZoneTable() for _ in range(NUM_OUTPUTS)]
+        self.curves = [Curve() for _ in range(NUM_CURVES + 1)]
+        # Interpolators of the curves in use, dropped whenever their curve is edited.
+        self._curve_interpolators = {}
+
+        self.thermal_simulation = False
+        self.thermal_model = ThermalModel(len(self.inputs), NUM_OUTPUTS)
+        self.autotuner = Autotuner(NUM_OUTPUTS)
+        self.trace_replay = None
+        # Only servers built on serve_client (the async_stream protocol and the fleet) delay
+        # their replies by the timing model, Lewis' stream adapter always answers at once.
+        self.timing = SerialTimingModel()
+        self.command_metrics = CommandMetrics()
+        self._metrics_server = None
+        self.traffic_recorder = None
+        self.faults = FaultEngine()
+
+    def reset(self):
+        """
+        Put the device back into the state it started in, so tests sharing an emulator do not see
+        each other's changes. Stops any metrics server, recording and replay.
+        """
+        self.stop_metrics_server()
+        self.stop_recording()
+        self.stop_replay()
+        self._initialize_data()
+        if self._initial_snapshot is not None:
+            restore_snapshot(self, self._initial_snapshot)
 
     def _get_state_handlers(self):
         return {
             "default": DefaultState(),
+            "thermal": ThermalState(),
+            "replay": ReplayState(),
         }
 
     def _get_initial_state(self):
         return "default"
 
     def _get_transition_handlers(self):
-        return OrderedDict([])
+        return OrderedDict(
+            [
+                (("default", "replay"), lambda: self.trace_replay is not None),
+                (("thermal", "replay"), lambda: self.trace_replay is not None),
+                (("replay", "default"), lambda: self.trace_replay is None),
+                (("default", "thermal"), lambda: self.thermal_simulation),
+                (("thermal", "default"), lambda: not self.thermal_simulation),
+            ]
+        )
+
+    def start_replay(self, path, speed=1.0, columns=None):
+        """
+        Play a recorded trace of the inputs and outputs back, taking over from any simulation.
+
+        Args:
+            path: path to a .csv or .npy trace, see TraceReplay
+            speed: how many seconds of the trace are played per second
+            columns: comma separated names of the columns of a .npy trace
+        """
+        self.stop_replay()
+        self.trace_replay = TraceReplay(
+            path,
+            self.inputs,
+            len(self.outputs),
+            float(speed),
+            columns.split(",") if columns else None,
+        )
+
+    def stop_replay(self):
+        if self.trace_replay is not None:
+            self.trace_replay.stop()
+            self.trace_replay = None
+
+    def set_timing(self, enabled, command_latency=None, baud_rate=None, max_queue_depth=None):
+        """
+        Configure the serial timing model and restart its statistics.
+
+        Args:
+            enabled: whether replies are delayed by the timing model
+            command_latency: processing time of each command in seconds, if changing
+            baud_rate: baud rate of the link, if changing
+            max_queue_depth: number of requests that can wait to be answered, if changing
+        """
+        self.timing.enabled = bool(enabled)
+        if command_latency is not None:
+            self.timing.command_latency = float(command_latency)
+        if baud_rate is not None:
+            self.timing.baud_rate = float(baud_rate)
+        if max_queue_depth is not None:
+            self.timing.max_queue_depth = int(max_queue_depth)
+        self.timing.reset_statistics(time.monotonic())
+
+    def set_command_latency(self, mnemonic, latency):
+        """
+        Set the processing time of one command, e.g. ("CRVPT", 0.05).
+
+        Args:
+            mnemonic: mnemonic of the command
+            latency: processing time in seconds, or None to use the default
+        """
+        if latency is None:
+            self.timing.command_latencies.pop(mnemonic.encode(), None)
+        else:
+            self.timing.command_latencies[mnemonic.encode()] = float(latency)
+
+    def get_timing_statistics(self):
+        """
+        Returns:
+            dict of the timing model's statistics: achieved commands per second, queue waits,
+            dropped requests and link utilisation
+        """
+        return self.timing.statistics(time.monotonic())
+
+    def reset_timing_statistics(self):
+        self.timing.reset_statistics(time.monotonic())
+
+    def update_zones(self):
+        """
+        Switch the PID, manual output, range, control input and ramp rate of every output in
+        zone mode to those of the zone its setpoint is in. Called on every simulation tick.
+        """
+        for output, zones in zip(self.outputs, self.zones):
+            if output.mode != MODE_ZONE:
+                continue
+            index = zones.lookup(output.setpoint)
+            if index is None:
+                continue
+            output.p = zones.p[index]
+            output.i = zones.i[index]
+            output.d = zones.d[index]
+            output.manual_value = zones.manual_outputs[index]
+            output.range = zones.ranges[index]
+            output.ramp_rate = zones.rates[index]
+            # Input 0 keeps the control input the output already has.
+            if zones.inputs[index]:
+                output.control_input = zones.inputs[index]
+
+    def start_autotune(self, output, mode):
+        self.autotuner.start(self, output, mode)
+
+    def get_autotune_status(self):
+        return self.autotuner.status()
+
+    def get_autotune_result(self, output):
+        """
+        Get the outcome of the last autotune of an output, e.g. to time a tuning workflow.
+
+        Args:
+            output: the output number
+
+        Returns:
+            dict of the tuning error, the simulated seconds the tune took, the identified
+            (gain, time constant, dead time) and the PID written, or None if never tuned
+        """
+        return self.autotuner.results[output - 1]
+
+    def _input(self, input):
+        try:
+            return self.inputs[INPUT_ALIASES.get(input, input)]
+        except KeyError:
+            raise ValueError(f"Input {input} does not exist")
+
+    def count_input_query(self, input):
+        input = INPUT_ALIASES.get(input, input)
+        if input in self.input_query_counts:
+            self.input_query_counts[input] += 1
+
+    def get_input_query_counts(self):
+        """
+        Returns:
+            dict of the number of commands each input has been addressed by since the last reset
+        """
+        return dict(self.input_query_counts)
+
+    def reset_input_query_counts(self):
+        self.input_query_counts = {input: 0 for input in self.input_names}
+
+    def get_command_metrics(self):
+        """
+        Returns:
+            dict of the count, errors and handling time of each command answered, see
+            CommandMetrics.snapshot
+        """
+        return self.command_metrics.snapshot()
+
+    def reset_command_metrics(self):
+        self.command_metrics.reset()
+
+    def start_metrics_server(self, port=9336, host="127.0.0.1"):
+        """
+        Serve the command metrics in the Prometheus text format at http://host:port/metrics.
+
+        Args:
+            port: port to listen on
+            host: address to listen on
+        """
+        self.stop_metrics_server()
+        self._metrics_server = MetricsServer(
+            lambda: render_metrics([({}, self.command_metrics)]), host, int(port)
+        )
+        self._metrics_server.start()
+
+    def stop_metrics_server(self):
+        if self._metrics_server is not None:
+            self._metrics_server.stop()
+            self._metrics_server = None
+
+    def start_recording(self, path):
+        """
+        Record every request and reply to a binary traffic log, see TrafficRecorder. The log can
+        be replayed with benchmarks.traffic_replay.
+
+        Args:
+            path: path of the log, replaced if it exists
+        """
+        self.stop_recording()
+        self.traffic_recorder = TrafficRecorder(path)
+
+    def stop_recording(self):
+        """
+        Returns:
+            the number of requests recorded, or 0 if nothing was recording
+        """
+        if self.traffic_recorder is None:
+            return 0
+        recorder, self.traffic_recorder = self.traffic_recorder, None
+        recorder.close()
+        return recorder.num_records
+
+    def schedule_fault(self, kind, start, duration, target=None, value=None):
+        """
+        Args:
+            kind: kind of fault, one of faults.FAULT_KINDS
+            start: seconds from now until the fault starts
+            duration: seconds the fault lasts
+            target: input or output the fault applies to, or None for all of them
+            value: size of the fault, see faults.DEFAULT_VALUES
+        """
+        self.faults.schedule([(start, duration, kind, target, value)])
+
+    def schedule_faults(self, events):
+        """
+        Schedule many faults in one call, all of them or, if any is wrong, none of them.
+
+        Args:
+            events: list of [start, duration, kind, target, value] events as schedule_fault takes
+                them, or the same as a JSON string
+
+        Returns:
+            the number of faults scheduled
+        """
+        if isinstance(events, str):
+            events = json.loads(events)
+        return self.faults.schedule(events)
+
+    def clear_faults(self, seed=None):
+        """
+        Args:
+            seed: new seed of the faults' random draws, or None to keep the current one
+        """
+        self.faults.reset(seed)
+
+    def get_fault_status(self):
+        """
+        Returns:
+            dict of the fault timeline's progress, see FaultEngine.status
+        """
+        return self.faults.status()
+
+    def get_config(self):
+        """
+        Returns:
+            dict of the device's whole configuration, see the config module
+        """
+        return export_config(self)
+
+    def apply_config(self, config):
+        """
+        Apply a whole or partial configuration in one call, instead of one backdoor call per field.
+
+        Args:
+            config: dict of the configuration, or the same as a JSON string
+        """
+        if isinstance(config, str):
+            config = json.loads(config)
+        apply_config(self, config)
+
+    def apply_updates(self, updates):
+        """
+        Apply a batch of attribute and channel updates in one backdoor call. Either every update
+        is applied or, when any of them is wrong, none is.
+
+        Args:
+            updates: dict of the updates, or the same as a JSON string, see the config module
+
+        Returns:
+            the state digest after the updates, as get_state_digest
+        """
+        if isinstance(updates, str):
+            updates = json.loads(updates)
+        apply_updates(self, updates)
+        return state_digest(self)
+
+    def get_state_digest(self):
+        """
+        Returns:
+            hex digest of the device's state, which changes whenever the state does
+        """
+        return state_digest(self)
+
+    def save_config(self, path):
+        """
+        Args:
+            path: path of a .json or .yaml file to save the configuration to
+        """
+        write_config_file(path, export_config(self))
+
+    def load_config(self, path):
+        """
+        Args:
+            path: path of a .json or .yaml file to apply the configuration of
+        """
+        apply_config(self, read_config_file(path))
+
+    def store_snapshot(self, name="default"):
+        """
+        Keep a snapshot of the device's whole state in memory, to go back to with
+        restore_snapshot.
+
+        Args:
+            name: name of the snapshot, replacing any kept under that name
+
+        Returns:
+            the size of the snapshot in bytes
+        """
+        self.snapshots[name] = take_snapshot(self)
+        return len(self.snapshots[name])
+
+    def restore_snapshot(self, name="default"):
+        """
+        Put the inputs, outputs, curves, zones and device attributes back as they were when a
+        snapshot was stored, in one call.
+
+        Args:
+            name: name of the snapshot
+        """
+        try:
+            data = self.snapshots[name]
+        except KeyError:
+            raise ValueError(f"No snapshot named {name}")
+        restore_snapshot(self, data)
+
+    def save_snapshot(self, path):
+        """
+        Args:
+            path: path of the file to save a snapshot of the device's state to, which the
+                emulator can start from, see the snapshot parameter
+        """
+        write_snapshot_file(path, take_snapshot(self))
+
+    def load_snapshot(self, path):
+        """
+        Args:
+            path: path of a snapshot file saved by save_snapshot
+        """
+        restore_snapshot(self, read_snapshot_file(path))
+
+    def get_output_values(self, attribute):
+        """
+        Get an attribute of every output in one call, e.g. all of the setpoints.
+
+        Args:
+            attribute: name of the output attribute
+
+        Returns:
+            list of the attribute values in output order
+        """
+        return [getattr(output, attribute) for output in self.outputs]
+
+    def get_input_values(self, attribute):
+        """
+        Get an attribute of every input in one call, e.g. all of the kelvin temperatures.
+
+        Args:
+            attribute: name of the input attribute
+
+        Returns:
+            list of the attribute values in input order
+        """
+        return [getattr(input, attribute) for input in self.inputs.values()]
 
     def get_output_heater_value(self, output):
         return self.outputs[output - 1].heater_value
@@ -102,69 +563,111 @@ class SimulatedLksh336(StateMachineDevice):
         return self.outputs[output - 1].setpoint
 
     def get_input_kelvin_temperature(self, input):
-        return self.inputs[input].kelvin_temperature
+        input = self._input(input)
+        interpolator = self.get_curve_interpolator(input.curve_number)
+        if interpolator is None:
+            return input.kelvin_temperature
+        return interpolator.temperature(input.voltage_input)
 
     def get_input_voltage_input(self, input):
-        return self.inputs[input].voltage_input
+        return self._input(input).voltage_input
 
     def get_output_range(self, output):
         return self.outputs[output - 1].range
 
     def get_output_ramp(self, output):
-        ouput = self.outputs[output - 1]
-        return f"{ouput.ramp_status},{ouput.ramp_rate}"
+        return self.outputs[output - 1].reply("ramp")
 
     def get_output_manual_value(self, output):
         return self.outputs[output - 1].manual_value
 
     def get_pid(self, output):
-        output = self.outputs[output - 1]
-        return f"{output.p},{output.i},{output.d}"
+        return self.outputs[output - 1].reply("pid")
 
     def get_output_mode(self, output):
-        output = self.outputs[output - 1]
-        return f"{output.mode},{output.control_input},{output.powerup}"
+        return self.outputs[output - 1].reply("mode")
+
+    def get_output_zone(self, output, zone):
+        return "{},{},{},{},{},{},{},{}".format(*self.zones[output - 1].get(zone))
 
     def get_input_sensor_name(self, input):
-        return self.inputs[input].sensor_name
+        return self._input(input).sensor_name
 
     def get_input_alarm_status(self, input):
-        input = self.inputs[input]
-        return f"{input.alarm_high},{input.alarm_low}"
+        return self._input(input).reply("alarm_status")
 
     def get_input_alarm(self, input):
-        input = self.inputs[input]
-        return "{},{},{},{},{},{},{}".format(
-            input.alarm_enabled,
-            input.alarm_high_setpoint,
-            input.alarm_low_setpoint,
-            input.alarm_deadband,
-            input.alarm_latching,
-            input.alarm_audible,
-            input.alarm_visible,
-        )
+        return self._input(input).reply("alarm")
 
     def get_input_reading_status(self, input):
-        return self.inputs[input].reading_status
+        return self._input(input).reading_status
 
     def get_output_heater_status(self, output):
         return self.outputs[output - 1].heater_status
 
     def get_input_curve_number(self, input):
-        return self.inputs[input].curve_number
-
-    def get_input_curve_header(self):
-        return "{},{},{},{},{}".format(
-            self.input_curve_header.name,
-            self.input_curve_header.serial_number,
-            self.input_curve_header.data_format,
-            self.input_curve_header.temperature_limit,
-            self.input_curve_header.temperature_coefficient,
-        )
+        return self._input(input).curve_number
+
+    def _curve(self, curve):
+        if not 0 <= curve <= NUM_CURVES:
+            raise ValueError(f"Curve {curve} does not exist")
+        return self.curves[curve]
+
+    def _curve_point_index(self, curve, index):
+        curve = self._curve(curve)
+        if not 1 <= index <= len(curve.units):
+            raise ValueError(f"Curve breakpoint {index} does not exist")
+        return curve, index - 1
+
+    def get_curve_interpolator(self, curve):
+        """
+        Get the interpolator converting sensor units to kelvin through a curve.
+
+        Args:
+            curve: the curve number
+
+        Returns:
+            CurveInterpolator, or None if the curve is 0 or has too few breakpoints
+        """
+        if curve == 0:
+            return None
+        try:
+            return self._curve_interpolators[curve]
+        except KeyError:
+            pass
+        try:
+            interpolator = CurveInterpolator(self._curve(curve))
+        except ValueError:
+            interpolator = None
+        self._curve_interpolators[curve] = interpolator
+        return interpolator
+
+    def convert_curve_units(self, curve, units):
+        """
+        Convert many sensor readings to kelvin through a curve in one call, e.g. to check a
+        recorded sensor trace against a calibration.
+
+        Args:
+            curve: the curve number
+            units: list of sensor readings
+
+        Returns:
+            list of temperatures in kelvin
+        """
+        interpolator = self.get_curve_interpolator(curve)
+        if interpolator is None:
+            raise ValueError(f"Curve {curve} has too few breakpoints to convert readings")
+        return interpolator.temperatures(units)
+
+    def get_input_curve_header(self, curve):
+        return self._curve(curve).header.reply("header")
+
+    def get_curve_point(self, curve, index):
+        curve, index = self._curve_point_index(curve, index)
+        return f"{curve.units[index]},{curve.temperatures[index]}"
 
     def get_input_type(self, input):
-        input = self.inputs[input]
-        return f"{input.sensor_type},{input.auto_range_setting},{input.range},{input.compensation},{input.units}"
+        return self._input(input).reply("type")
 
     def set_output_heater_value(self, output, value):
         self.outputs[output - 1].heater_value = value
@@ -176,10 +679,10 @@ class SimulatedLksh336(StateMachineDevice):
         self.outputs[output - 1].setpoint = value
 
     def set_input_kelvin_temperature(self, input, value):
-        self.inputs[input].kelvin_temperature = value
+        self._input(input).kelvin_temperature = value
 
     def set_input_voltage_input(self, input, value):
-        self.inputs[input].voltage_input = value
+        self._input(input).voltage_input = value
 
     def set_output_range(self, output, value):
         self.outputs[output - 1].range = value
@@ -204,18 +707,27 @@ class SimulatedLksh336(StateMachineDevice):
         output.control_input = control_input
         output.powerup = powerup
 
+    def set_output_zone(
+        self, output, zone, upper_bound, p, i, d, manual_output, range, input, rate
+    ):
+        if not 0 <= range < len(RANGE_FRACTIONS):
+            raise ValueError(f"Heater range {range} does not exist")
+        if not 0 <= input <= len(self.inputs):
+            raise ValueError(f"Input {input} does not exist")
+        self.zones[output - 1].set(zone, upper_bound, p, i, d, manual_output, range, input, rate)
+
     def set_input_sensor_name(self, input, value):
-        self.inputs[input].sensor_name = value
+        self._input(input).sensor_name = value
 
     def set_input_alarm_status(self, input, high, low):
-        input = self.inputs[input]
+        input = self._input(input)
         input.alarm_high = high
         input.alarm_low = low
 
     def set_input_alarm(
         self, input, enabled, high_setpoint, low_setpoint, deadband, latching, audible, visible
     ):
-        input = self.inputs[input]
+        input = self._input(input)
         input.alarm_enabled = enabled
         input.alarm_high_setpoint = high_setpoint
         input.alarm_low_setpoint = low_setpoint
@@ -225,25 +737,51 @@ class SimulatedLksh336(StateMachineDevice):
         input.alarm_visible = visible
 
     def set_input_reading_status(self, input, value):
-        self.inputs[input].reading_status = value
+        self._input(input).reading_status = value
 
     def set_output_heater_status(self, output, value):
         self.outputs[output - 1].heater_status = value
 
     def set_input_curve_number(self, input, value):
-        self.inputs[input].curve_number = value
+        input = self._input(input)
+        self._curve(value)
+        input.curve_number = value
 
     def set_input_curve_header(
-        self, _, name, serial_number, data_format, temperature_limit, temperature_coefficient
+        self, curve, name, serial_number, data_format, temperature_limit, temperature_coefficient
     ):
-        self.input_curve_header.name = name
-        self.input_curve_header.serial_number = serial_number
-        self.input_curve_header.data_format = data_format
-        self.input_curve_header.temperature_limit = temperature_limit
-        self.input_curve_header.temperature_coefficient = temperature_coefficient
+        header = self._curve(curve).header
+        header.name = name
+        header.serial_number = serial_number
+        header.data_format = data_format
+        header.temperature_limit = temperature_limit
+        header.temperature_coefficient = temperature_coefficient
+
+    def set_curve_point(self, curve, index, units, temperature):
+        self._curve_interpolators.pop(curve, None)
+        curve, index = self._curve_point_index(curve, index)
+        curve.units[index] = units
+        curve.temperatures[index] = temperature
+
+    def delete_curve(self, curve):
+        self._curve_interpolators.pop(curve, None)
+        self._curve(curve).clear()
+
+    def load_curve_file(self, curve, path):
+        """
+        Load a curve from a .340 calibration file in one call, instead of one CRVHDR and up to
+        200 CRVPT commands.
+
+        Args:
+            curve: number of the curve to replace
+            path: path to the .340 file
+        """
+        self._curve(curve)
+        self.curves[curve] = read_curve_file(path)
+        self._curve_interpolators.pop(curve, None)
 
     def set_input_type(self, input, sensor_type, auto_range_setting, range, compensation, units):
-        input = self.inputs[input]
+        input = self._input(input)
         input.sensor_type = sensor_type
         input.auto_range_setting = auto_range_setting
         input.range = range
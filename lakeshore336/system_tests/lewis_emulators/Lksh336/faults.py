@@ -0,0 +1,241 @@
+import heapq
+import math
+import random
+
+NOISE = "noise"
+READING_STATUS = "reading_status"
+DROP = "drop"
+TRUNCATE = "truncate"
+LATENCY = "latency"
+HEATER = "heater"
+
+# Value of each kind of fault when an event does not give one.
+DEFAULT_VALUES = {
+    # Standard deviation of the noise added to KRDG? and SRDG? readings.
+    NOISE: 0.1,
+    # RDGST? bits: 1 invalid reading, 16 temperature under range, 32 temperature over range,
+    # 64 sensor units zero, 128 sensor units over range.
+    READING_STATUS: 1,
+    # Probability of a reply being dropped or truncated.
+    DROP: 1.0,
+    TRUNCATE: 1.0,
+    # Seconds added to each reply.
+    LATENCY: 1.0,
+    # HTRST? code: 1 open heater load, 2 heater short.
+    HEATER: 1,
+}
+FAULT_KINDS = tuple(DEFAULT_VALUES)
+
+
+class FaultEngine(object):
+    """
+    Injects faults into the emulator's replies from a timeline of fault events. Each event starts
+    a fault of one kind at a time after it is scheduled and ends it after its duration:
+        (start, duration, kind, target, value)
+    The target is the input (noise, reading status) or output (heater) the fault applies to, or
+    None for all of them; drops, truncations and latency spikes apply to whole requests. Faults of
+    the same kind overlap: noise adds up, reading status bits are combined, the latest heater
+    fault is reported and each drop or truncation probability is tried in turn.
+
+    The timeline is a heap of fault starts and ends, so each step only looks at the events due.
+    The random draws come from a seeded generator, so the same timeline and requests give the
+    same faults.
+    """
+
+    def __init__(self, seed=0):
+        """
+        Args:
+            seed: seed of the random draws
+        """
+        self.reset(seed)
+
+    def reset(self, seed=None):
+        """
+        Remove every scheduled and active fault and restart the random draws.
+
+        Args:
+            seed: new seed of the random draws, or None to keep the current one
+        """
+        if seed is not None:
+            self.seed = seed
+        self.random = random.Random(self.seed)
+        self.elapsed = 0.0
+        # Heap of (time, sequence number, starts, kind, target, value).
+        self._timeline = []
+        self._num_events = 0
+        # Values of the active faults by (kind, target).
+        self._active = {}
+        self.injected = dict.fromkeys(FAULT_KINDS, 0)
+
+    @staticmethod
+    def _event(start, duration, kind, target=None, value=None):
+        if kind not in DEFAULT_VALUES:
+            raise ValueError(f"Unknown fault {kind!r}, expected one of {', '.join(FAULT_KINDS)}")
+        start = float(start)
+        duration = float(duration)
+        if start < 0 or duration <= 0:
+            raise ValueError("Faults need a start of 0 or more and a positive duration")
+        if value is None:
+            value = DEFAULT_VALUES[kind]
+        target = None if target is None else str(target)
+        return start, duration, kind, target, value
+
+    def schedule(self, events):
+        """
+        Add fault events to the timeline. Every event is checked before any is added.
+
+        Args:
+            events: iterable of (start, duration, kind, target, value) events, where start is in
+                seconds from now and target and value may be left out
+
+        Returns:
+            the number of events added
+        """
+        events = [self._event(*event) for event in events]
+        for start, duration, kind, target, value in events:
+            time = self.elapsed + start
+            self._timeline.append((time, self._num_events, True, kind, target, value))
+            self._timeline.append(
+                (time + duration, self._num_events + 1, False, kind, target, value)
+            )
+            self._num_events += 2
+        heapq.heapify(self._timeline)
+        return len(events)
+
+    def step(self, dt):
+        """
+        Start and end the faults due by the end of the step.
+
+        Args:
+            dt: seconds since the last step
+        """
+        self.elapsed += dt
+        timeline = self._timeline
+        while timeline and timeline[0][0] <= self.elapsed:
+            _, _, starts, kind, target, value = heapq.heappop(timeline)
+            key = (kind, target)
+            if starts:
+                self._active.setdefault(key, []).append(value)
+            else:
+                values = self._active[key]
+                values.remove(value)
+                if not values:
+                    del self._active[key]
+
+    @property
+    def pending_events(self):
+        return len(self._timeline)
+
+    def active_faults(self):
+        """
+        Returns:
+            list of (kind, target, value) of the active faults
+        """
+        return [
+            (kind, target, value)
+            for (kind, target), values in self._active.items()
+            for value in values
+        ]
+
+    def _values(self, kind, target=None):
+        active = self._active
+        values = active.get((kind, None), [])
+        if target is not None:
+            values = values + active.get((kind, str(target)), [])
+        return values
+
+    def reading(self, input, value):
+        """
+        Args:
+            input: name of the input read
+            value: the reading without noise
+
+        Returns:
+            the reading with the noise of the active noise faults
+        """
+        if not self._active:
+            return value
+        deviations = self._values(NOISE, input)
+        if not deviations:
+            return value
+        self.injected[NOISE] += 1
+        deviation = math.sqrt(sum(deviation**2 for deviation in deviations))
+        return float(value) + self.random.gauss(0.0, deviation)
+
+    def reading_status(self, input, status):
+        """
+        Args:
+            input: name of the input
+            status: the reading status without faults
+
+        Returns:
+            the status with the bits of the active reading status faults set
+        """
+        if not self._active:
+            return status
+        for bits in self._values(READING_STATUS, input):
+            self.injected[READING_STATUS] += 1
+            status = int(status) | int(bits)
+        return status
+
+    def heater_status(self, output, status):
+        """
+        Args:
+            output: number of the output
+            status: the heater status without faults
+
+        Returns:
+            the code of the latest active heater fault, or the status if there is none
+        """
+        if not self._active:
+            return status
+        codes = self._values(HEATER, output)
+        if not codes:
+            return status
+        self.injected[HEATER] += 1
+        return codes[-1]
+
+    def reply(self, reply):
+        """
+        Args:
+            reply: the reply to a whole request, or None if there is none
+
+        Returns:
+            the reply, which the active faults may have dropped (None) or cut short
+        """
+        if reply is None or not self._active:
+            return reply
+        for probability in self._values(DROP):
+            if self.random.random() < probability:
+                self.injected[DROP] += 1
+                return None
+        for probability in self._values(TRUNCATE):
+            if reply and self.random.random() < probability:
+                self.injected[TRUNCATE] += 1
+                reply = reply[: self.random.randrange(len(reply))]
+        return reply
+
+    def latency(self):
+        """
+        Returns:
+            seconds the active latency spikes add to a reply
+        """
+        if not self._active:
+            return 0.0
+        spikes = self._values(LATENCY)
+        if spikes:
+            self.injected[LATENCY] += 1
+        return float(sum(spikes))
+
+    def status(self):
+        """
+        Returns:
+            dict of the seconds stepped, the events still to come, the active faults and the
+            number of times each kind of fault was injected
+        """
+        return {
+            "elapsed": self.elapsed,
+            "pending_events": self.pending_events,
+            "active": self.active_faults(),
+            "injected": dict(self.injected),
+        }
@@ -0,0 +1,194 @@
+"""
+Host many simulated Lksh336 controllers in one process, each listening on its own port.
+
+All of the devices share one asyncio event loop, one dispatch table and one simulation timer
+which steps every device in the same tick, so a fleet of controllers for IOC load testing costs
+one interpreter instead of one Lewis process per controller.
+
+Run from the system_tests directory, e.g. for 20 controllers on ports 57000-57019:
+    python -m lewis_emulators.Lksh336.fleet --devices 20 --base-port 57000
+"""
+
+import argparse
+import asyncio
+import contextlib
+import time
+
+from lewis.core.logging import has_log
+
+from .device import OPTION_3062_INPUTS, SimulatedLksh336
+from .interfaces import Lksh336StreamInterface
+from .interfaces.async_stream_interface import serve_client
+from .metrics import MetricsServer, render_metrics
+
+
+class FleetMember(object):
+    """
+    One simulated controller of the fleet and the server answering its requests.
+    """
+
+    def __init__(self, port, input_names=None, snapshot=None):
+        self.port = port
+        self.device = SimulatedLksh336(input_names, snapshot)
+        self.interface = Lksh336StreamInterface()
+        self.interface.device = self.device
+        self._server = None
+
+    async def start(self, host):
+        self._server = await asyncio.start_server(self._handle_client, host, self.port)
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle_client(self, reader, writer):
+        # Every device runs in the event loop's thread, so there is nothing to lock.
+        await serve_client(reader, writer, self.interface, contextlib.nullcontext())
+
+
+@has_log
+class Fleet(object):
+    """
+    A fleet of simulated controllers stepped together by one simulation timer.
+    """
+
+    def __init__(
+        self,
+        num_devices,
+        base_port,
+        host="0.0.0.0",
+        cycle_delay=0.1,
+        input_names=None,
+        snapshot=None,
+    ):
+        """
+        Args:
+            num_devices: number of controllers to simulate
+            base_port: port of the first controller, the others follow consecutively
+            host: address to listen on
+            cycle_delay: seconds between simulation ticks
+            input_names: names of the inputs of every controller, defaults to INPUTS
+            snapshot: path of a snapshot file every controller starts from, see
+                SimulatedLksh336.save_snapshot
+        """
+        self.host = host
+        self.cycle_delay = cycle_delay
+        self.members = [
+            FleetMember(base_port + index, input_names, snapshot) for index in range(num_devices)
+        ]
+
+    @property
+    def devices(self):
+        return [member.device for member in self.members]
+
+    def render_metrics(self):
+        """
+        Returns:
+            the command metrics of every device in the Prometheus text format, labelled with the
+            device's port
+        """
+        return render_metrics(
+            [({"device": member.port}, member.device.command_metrics) for member in self.members]
+        )
+
+    def tick(self, dt):
+        """
+        Step the simulation of every device.
+
+        Args:
+            dt: time step in seconds
+        """
+        for member in self.members:
+            member.device.process(dt)
+
+    async def run(self, duration=None):
+        """
+        Serve all of the devices and step their simulations until cancelled.
+
+        Args:
+            duration: seconds to run for, or None to run until cancelled
+        """
+        for member in self.members:
+            await member.start(self.host)
+        self.log.info(
+            "Serving %d devices on ports %d-%d",
+            len(self.members),
+            self.members[0].port,
+            self.members[-1].port,
+        )
+
+        start = last_tick = time.monotonic()
+        try:
+            while duration is None or last_tick - start < duration:
+                await asyncio.sleep(self.cycle_delay)
+                now = time.monotonic()
+                self.tick(now - last_tick)
+                last_tick = now
+        finally:
+            for member in self.members:
+                await member.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--devices", type=int, default=10, help="Number of controllers")
+    parser.add_argument("--base-port", type=int, default=57000, help="Port of the first device")
+    parser.add_argument("--host", default="0.0.0.0", help="Address to listen on")
+    parser.add_argument("--cycle-delay", type=float, default=0.1, help="Seconds between ticks")
+    parser.add_argument("--duration", type=float, default=None, help="Seconds to run for")
+    parser.add_argument(
+        "--thermal", action="store_true", help="Start every device's thermal simulation"
+    )
+    parser.add_argument(
+        "--option-3062", action="store_true", help="Fit every device with the 3062 scanner card"
+    )
+    parser.add_argument(
+        "--snapshot", default=None, help="Snapshot file every device starts from and resets to"
+    )
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=None,
+        help="Delay replies by the serial timing model with this processing time per command",
+    )
+    parser.add_argument(
+        "--baud",
+        type=float,
+        default=None,
+        help="Delay replies by the serial timing model with this baud rate",
+    )
+    parser.add_argument(
+        "--metrics-port", type=int, default=None, help="Serve the metrics of every device over HTTP"
+    )
+    args = parser.parse_args()
+
+    input_names = OPTION_3062_INPUTS if args.option_3062 else None
+    fleet = Fleet(
+        args.devices, args.base_port, args.host, args.cycle_delay, input_names, args.snapshot
+    )
+    for device in fleet.devices:
+        if args.thermal:
+            device.thermal_simulation = True
+        if args.latency is not None or args.baud is not None:
+            device.set_timing(True, args.latency, args.baud)
+
+    metrics_server = None
+    if args.metrics_port is not None:
+        metrics_server = MetricsServer(fleet.render_metrics, args.host, args.metrics_port)
+        metrics_server.start()
+
+    try:
+        asyncio.run(fleet.run(args.duration))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if metrics_server is not None:
+            metrics_server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,4 @@
+from .async_stream_interface import Lksh336AsyncStreamInterface
 from .stream_interface import Lksh336StreamInterface
 
-__all__ = ["Lksh336StreamInterface"]
+__all__ = ["Lksh336StreamInterface", "Lksh336AsyncStreamInterface"]
@@ -0,0 +1,117 @@
+import asyncio
+
+from lewis.adapters.stream import StreamAdapter
+
+# Import the module rather than the class, otherwise Lewis finds the stream interface in this
+# module as well and reports its protocol as defined twice.
+from . import stream_interface
+
+
+def request_mnemonics(request):
+    """
+    Args:
+        request: the request without terminator, as bytes
+
+    Returns:
+        list of the mnemonics of the commands in the request
+    """
+    return [
+        part.split(None, 1)[0] for part in stream_interface.split_commands(request) if part.strip()
+    ]
+
+
+async def serve_client(reader, writer, interface, device_lock):
+    """
+    Answer the requests of one client, each as soon as its terminator arrives. When the device's
+    serial timing model is enabled each reply is instead sent when the model says the controller
+    would have finished it, and requests the model drops are not answered. Latency spikes of the
+    device's fault engine hold replies back further. Requests are still read as they arrive, so
+    a client sending several requests without waiting queues them up, and the replies are sent
+    in the order of the requests.
+
+    Args:
+        reader: stream reader of the client connection
+        writer: stream writer of the client connection
+        interface: the stream interface answering the requests
+        device_lock: lock (or context manager) held while the device is accessed
+    """
+    in_terminator = interface.in_terminator.encode()
+    out_terminator = interface.out_terminator.encode()
+    loop = asyncio.get_running_loop()
+    last_completion = 0.0
+    try:
+        while True:
+            request = await reader.readuntil(in_terminator)
+            arrival = loop.time()
+            request = request[: -len(in_terminator)]
+            completion = arrival
+            with device_lock:
+                reply = interface.process_request(request)
+                reply = reply.encode() + out_terminator if reply is not None else b""
+                timing = interface.device.timing
+                if timing.enabled:
+                    num_bytes = len(request) + len(in_terminator) + len(reply)
+                    completion = timing.schedule(arrival, request_mnemonics(request), num_bytes)
+                if completion is not None:
+                    completion += interface.device.faults.latency()
+
+            if completion is None or not reply:
+                continue
+            # The controller handles one request at a time, so the replies fall due in the order
+            # the requests arrived.
+            completion = last_completion = max(completion, last_completion)
+            if completion <= arrival:
+                writer.write(reply)
+                await writer.drain()
+            else:
+                loop.call_at(completion, writer.write, reply)
+    except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+class AsyncStreamAdapter(StreamAdapter):
+    """
+    Stream adapter which answers every request as soon as its terminator arrives. Lewis' stream
+    adapter only reads from its clients when it is handled, so each reply waits for the next
+    adapter cycle; here the event loop wakes up for each request while the device simulation
+    carries on stepping on its own timer.
+
+    Accepts the same options as the stream adapter, apart from telnet_mode.
+    """
+
+    async def start_server(self):
+        if self._server is None:
+            self._server = await asyncio.start_server(
+                self._handle_client,
+                self._options.bind_address,
+                self._options.port,
+                reuse_address=True,
+            )
+
+    async def stop_server(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def handle(self, cycle_delay=0.1):
+        # Requests are answered by the server's own tasks, so there is nothing to poll.
+        await asyncio.sleep(cycle_delay)
+
+    async def _handle_client(self, reader, writer):
+        await serve_client(reader, writer, self.interface, self.device_lock)
+
+
+class Lksh336AsyncStreamInterface(stream_interface.Lksh336StreamInterface):
+    """
+    The Lksh336 stream protocol served by the AsyncStreamAdapter, e.g.
+        lewis -k lewis_emulators Lksh336 -p "async_stream: {port: 57677}"
+    """
+
+    protocol = "async_stream"
+
+    @property
+    def adapter(self):
+        return AsyncStreamAdapter
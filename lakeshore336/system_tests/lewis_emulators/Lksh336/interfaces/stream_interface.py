@@ -1,36 +1,160 @@
-from lewis.adapters.stream import StreamInterface
+import functools
+import re
+import time
+
+from lewis.adapters.stream import Func, StreamInterface, regex
 from lewis.core.logging import has_log
 from lewis.utils.command_builder import CmdBuilder
 from lewis.utils.replies import conditional_reply
 
+from ..command_table import CommandTable
+from ..curves import NAME_LENGTH, SERIAL_NUMBER_LENGTH
+from ..stream_protocol import PROTOCOL_FILE, read_protocol
+
+# The controller accepts several commands chained with this separator on one line and answers
+# all of the queries in the line with a single reply joined by the same separator.
+COMMAND_SEPARATOR = ";"
+# The separator outside double quoted strings, such as the name of INNAME, which may contain it.
+_UNQUOTED_SEPARATOR = re.compile(r';(?=(?:[^"]*"[^"]*")*[^"]*$)')
+_UNQUOTED_SEPARATOR_BYTES = re.compile(_UNQUOTED_SEPARATOR.pattern.encode())
+# A line of at least two commands, each of which may hold quoted strings.
+_COMPOUND_REQUEST = r'(?:[^;"]|"[^"]*")*(?:;(?:[^;"]|"[^"]*")*)+'
+
+# Characters which end the literal part of a command pattern.
+_REGEX_SPECIAL_CHARACTERS = set(".^$*+?{}[]|()")
+
+
+def split_commands(request):
+    """
+    Args:
+        request: a line of commands chained with the command separator, as str or bytes
+
+    Returns:
+        list of the commands, split at the separators outside quoted strings
+    """
+    separator = _UNQUOTED_SEPARATOR_BYTES if isinstance(request, bytes) else _UNQUOTED_SEPARATOR
+    return separator.split(request)
+
+
+def command_mnemonic(pattern):
+    """
+    Get the command mnemonic (the first word, e.g. "KRDG?") that a command pattern matches.
+
+    Args:
+        pattern: regular expression of the command, as built by CmdBuilder
+
+    Returns:
+        the mnemonic as bytes, or None if the pattern does not start with a literal word
+    """
+    literal = []
+    ends_with_pattern = False
+    characters = iter(pattern)
+    for character in characters:
+        if character == "\\":
+            literal.append(next(characters, ""))
+        elif character in _REGEX_SPECIAL_CHARACTERS:
+            ends_with_pattern = character == "$"
+            break
+        else:
+            literal.append(character)
+
+    mnemonic, space, _ = "".join(literal).partition(" ")
+    if not mnemonic or not (space or ends_with_pattern):
+        return None
+    return mnemonic.encode()
+
+
+def counts_input_query(function):
+    """
+    Count each call of a command handler against the input it addresses, its first argument.
+    """
+
+    @functools.wraps(function)
+    def wrapper(self, input, *args):
+        self.device.count_input_query(input)
+        return function(self, input, *args)
+
+    return wrapper
+
+
+class SharedCommand(object):
+    """
+    A command that calls its interface method on whichever interface it is given, so that one
+    dispatch table can serve many interfaces.
+    """
+
+    __slots__ = ("name", "matcher", "function", "argument_mappings", "return_mapping")
+
+    def __init__(self, cmd):
+        """
+        Args:
+            cmd: a command bound to an interface method by Lewis
+        """
+        self.name = cmd.func.__name__
+        self.matcher = cmd.matcher
+        self.function = cmd.func.__func__
+        self.argument_mappings = cmd.argument_mappings
+        self.return_mapping = cmd.return_mapping
+
+    def process(self, interface, arguments):
+        """
+        Call the command's method on an interface.
+
+        Args:
+            interface: the interface to call the method on
+            arguments: the arguments matched from the request
+
+        Returns:
+            the mapped return value, as Lewis would return it
+        """
+        if self.argument_mappings is not None:
+            arguments = [mapping(arg) for mapping, arg in zip(self.argument_mappings, arguments)]
+        value = self.function(interface, *arguments)
+        if callable(self.return_mapping):
+            return self.return_mapping(value)
+        if self.return_mapping is not None:
+            return self.return_mapping
+        return value
+
 
 @has_log
 class Lksh336StreamInterface(StreamInterface):
     in_terminator = "\r\n"
     out_terminator = "\r\n"
 
+    # Dispatch table shared by all instances, built when the first device is bound.
+    _commands_by_mnemonic = None
+    _unindexed_commands = None
+    # The protocol file's queries matched to their commands, see the command_table module.
+    _commands_by_request = None
+    command_table = None
+
     def __init__(self):
         super(Lksh336StreamInterface, self).__init__()
         self.commands = {
+            CmdBuilder(self.handle_compound).arg(_COMPOUND_REQUEST).eos().build(),
             CmdBuilder(self.get_id).escape("*IDN?").eos().build(),
             CmdBuilder(self.get_htr).escape("HTR? ").int().eos().build(),
             CmdBuilder(self.get_aout).escape("AOUT? ").int().eos().build(),
             CmdBuilder(self.get_setp).escape("SETP? ").int().eos().build(),
-            CmdBuilder(self.get_krdg).escape("KRDG? ").string().eos().build(),
-            CmdBuilder(self.get_srdg).escape("SRDG? ").string().eos().build(),
+            CmdBuilder(self.get_krdg).escape("KRDG? ").any_except(";").eos().build(),
+            CmdBuilder(self.get_srdg).escape("SRDG? ").any_except(";").eos().build(),
             CmdBuilder(self.get_range).escape("RANGE? ").int().eos().build(),
             CmdBuilder(self.get_ramp).escape("RAMP? ").int().eos().build(),
             CmdBuilder(self.get_mout).escape("MOUT? ").int().eos().build(),
             CmdBuilder(self.get_pid).escape("PID? ").int().eos().build(),
             CmdBuilder(self.get_om).escape("OUTMODE? ").int().eos().build(),
-            CmdBuilder(self.get_inname).escape("INNAME? ").string().eos().build(),
-            CmdBuilder(self.get_alarmst).escape("ALARMST? ").string().eos().build(),
-            CmdBuilder(self.get_alarm).escape("ALARM? ").string().eos().build(),
-            CmdBuilder(self.get_rdgst).escape("RDGST? ").string().eos().build(),
+            CmdBuilder(self.get_inname).escape("INNAME? ").any_except(";").eos().build(),
+            CmdBuilder(self.get_alarmst).escape("ALARMST? ").any_except(";").eos().build(),
+            CmdBuilder(self.get_alarm).escape("ALARM? ").any_except(";").eos().build(),
+            CmdBuilder(self.get_rdgst).escape("RDGST? ").any_except(";").eos().build(),
             CmdBuilder(self.get_htrst).escape("HTRST? ").int().eos().build(),
-            CmdBuilder(self.get_incrv).escape("INCRV? ").string().eos().build(),
+            CmdBuilder(self.get_incrv).escape("INCRV? ").any_except(";").eos().build(),
             CmdBuilder(self.get_crvhdr).escape("CRVHDR? ").int().eos().build(),
-            CmdBuilder(self.get_intype).escape("INTYPE? ").string().eos().build(),
+            CmdBuilder(self.get_intype).escape("INTYPE? ").any_except(";").eos().build(),
+            CmdBuilder(self.get_tunest).escape("TUNEST?").eos().build(),
+            CmdBuilder(self.get_crvpt).escape("CRVPT? ").int().escape(",").int().eos().build(),
+            CmdBuilder(self.get_zone).escape("ZONE? ").int().escape(",").int().eos().build(),
             CmdBuilder(self.set_setp).escape("SETP ").int().escape(",").float().eos().build(),
             CmdBuilder(self.set_range).escape("RANGE ").int().escape(",").int().eos().build(),
             CmdBuilder(self.set_ramp)
@@ -65,12 +189,104 @@ class Lksh336StreamInterface(StreamInterface):
             .int()
             .eos()
             .build(),
+            CmdBuilder(self.set_crvhdr)
+            .escape("CRVHDR ")
+            .int()
+            .escape(",")
+            .any_except(",;")
+            .escape(",")
+            .any_except(",;")
+            .escape(",")
+            .int()
+            .escape(",")
+            .float()
+            .escape(",")
+            .int()
+            .eos()
+            .build(),
+            CmdBuilder(self.set_crvpt)
+            .escape("CRVPT ")
+            .int()
+            .escape(",")
+            .int()
+            .escape(",")
+            .float()
+            .escape(",")
+            .float()
+            .eos()
+            .build(),
+            CmdBuilder(self.set_zone)
+            .escape("ZONE ")
+            .int()
+            .escape(",")
+            .int()
+            .escape(",")
+            .float()
+            .escape(",")
+            .float()
+            .escape(",")
+            .float()
+            .escape(",")
+            .float()
+            .escape(",")
+            .float()
+            .escape(",")
+            .int()
+            .escape(",")
+            .int()
+            .escape(",")
+            .float()
+            .eos()
+            .build(),
+            CmdBuilder(self.set_atune).escape("ATUNE ").int().escape(",").int().eos().build(),
+            CmdBuilder(self.set_alarm)
+            .escape("ALARM ")
+            .any_except(",;")
+            .escape(",")
+            .int()
+            .escape(",")
+            .float()
+            .escape(",")
+            .float()
+            .escape(",")
+            .float()
+            .escape(",")
+            .int()
+            .escape(",")
+            .int()
+            .escape(",")
+            .int()
+            .eos()
+            .build(),
+            CmdBuilder(self.set_intype)
+            .escape("INTYPE ")
+            .any_except(",;")
+            .escape(",")
+            .int()
+            .escape(",")
+            .int()
+            .escape(",")
+            .int()
+            .escape(",")
+            .int()
+            .escape(",")
+            .int()
+            .eos()
+            .build(),
+            CmdBuilder(self.set_incrv)
+            .escape("INCRV ")
+            .any_except(",;")
+            .escape(",")
+            .int()
+            .eos()
+            .build(),
+            CmdBuilder(self.delete_crv).escape("CRVDEL ").int().eos().build(),
             CmdBuilder(self.set_inname)
             .escape("INNAME ")
-            .string()
+            .any_except(",;")
             .escape(",")
             .escape('"')
-            .string()
+            .any_except('"')
             .escape('"')
             .eos()
             .build(),
@@ -87,6 +303,163 @@ class Lksh336StreamInterface(StreamInterface):
         """
         self.log.error("An error occurred at request " + repr(request) + ": " + repr(error))
 
+    def _bind_device(self):
+        """
+        Bind the commands and index them by mnemonic. Lewis tries every command's regular
+        expression in turn for each request, so a dispatcher matching any request is put in front
+        of the bound commands; it looks up the few commands for the request's mnemonic and only
+        tries the commands without a literal mnemonic after those.
+
+        The queries of the IOC's protocol file are also matched once here, so a poll is answered
+        by looking its whole request up. Protocols no command answers are logged.
+
+        The index holds the interface's unbound methods, so it is built once per class and shared
+        by every interface in the process.
+        """
+        super(Lksh336StreamInterface, self)._bind_device()
+
+        cls = type(self)
+        if cls.__dict__.get("_commands_by_mnemonic") is None:
+            commands_by_mnemonic = {}
+            unindexed_commands = []
+            for cmd in self.bound_commands:
+                mnemonic = command_mnemonic(cmd.matcher.pattern)
+                if mnemonic is None:
+                    unindexed_commands.append(SharedCommand(cmd))
+                else:
+                    commands_by_mnemonic.setdefault(mnemonic, []).append(SharedCommand(cmd))
+            cls._commands_by_mnemonic = commands_by_mnemonic
+            cls._unindexed_commands = unindexed_commands
+            cls._commands_by_request = {}
+            try:
+                protocol_file = read_protocol()
+            except OSError:
+                self.log.warning("No protocol file at %s, polls are not indexed", PROTOCOL_FILE)
+            else:
+                command_names = [
+                    cmd.name for commands in commands_by_mnemonic.values() for cmd in commands
+                ] + [cmd.name for cmd in unindexed_commands]
+                cls.command_table = CommandTable(self._match, command_names, protocol_file)
+                cls._commands_by_request = cls.command_table.commands_by_request
+                for name in cls.command_table.unanswered_protocols:
+                    self.log.warning("No command answers protocol %s", name)
+
+        dispatcher = Func(self.dispatch_request, regex("(.*)"))
+        self.bound_commands.insert(0, dispatcher)
+
+    def dispatch(self, request):
+        """
+        Process a request with the command indexed for it, and record the time taken and any
+        failure in the device's command metrics.
+
+        Args:
+            request: the request without terminator, as bytes
+
+        Returns:
+            the reply to the command, or None if the command gives no reply
+        """
+        start = time.perf_counter()
+        metrics = self.device.command_metrics
+        matched = self._commands_by_request.get(request) or self._match(request)
+        if matched is None:
+            metrics.record_unmatched()
+            raise RuntimeError(f"None of the device's commands matched {request!r}.")
+        cmd, arguments = matched
+        # Lewis only logs the catch-all dispatcher's pattern, so name the command which runs.
+        self.log.debug("Processing request %s using command %s", request, cmd.name)
+        try:
+            reply = cmd.process(self, arguments)
+        except Exception:
+            metrics.record(cmd.name, time.perf_counter() - start, error=True)
+            raise
+        metrics.record(cmd.name, time.perf_counter() - start)
+        return reply
+
+    def _match(self, request):
+        """
+        Args:
+            request: the request without terminator, as bytes
+
+        Returns:
+            (command, matched arguments) of the first command registered for the request's
+            mnemonic, or failing that of the commands without one, which matches the request, or
+            None if none does
+        """
+        mnemonic = request.split(b" ", 1)[0]
+        for commands in (self._commands_by_mnemonic.get(mnemonic, ()), self._unindexed_commands):
+            for cmd in commands:
+                arguments = cmd.matcher.match(request)
+                if arguments is not None:
+                    return cmd, arguments
+        return None
+
+    def dispatch_request(self, request):
+        """
+        Process a whole request from a client, passing its reply through the device's active
+        faults and adding both to the device's traffic recording if one is running.
+
+        Args:
+            request: the request without terminator, as bytes
+
+        Returns:
+            the reply to the request, or None if it gives no reply
+        """
+        recorder = self.device.traffic_recorder
+        if recorder is None:
+            return self.device.faults.reply(self.dispatch(request))
+        reply = None
+        try:
+            reply = self.device.faults.reply(self.dispatch(request))
+            return reply
+        finally:
+            recorder.record(request, reply)
+
+    def process_request(self, request):
+        """
+        Answer a request as Lewis' stream handler would, for servers other than Lewis' own.
+        Requests which match no command or have arguments the device rejects are answered as
+        errors; any other exception is a bug in a handler and is raised.
+
+        Args:
+            request: the request without terminator, as bytes
+
+        Returns:
+            the reply without terminator, or None if there is no reply
+        """
+        try:
+            return self.dispatch_request(request)
+        except (RuntimeError, ValueError, IndexError) as error:
+            return self.handle_error(request, error)
+
+    def _process_single(self, request):
+        """
+        Process one command of a compound request using the registered commands.
+
+        Args:
+            request: a single command without terminator or separator
+
+        Returns:
+            the reply to the command, or None if the command gives no reply
+        """
+        return self.dispatch(request.strip().encode())
+
+    def handle_compound(self, request):
+        """
+        Process a line of commands chained with the command separator, e.g.
+        "KRDG? A;KRDG? B;KRDG? C;KRDG? D". Each command is dispatched to its normal handler and
+        the replies to the queries are joined into a single reply.
+
+        Args:
+            request: the whole line of chained commands
+
+        Returns:
+            the joined replies, or None if none of the commands gave a reply
+        """
+        parts = [part for part in split_commands(request) if part.strip()]
+        replies = [self._process_single(part) for part in parts]
+        replies = [reply for reply in replies if reply is not None]
+        return COMMAND_SEPARATOR.join(replies) if replies else None
+
     @conditional_reply("connected")
     def get_id(self):
         return "LSCI,{}".format(self.device.id)
@@ -104,12 +477,14 @@ class Lksh336StreamInterface(StreamInterface):
         return self.device.get_output_setpoint(output)
 
     @conditional_reply("connected")
+    @counts_input_query
     def get_krdg(self, input):
-        return self.device.get_input_kelvin_temperature(input)
+        return self.device.faults.reading(input, self.device.get_input_kelvin_temperature(input))
 
     @conditional_reply("connected")
+    @counts_input_query
     def get_srdg(self, input):
-        return self.device.get_input_voltage_input(input)
+        return self.device.faults.reading(input, self.device.get_input_voltage_input(input))
 
     @conditional_reply("connected")
     def get_range(self, output):
@@ -132,37 +507,57 @@ class Lksh336StreamInterface(StreamInterface):
         return self.device.get_output_mode(output)
 
     @conditional_reply("connected")
+    def get_zone(self, output, zone):
+        return self.device.get_output_zone(output, zone)
+
+    @conditional_reply("connected")
+    @counts_input_query
     def get_inname(self, input):
         return self.device.get_input_sensor_name(input)
 
     @conditional_reply("connected")
+    @counts_input_query
     def get_alarmst(self, input):
         return self.device.get_input_alarm_status(input)
 
     @conditional_reply("connected")
+    @counts_input_query
     def get_alarm(self, input):
         return self.device.get_input_alarm(input)
 
     @conditional_reply("connected")
+    @counts_input_query
     def get_rdgst(self, input):
-        return self.device.get_input_reading_status(input)
+        return self.device.faults.reading_status(input, self.device.get_input_reading_status(input))
 
     @conditional_reply("connected")
     def get_htrst(self, output):
-        return self.device.get_output_heater_status(output)
+        return self.device.faults.heater_status(
+            output, self.device.get_output_heater_status(output)
+        )
 
     @conditional_reply("connected")
+    @counts_input_query
     def get_incrv(self, input):
         return self.device.get_input_curve_number(input)
 
     @conditional_reply("connected")
-    def get_crvhdr(self, _):
-        return self.device.get_input_curve_header()
+    def get_crvhdr(self, curve):
+        return self.device.get_input_curve_header(curve)
+
+    @conditional_reply("connected")
+    def get_crvpt(self, curve, index):
+        return self.device.get_curve_point(curve, index)
 
     @conditional_reply("connected")
+    @counts_input_query
     def get_intype(self, input):
         return self.device.get_input_type(input)
 
+    @conditional_reply("connected")
+    def get_tunest(self):
+        return self.device.get_autotune_status()
+
     @conditional_reply("connected")
     def set_setp(self, output, value):
         self.device.set_output_setpoint(output, value)
@@ -188,5 +583,58 @@ class Lksh336StreamInterface(StreamInterface):
         self.device.set_output_mode(output, mode, control_input, powerup)
 
     @conditional_reply("connected")
+    def set_zone(self, output, zone, upper_bound, p, i, d, manual_output, range, input, rate):
+        self.device.set_output_zone(
+            output, zone, upper_bound, p, i, d, manual_output, range, input, rate
+        )
+
+    @conditional_reply("connected")
+    @counts_input_query
     def set_inname(self, input, value):
         self.device.set_input_sensor_name(input, value)
+
+    @conditional_reply("connected")
+    @counts_input_query
+    def set_alarm(
+        self, input, enabled, high_setpoint, low_setpoint, deadband, latching, audible, visible
+    ):
+        self.device.set_input_alarm(
+            input, enabled, high_setpoint, low_setpoint, deadband, latching, audible, visible
+        )
+
+    @conditional_reply("connected")
+    @counts_input_query
+    def set_intype(self, input, sensor_type, auto_range_setting, range, compensation, units):
+        self.device.set_input_type(
+            input, sensor_type, auto_range_setting, range, compensation, units
+        )
+
+    @conditional_reply("connected")
+    @counts_input_query
+    def set_incrv(self, input, curve):
+        self.device.set_input_curve_number(input, curve)
+
+    @conditional_reply("connected")
+    def set_crvhdr(
+        self, curve, name, serial_number, data_format, temperature_limit, temperature_coefficient
+    ):
+        self.device.set_input_curve_header(
+            curve,
+            name.strip()[:NAME_LENGTH].ljust(NAME_LENGTH),
+            serial_number.strip()[:SERIAL_NUMBER_LENGTH].ljust(SERIAL_NUMBER_LENGTH),
+            data_format,
+            temperature_limit,
+            temperature_coefficient,
+        )
+
+    @conditional_reply("connected")
+    def set_crvpt(self, curve, index, units, temperature):
+        self.device.set_curve_point(curve, index, units, temperature)
+
+    @conditional_reply("connected")
+    def set_atune(self, output, mode):
+        self.device.start_autotune(output, mode)
+
+    @conditional_reply("connected")
+    def delete_crv(self, curve):
+        self.device.delete_curve(curve)
@@ -0,0 +1,202 @@
+import threading
+from array import array
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Upper bounds in seconds of the command handling time histogram buckets.
+LATENCY_BUCKETS = (1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3, 1e-2, 2.5e-2)
+
+
+class CommandStatistics(object):
+    """
+    Counters of one command: calls, failures and a histogram of the handling time.
+    """
+
+    __slots__ = ("count", "errors", "total_seconds", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total_seconds = 0.0
+        # One bucket per bound plus one for slower calls, not cumulative.
+        self.buckets = array("L", [0] * (len(LATENCY_BUCKETS) + 1))
+
+
+class CommandMetrics(object):
+    """
+    Request mix, handling times and failures of the commands a device has answered. The
+    counters are updated while the metrics server reads them from its own thread, so both hold
+    lock.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.commands = {}
+            self.unmatched_requests = 0
+
+    def record_unmatched(self):
+        with self.lock:
+            self.unmatched_requests += 1
+
+    def record(self, command, seconds, error=False):
+        """
+        Args:
+            command: name of the command's handler
+            seconds: time taken to match and handle the request
+            error: whether the handler raised
+        """
+        with self.lock:
+            statistics = self.commands.get(command)
+            if statistics is None:
+                statistics = self.commands[command] = CommandStatistics()
+            statistics.count += 1
+            statistics.total_seconds += seconds
+            statistics.buckets[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+            if error:
+                statistics.errors += 1
+
+    def snapshot(self):
+        """
+        Returns:
+            dict of each command's count, errors, total and mean handling time in seconds, plus
+            the number of requests no command matched
+        """
+        with self.lock:
+            commands = {
+                command: {
+                    "count": statistics.count,
+                    "errors": statistics.errors,
+                    "total_seconds": statistics.total_seconds,
+                    "mean_seconds": statistics.total_seconds / statistics.count,
+                }
+                for command, statistics in self.commands.items()
+            }
+            return {"commands": commands, "unmatched_requests": self.unmatched_requests}
+
+    def histograms(self):
+        """
+        Returns:
+            tuple of the number of unmatched requests and a sorted list of the name, count,
+            errors, total handling time and bucket counts of each command
+        """
+        with self.lock:
+            commands = [
+                (
+                    command,
+                    statistics.count,
+                    statistics.errors,
+                    statistics.total_seconds,
+                    statistics.buckets.tolist(),
+                )
+                for command, statistics in self.commands.items()
+            ]
+            unmatched_requests = self.unmatched_requests
+        return unmatched_requests, sorted(commands)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in labels.items()) + "}"
+
+
+def render_metrics(metrics_by_labels):
+    """
+    Render metrics in the Prometheus text exposition format.
+
+    Args:
+        metrics_by_labels: list of (labels, CommandMetrics) pairs, where labels is a dict of
+            labels identifying the device, e.g. {} or {"device": "57000"}
+
+    Returns:
+        the text of the metrics
+    """
+    counts = []
+    errors = []
+    durations = []
+    unmatched = []
+    for labels, metrics in metrics_by_labels:
+        unmatched_requests, commands = metrics.histograms()
+        unmatched.append(
+            f"lksh336_unmatched_requests_total{_format_labels(labels)} {unmatched_requests}"
+        )
+        for command, count, error_count, total_seconds, buckets in commands:
+            command_labels = dict(labels, command=command)
+            formatted = _format_labels(command_labels)
+            counts.append(f"lksh336_commands_total{formatted} {count}")
+            errors.append(f"lksh336_command_errors_total{formatted} {error_count}")
+
+            cumulative = 0
+            for bound, bucket_count in zip(LATENCY_BUCKETS + ("+Inf",), buckets):
+                cumulative += bucket_count
+                bucket_labels = _format_labels(dict(command_labels, le=bound))
+                durations.append(
+                    f"lksh336_command_duration_seconds_bucket{bucket_labels} {cumulative}"
+                )
+            durations.append(f"lksh336_command_duration_seconds_sum{formatted} {total_seconds}")
+            durations.append(f"lksh336_command_duration_seconds_count{formatted} {count}")
+
+    lines = [
+        "# HELP lksh336_commands_total Commands handled by the emulator.",
+        "# TYPE lksh336_commands_total counter",
+        *counts,
+        "# HELP lksh336_command_errors_total Commands whose handler raised an error.",
+        "# TYPE lksh336_command_errors_total counter",
+        *errors,
+        "# HELP lksh336_command_duration_seconds Time taken to match and handle a command.",
+        "# TYPE lksh336_command_duration_seconds histogram",
+        *durations,
+        "# HELP lksh336_unmatched_requests_total Requests that no command matched.",
+        "# TYPE lksh336_unmatched_requests_total counter",
+        *unmatched,
+    ]
+    return "\n".join(lines) + "\n"
+
+
+class MetricsServer(object):
+    """
+    Serves metrics as text over HTTP from a background thread, e.g. for Prometheus to scrape
+    http://localhost:9336/metrics.
+    """
+
+    def __init__(self, render, host="127.0.0.1", port=9336):
+        """
+        Args:
+            render: function returning the text of the metrics
+            host: address to listen on
+            port: port to listen on
+        """
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def port(self):
+        return self._server.server_address[1]
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
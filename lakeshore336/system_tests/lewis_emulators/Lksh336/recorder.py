@@ -0,0 +1,83 @@
+import struct
+import time
+
+# A traffic log starts with this magic, the version of the format and the wall clock time the
+# recording started, followed by one record per request: its time since the start, the request
+# and reply lengths, whether there was a reply, and the request and reply bytes.
+MAGIC = b"LKSH336T"
+VERSION = 2
+START = struct.Struct("<d")
+RECORD = struct.Struct("<dII?")
+
+BUFFER_SIZE = 1 << 16
+
+
+class TrafficRecorder(object):
+    """
+    Appends every request and its reply to a binary traffic log. Records go to a large write
+    buffer, so recording only costs a few copies per request until the buffer fills.
+    """
+
+    def __init__(self, path, buffer_size=BUFFER_SIZE):
+        """
+        Args:
+            path: path of the log, replaced if it exists
+            buffer_size: bytes buffered before they are written to the file
+        """
+        self._file = open(path, "wb", buffering=buffer_size)  # noqa: SIM115 (closed by close)
+        self._file.write(MAGIC + bytes([VERSION]) + START.pack(time.time()))
+        self._start = time.monotonic()
+        self.num_records = 0
+
+    def record(self, request, reply):
+        """
+        Args:
+            request: the request without terminator, as bytes
+            reply: the reply without terminator, or None if there was none
+        """
+        has_reply = reply is not None
+        reply = reply.encode() if has_reply else b""
+        self._file.write(
+            RECORD.pack(time.monotonic() - self._start, len(request), len(reply), has_reply)
+        )
+        self._file.write(request)
+        self._file.write(reply)
+        self.num_records += 1
+
+    def close(self):
+        self._file.close()
+
+
+def read_traffic(path):
+    """
+    Read a traffic log written by TrafficRecorder.
+
+    Args:
+        path: path of the log
+
+    Returns:
+        tuple of the wall clock time the recording started and a generator of
+        (seconds since the start, request, reply) records, with the request and reply as bytes
+        and the reply None if there was none
+    """
+    with open(path, "rb") as log:
+        header = log.read(len(MAGIC) + 1 + START.size)
+    if len(header) < len(MAGIC) + 1 + START.size or header[: len(MAGIC)] != MAGIC:
+        raise ValueError(f"{path} is not a traffic log")
+    if header[len(MAGIC)] != VERSION:
+        raise ValueError(f"{path} is version {header[len(MAGIC)]} of the log, expected {VERSION}")
+    (start,) = START.unpack(header[len(MAGIC) + 1 :])
+
+    def records():
+        with open(path, "rb") as log:
+            log.seek(len(header))
+            while True:
+                record_header = log.read(RECORD.size)
+                if len(record_header) < RECORD.size:
+                    return
+                timestamp, request_length, reply_length, has_reply = RECORD.unpack(record_header)
+                request = log.read(request_length)
+                reply = log.read(reply_length)
+                yield timestamp, request, reply if has_reply else None
+
+    return start, records()
@@ -0,0 +1,199 @@
+import ast
+import csv
+import mmap
+import struct
+
+# Column order of .npy traces, which have no column names. CSV traces name their columns in a
+# header row and may hold any subset of these (plus "time").
+DEFAULT_COLUMNS = (
+    ["time"]
+    + [f"KRDG_{input}" for input in "ABCD"]
+    + [f"SRDG_{input}" for input in "ABCD"]
+    + ["HTR_1", "HTR_2", "AOUT_3", "AOUT_4"]
+)
+
+NPY_MAGIC = b"\x93NUMPY"
+
+
+def read_csv_trace(path):
+    """
+    Read the rows of a CSV trace one at a time, so only the current row is held in memory.
+
+    Args:
+        path: path to a CSV file with a header row naming its columns
+
+    Returns:
+        tuple of the column names and a generator of rows (lists of floats), which raises
+        ValueError at the first cell that is not a number
+    """
+    with open(path, newline="") as trace_file:
+        header = next(csv.reader(trace_file), None)
+    if not header:
+        raise ValueError(f"{path} has no header row")
+    columns = [column.strip() for column in header]
+
+    def rows():
+        with open(path, newline="") as trace_file:
+            reader = csv.reader(trace_file)
+            next(reader)
+            for row in reader:
+                if not row:
+                    continue
+                try:
+                    yield [float(value) for value in row]
+                except ValueError:
+                    raise ValueError(
+                        f"{path} line {reader.line_num} has a value which is not a number"
+                    ) from None
+
+    return columns, rows()
+
+
+def read_npy_trace(path, columns=None):
+    """
+    Read the rows of a 2D float64 .npy trace through a memory map, so the file is paged in by the
+    operating system rather than loaded.
+
+    Args:
+        path: path to a C ordered .npy file of little endian doubles with one sample per row
+        columns: names of the columns, defaults to DEFAULT_COLUMNS
+
+    Returns:
+        tuple of the column names and a generator of rows (lists of floats)
+    """
+    with open(path, "rb") as trace_file:
+        if trace_file.read(len(NPY_MAGIC)) != NPY_MAGIC:
+            raise ValueError(f"{path} is not a .npy file")
+        major_version = trace_file.read(2)[0]
+        length_format = "<H" if major_version == 1 else "<I"
+        (header_length,) = struct.unpack(
+            length_format, trace_file.read(struct.calcsize(length_format))
+        )
+        header = ast.literal_eval(trace_file.read(header_length).decode("latin1"))
+        data_offset = trace_file.tell()
+        mapped = mmap.mmap(trace_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    if header["descr"] != "<f8" or header["fortran_order"] or len(header["shape"]) != 2:
+        mapped.close()
+        raise ValueError(f"{path} must hold a 2D C ordered array of little endian doubles")
+    num_rows, num_columns = header["shape"]
+    columns = list(columns or DEFAULT_COLUMNS)
+    if len(columns) != num_columns:
+        mapped.close()
+        raise ValueError(f"{path} has {num_columns} columns but {len(columns)} were named")
+
+    def rows():
+        values = memoryview(mapped)[data_offset : data_offset + 8 * num_rows * num_columns]
+        values = values.cast("d")
+        try:
+            for row in range(num_rows):
+                yield values[row * num_columns : (row + 1) * num_columns].tolist()
+        finally:
+            values.release()
+            mapped.close()
+
+    return columns, rows()
+
+
+class TraceReplay(object):
+    """
+    Plays a recorded trace of the inputs and outputs back onto the device. Rows are read lazily
+    as the replay reaches them, so a trace of any length uses constant memory. Each row's values
+    are held until the time of the next row. A row which can not be read ends the replay, with
+    the reason in error.
+    """
+
+    def __init__(self, path, input_names, num_outputs, speed=1.0, columns=None):
+        """
+        Args:
+            path: path to a .csv or .npy trace whose first column is the time in seconds
+            input_names: names of the device's inputs, which KRDG_ and SRDG_ columns may address
+            num_outputs: number of the device's outputs, which HTR_ and AOUT_ columns may address
+            speed: how many seconds of the trace are played per second of simulation
+            columns: names of the columns of a .npy trace, defaults to DEFAULT_COLUMNS
+        """
+        if path.lower().endswith(".npy"):
+            self.columns, self._rows = read_npy_trace(path, columns)
+        else:
+            self.columns, self._rows = read_csv_trace(path)
+        try:
+            if self.columns[0] != "time":
+                raise ValueError("The first column of a trace must be the time")
+            self._targets = [
+                _column_target(column, input_names, num_outputs) for column in self.columns[1:]
+            ]
+            self._next_row = next(self._rows, None)
+        except ValueError:
+            self._rows.close()
+            raise
+
+        self.speed = speed
+        self.finished = False
+        self.error = None
+        self.trace_time = None
+        self._start_time = None
+
+    def step(self, device, dt):
+        """
+        Advance the replay and apply the latest row that has been reached to the device.
+
+        Args:
+            device: the device being simulated
+            dt: time step in seconds
+        """
+        if self._next_row is None:
+            self.finished = True
+            return
+
+        if self._start_time is None:
+            self._start_time = self._next_row[0]
+            self.trace_time = self._start_time
+        else:
+            self.trace_time += dt * self.speed
+
+        row = None
+        try:
+            while self._next_row is not None and self._next_row[0] <= self.trace_time:
+                row = self._next_row
+                self._next_row = next(self._rows, None)
+        except ValueError as error:
+            self.error = str(error)
+            self.stop()
+        if row is not None:
+            self._apply(device, row)
+
+    def stop(self):
+        """
+        Stop the replay and close the trace.
+        """
+        self._rows.close()
+        self._next_row = None
+        self.finished = True
+
+    def _apply(self, device, row):
+        for (command, channel), value in zip(self._targets, row[1:]):
+            if command == "KRDG":
+                device.inputs[channel].kelvin_temperature = value
+            elif command == "SRDG":
+                device.inputs[channel].voltage_input = value
+            elif command == "HTR":
+                device.outputs[channel].heater_value = value
+            else:
+                device.outputs[channel].analog_output = value
+
+
+def _column_target(column, input_names, num_outputs):
+    """
+    Returns:
+        tuple of the command and channel (input name or output index) a trace column sets
+    """
+    command, _, channel = column.partition("_")
+    if command in ("KRDG", "SRDG"):
+        if channel in input_names:
+            return command, channel
+    elif command in ("HTR", "AOUT"):
+        if channel.isdigit() and 1 <= int(channel) <= num_outputs:
+            return command, int(channel) - 1
+    else:
+        raise ValueError(f"Trace column {column} is not one of KRDG_, SRDG_, HTR_ or AOUT_")
+    raise ValueError(f"Trace column {column} is not a channel of the device")
@@ -0,0 +1,53 @@
+from string import Formatter
+from typing import ClassVar
+
+
+class ReplyCache(object):
+    """
+    Base of classes which keep their multi-field query replies preformatted.
+
+    Subclasses name their replies in REPLY_FORMATS, as str.format templates of the instance
+    (e.g. "{0.p},{0.i},{0.d}"). A reply is formatted the first time it is asked for and kept
+    until one of the attributes in its template is set, so a reply polled while its values do
+    not change costs one dictionary lookup.
+    """
+
+    __slots__ = ("_replies",)
+
+    REPLY_FORMATS: ClassVar[dict] = {}
+    # Names of the replies built from each attribute, derived from REPLY_FORMATS.
+    _DEPENDENT_REPLIES: ClassVar[dict] = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super(ReplyCache, cls).__init_subclass__(**kwargs)
+        dependent_replies = {}
+        for name, template in cls.REPLY_FORMATS.items():
+            for _, field, _, _ in Formatter().parse(template):
+                if field is not None:
+                    attribute = field.partition(".")[2]
+                    dependent_replies.setdefault(attribute, []).append(name)
+        cls._DEPENDENT_REPLIES = dependent_replies
+
+    def __init__(self):
+        object.__setattr__(self, "_replies", {})
+
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+        for reply in self._DEPENDENT_REPLIES.get(name, ()):
+            self._replies.pop(reply, None)
+
+    def reply(self, name):
+        """
+        Args:
+            name: name of the reply in REPLY_FORMATS
+
+        Returns:
+            the formatted reply
+        """
+        reply = self._replies.get(name)
+        if reply is None:
+            reply = self._replies[name] = self.REPLY_FORMATS[name].format(self)
+        return reply
+
+    def clear_replies(self):
+        self._replies.clear()
@@ -0,0 +1,149 @@
+"""
+Binary snapshots of the simulated controller's whole state: its inputs, outputs, curves, zones
+and device attributes, in one compact blob which is quick to take and quicker to restore.
+
+Unlike a configuration (see the config module) a snapshot is not meant to be read or edited: the
+channels are stored as lists of their attribute values in __slots__ order, and the curves and
+zones as the values of their arrays, so restoring one sets attributes directly instead of
+checking every value. The attribute names are stored once per kind of channel so that a
+snapshot taken by a different version of the emulator is refused rather than restored wrongly.
+The state is encoded as zlib compressed JSON, which reads the same on every Python version and
+holds nothing but data.
+"""
+
+import json
+import zlib
+from array import array
+
+from .config import DEVICE_ATTRIBUTES, HEADER_ATTRIBUTES
+from .curves import Curve
+from .zones import ZoneTable
+
+MAGIC = b"LKSH336S"
+VERSION = 2
+
+# The arrays of a zone table, in the order they are stored.
+_ZONE_ARRAYS = tuple(name for name in ZoneTable.__slots__ if not name.startswith("_"))
+
+
+def _slots(channel):
+    return tuple(name for name in type(channel).__slots__ if not name.startswith("_"))
+
+
+def _header(curve):
+    return [getattr(curve.header, name) for name in HEADER_ATTRIBUTES]
+
+
+# Header of a curve which was never written or has been deleted.
+_EMPTY_HEADER = _header(Curve())
+
+
+def take_snapshot(device):
+    """
+    Args:
+        device: the simulated controller
+
+    Returns:
+        bytes of the snapshot of the device's state
+    """
+    outputs = device.outputs
+    inputs = device.inputs
+    output_slots = _slots(outputs[0])
+    input_slots = _slots(next(iter(inputs.values())))
+    curves = {}
+    for number, curve in enumerate(device.curves):
+        num_points = curve.num_points
+        header = _header(curve)
+        if num_points or header != _EMPTY_HEADER:
+            curves[str(number)] = [
+                header,
+                curve.units[:num_points].tolist(),
+                curve.temperatures[:num_points].tolist(),
+            ]
+    state = [
+        [getattr(device, name) for name in DEVICE_ATTRIBUTES],
+        output_slots,
+        [[getattr(output, name) for name in output_slots] for output in outputs],
+        input_slots,
+        {name: [getattr(input, slot) for slot in input_slots] for name, input in inputs.items()},
+        curves,
+        [[getattr(table, name).tolist() for name in _ZONE_ARRAYS] for table in device.zones],
+    ]
+    return MAGIC + bytes([VERSION]) + zlib.compress(json.dumps(state).encode())
+
+
+def _load(data):
+    if data[: len(MAGIC)] != MAGIC:
+        raise ValueError("Not a snapshot of the Lksh336 emulator")
+    if data[len(MAGIC)] != VERSION:
+        raise ValueError(f"Snapshot is version {data[len(MAGIC)]}, expected {VERSION}")
+    return json.loads(zlib.decompress(data[len(MAGIC) + 1 :]))
+
+
+def restore_snapshot(device, data):
+    """
+    Put the device back into the state of a snapshot. The snapshot is checked against the
+    device before anything is changed.
+
+    Args:
+        device: the simulated controller
+        data: bytes of a snapshot, as take_snapshot gives
+    """
+    attributes, output_slots, outputs, input_slots, inputs, curves, zones = _load(data)
+    if tuple(output_slots) != _slots(device.outputs[0]) or tuple(input_slots) != _slots(
+        next(iter(device.inputs.values()))
+    ):
+        raise ValueError("Snapshot was taken by a different version of the emulator")
+    if set(inputs) != set(device.inputs):
+        raise ValueError(
+            f"Snapshot has inputs {', '.join(sorted(inputs))}, the device has "
+            f"{', '.join(sorted(device.inputs))}"
+        )
+    if len(outputs) != len(device.outputs) or len(zones) != len(device.zones):
+        raise ValueError("Snapshot has a different number of outputs")
+
+    for name, value in zip(DEVICE_ATTRIBUTES, attributes):
+        setattr(device, name, value)
+    channels = list(zip(device.outputs, outputs)) + [
+        (device.inputs[name], values) for name, values in inputs.items()
+    ]
+    slots = [output_slots] * len(outputs) + [input_slots] * len(inputs)
+    for (channel, values), names in zip(channels, slots):
+        # Setting the slots directly skips the reply cache's bookkeeping, so clear it once.
+        for name, value in zip(names, values):
+            object.__setattr__(channel, name, value)
+        channel.clear_replies()
+
+    for number, curve in enumerate(device.curves):
+        if str(number) in curves:
+            header, units, temperatures = curves[str(number)]
+            for name, value in zip(HEADER_ATTRIBUTES, header):
+                object.__setattr__(curve.header, name, value)
+            curve.header.clear_replies()
+            curve.set_points(array("d", units), array("d", temperatures))
+        elif curve.num_points or _header(curve) != _EMPTY_HEADER:
+            curve.clear()
+    device._curve_interpolators.clear()
+
+    for table, arrays in zip(device.zones, zones):
+        for name, values in zip(_ZONE_ARRAYS, arrays):
+            stored = getattr(table, name)
+            setattr(table, name, array(stored.typecode, values))
+        table._update_search_bounds()
+
+    # The thermal model carries on from the restored readings and setpoints.
+    device.thermal_model.reset(device)
+
+
+def read_snapshot_file(path):
+    """
+    Returns:
+        bytes of the snapshot saved in the file
+    """
+    with open(path, "rb") as snapshot_file:
+        return snapshot_file.read()
+
+
+def write_snapshot_file(path, data):
+    with open(path, "wb") as snapshot_file:
+        snapshot_file.write(data)
@@ -2,4 +2,37 @@ from lewis.core.statemachine import State
 
 
 class DefaultState(State):
-    pass
+    def in_state(self, dt):
+        self._context.update_zones()
+        self._context.autotuner.step(self._context, dt)
+        self._context.faults.step(dt)
+
+
+class ThermalState(State):
+    """
+    State in which the readings and outputs follow the device's thermal model.
+    """
+
+    def on_entry(self, dt):
+        self._context.thermal_model.reset(self._context)
+
+    def in_state(self, dt):
+        self._context.update_zones()
+        self._context.autotuner.step(self._context, dt)
+        self._context.faults.step(dt)
+        self._context.thermal_model.step(self._context, dt)
+
+
+class ReplayState(State):
+    """
+    State in which the readings and outputs are played back from a recorded trace.
+    """
+
+    def in_state(self, dt):
+        device = self._context
+        device.faults.step(dt)
+        device.trace_replay.step(device, dt)
+        if device.trace_replay.finished:
+            if device.trace_replay.error is not None:
+                device.log.error("Replay stopped: %s", device.trace_replay.error)
+            device.trace_replay = None
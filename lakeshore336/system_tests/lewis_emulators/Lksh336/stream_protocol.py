@@ -0,0 +1,220 @@
+"""
+Reader of StreamDevice protocol files, such as the IOC's ls336.proto.
+"""
+
+import os
+import re
+
+# The IOC's protocol file, in the support module's protocol directory.
+PROTOCOL_FILE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "protocol", "ls336.proto"
+)
+
+_TOKEN = re.compile(r'\s+|#[^\n]*|"((?:[^"\\]|\\.)*)"|([{};=])|([^\s{};="#]+)', re.DOTALL)
+
+# A format conversion, e.g. %f, %(\$2:\$3)d or %*15c, or a literal %%.
+CONVERSION = re.compile(r"%%|%(?:\(([^)]*)\))?([-+ #0*?=!]*)(\d*)(?:\.(\d+))?([a-zA-Z\[])")
+_ARGUMENT = re.compile(r"\\?\$(\d)")
+_ESCAPES = {"r": "\r", "n": "\n", "t": "\t", '"': '"', "\\": "\\", "$": "$"}
+
+
+class ProtocolFunction(object):
+    """
+    A protocol of the file (e.g. getKRDG), with its commands, its own settings and its exception
+    handlers.
+    """
+
+    __slots__ = ("name", "commands", "variables", "handlers")
+
+    def __init__(self, name):
+        self.name = name
+        # (command, arguments) in order, e.g. ("out", ['KRDG? \\$1']) or ("getSETP", []).
+        self.commands = []
+        self.variables = {}
+        # Commands of each handler by its name, e.g. "@init".
+        self.handlers = {}
+
+    def formats(self, command):
+        """
+        Args:
+            command: "out" or "in"
+
+        Returns:
+            list of the format strings of the protocol's commands of that kind, in order
+        """
+        return [arguments[0] for name, arguments in self.commands if name == command and arguments]
+
+    @property
+    def out_format(self):
+        """
+        The first output format of the protocol, or None for protocols which only read.
+        """
+        formats = self.formats("out")
+        return formats[0] if formats else None
+
+    @property
+    def in_format(self):
+        formats = self.formats("in")
+        return formats[0] if formats else None
+
+
+class ProtocolFile(object):
+    """
+    The settings and protocols of a StreamDevice protocol file.
+    """
+
+    def __init__(self, variables, functions):
+        """
+        Args:
+            variables: dict of the file's settings, e.g. {"ReplyTimeout": "1000"}
+            functions: dict of the ProtocolFunctions by name
+        """
+        self.variables = variables
+        self.functions = functions
+
+    def setting(self, function, name, default=None):
+        """
+        Args:
+            function: name of a protocol
+            name: name of a setting, e.g. "ReplyTimeout"
+            default: returned if neither the protocol nor the file sets it
+
+        Returns:
+            the protocol's setting, or the file's if the protocol does not set it
+        """
+        variables = self.functions[function].variables
+        return variables.get(name, self.variables.get(name, default))
+
+    def reply_timeout(self, function):
+        """
+        Returns:
+            seconds StreamDevice waits for the reply of the protocol
+        """
+        return float(self.setting(function, "ReplyTimeout", 1000)) / 1000.0
+
+
+def _tokens(text):
+    for match in _TOKEN.finditer(text):
+        string, punctuation, word = match.groups()
+        if string is not None:
+            yield "string", string
+        elif punctuation is not None:
+            yield punctuation, punctuation
+        elif word is not None:
+            yield "word", word
+
+
+def _parse_body(tokens, variables, commands, handlers):
+    """
+    Parse statements up to the closing brace of a block, or the end of the file.
+    """
+    words = []
+    for kind, value in tokens:
+        if kind == "}":
+            break
+        if kind == "{":
+            if not words or handlers is None:
+                raise ValueError(f"Unexpected block after {words!r}")
+            name = words.pop()
+            if name.startswith("@"):
+                handler = handlers[name] = []
+                _parse_body(tokens, {}, handler, None)
+            else:
+                function = ProtocolFunction(name)
+                _parse_body(tokens, function.variables, function.commands, function.handlers)
+                commands.append(function)
+            words = []
+        elif kind == "=":
+            if len(words) != 1:
+                raise ValueError(f"Unexpected '=' after {words!r}")
+            name = words.pop()
+            values = []
+            for kind, value in tokens:
+                if kind in (";", "}"):
+                    break
+                values.append(value)
+            variables[name] = " ".join(values)
+            if kind == "}":
+                break
+        elif kind == ";":
+            if words:
+                commands.append((words[0], words[1:]))
+            words = []
+        else:
+            words.append(value)
+    if words:
+        commands.append((words[0], words[1:]))
+
+
+def parse_protocol(text):
+    """
+    Args:
+        text: contents of a protocol file
+
+    Returns:
+        the ProtocolFile
+    """
+    variables = {}
+    statements = []
+    _parse_body(_tokens(text), variables, statements, {})
+    functions = {
+        statement.name: statement
+        for statement in statements
+        if isinstance(statement, ProtocolFunction)
+    }
+    return ProtocolFile(variables, functions)
+
+
+def read_protocol(path=PROTOCOL_FILE):
+    """
+    Args:
+        path: path of the protocol file, by default the IOC's ls336.proto
+
+    Returns:
+        the ProtocolFile
+    """
+    with open(path) as protocol_file:
+        return parse_protocol(protocol_file.read())
+
+
+def unescape(text):
+    """
+    Args:
+        text: a format string as written in the protocol file
+
+    Returns:
+        the text with its escape sequences (e.g. \\r, \\") replaced
+    """
+    return re.sub(r"\\(.)", lambda match: _ESCAPES.get(match.group(1), match.group(1)), text)
+
+
+def format_output(out_format, arguments=(), value=0):
+    """
+    Build the line a protocol writes, as StreamDevice would.
+
+    Args:
+        out_format: the protocol's output format, e.g. 'KRDG? \\$1'
+        arguments: the protocol's arguments from the record's link, e.g. ["A"]
+        value: value written by each format conversion, e.g. the record's value
+
+    Returns:
+        the line without terminator
+    """
+
+    def argument(match):
+        index = int(match.group(1)) - 1
+        return str(arguments[index]) if index < len(arguments) else ""
+
+    def conversion(match):
+        if match.group(0) == "%%":
+            return "%"
+        if match.group(5) in "dixXou":
+            return str(int(value))
+        if match.group(5) in "feEgG":
+            precision = match.group(4)
+            return f"{float(value):.{precision or 6}f}"
+        return str(value)
+
+    text = _ARGUMENT.sub(argument, out_format)
+    text = CONVERSION.sub(conversion, text)
+    return unescape(text)
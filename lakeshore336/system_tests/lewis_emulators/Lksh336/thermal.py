@@ -0,0 +1,143 @@
+import math
+
+# Output modes as reported by OUTMODE?
+MODE_OFF = 0
+MODE_CLOSED_LOOP = 1
+MODE_ZONE = 2
+MODE_OPEN_LOOP = 3
+
+# Fraction of the maximum heater power delivered at each heater range (Off, Low, Medium, High).
+RANGE_FRACTIONS = [0.0, 0.01, 0.1, 1.0]
+
+
+class ThermalModel(object):
+    """
+    Lumped thermal model of the stages measured by the inputs and heated by the outputs.
+
+    Each input measures its own stage, which has a heat capacity and a thermal link to a cold
+    base. An output heats the stage of its control input with a power set by its mode: the
+    closed loop PID (towards the ramped setpoint), the manual output in open loop, or nothing when
+    off. The reading of each input lags behind its stage temperature.
+    """
+
+    def __init__(self, num_inputs, num_outputs):
+        self.base_temperature = 5.0
+        # Heat capacity of each stage in J/K.
+        self.heat_capacity = 1.0
+        # Thermal conductance of each stage to the base in W/K.
+        self.conductance = 0.5
+        # Time constant of the sensor reading in seconds.
+        self.sensor_lag = 0.5
+        # Heater power of each output at full output on the high range, in W.
+        self.max_power = [100.0, 50.0, 10.0, 10.0][:num_outputs]
+        self.max_power += [10.0] * (num_outputs - len(self.max_power))
+
+        self.stage_temperatures = [self.base_temperature] * num_inputs
+        self.ramp_setpoints = [0.0] * num_outputs
+        self.integrals = [0.0] * num_outputs
+        self.previous_errors = [0.0] * num_outputs
+        # Output in percent forced by an autotune in place of the output's own control.
+        self.excitations = [None] * num_outputs
+
+    def reset(self, device):
+        """
+        Start the model from the current state of the device.
+
+        Args:
+            device: the device being simulated
+        """
+        self.stage_temperatures = [
+            float(input.kelvin_temperature) for input in device.inputs.values()
+        ]
+        self.ramp_setpoints = [float(output.setpoint) for output in device.outputs]
+        self.integrals = [0.0] * len(device.outputs)
+        self.previous_errors = [0.0] * len(device.outputs)
+
+    def step(self, device, dt):
+        """
+        Advance the model and write the new readings and outputs to the device.
+
+        Args:
+            device: the device being simulated
+            dt: time step in seconds
+        """
+        if dt <= 0:
+            return
+
+        inputs = list(device.inputs.values())
+        powers = [0.0] * len(inputs)
+
+        for index, output in enumerate(device.outputs):
+            percent = self._output_percent(index, output, inputs, dt)
+            if index < 2:
+                output.heater_value = percent
+            else:
+                output.analog_output = percent
+
+            if 1 <= output.control_input <= len(inputs):
+                range_fraction = RANGE_FRACTIONS[min(max(int(output.range), 0), 3)]
+                powers[output.control_input - 1] += (
+                    self.max_power[index] * range_fraction * percent / 100.0
+                )
+
+        lag = 1.0 - math.exp(-dt / self.sensor_lag) if self.sensor_lag > 0 else 1.0
+        for index, input in enumerate(inputs):
+            stage = self.stage_temperatures[index]
+            stage += (
+                dt
+                * (powers[index] - self.conductance * (stage - self.base_temperature))
+                / self.heat_capacity
+            )
+            self.stage_temperatures[index] = stage
+            input.kelvin_temperature += (stage - input.kelvin_temperature) * lag
+
+            # With a curve assigned the controller reads kelvin from the sensor units, so the
+            # sensor has to report the units for the new temperature.
+            interpolator = device.get_curve_interpolator(input.curve_number)
+            if interpolator is not None:
+                input.voltage_input = interpolator.units(input.kelvin_temperature)
+
+    def _ramp_setpoint(self, index, output, dt):
+        """
+        Move the working setpoint of an output towards its target at the ramp rate (K/min).
+        """
+        target = output.setpoint
+        current = self.ramp_setpoints[index]
+        if output.ramp_status and output.ramp_rate > 0:
+            max_change = output.ramp_rate * dt / 60.0
+            current += max(-max_change, min(max_change, target - current))
+        else:
+            current = target
+        self.ramp_setpoints[index] = current
+        return current
+
+    def _output_percent(self, index, output, inputs, dt):
+        """
+        Calculate the output of a loop in percent of its range.
+        """
+        setpoint = self._ramp_setpoint(index, output, dt)
+
+        if self.excitations[index] is not None:
+            self.integrals[index] = 0.0
+            return self.excitations[index]
+
+        if output.mode == MODE_OPEN_LOOP:
+            return min(max(float(output.manual_value), 0.0), 100.0)
+
+        if output.mode not in (MODE_CLOSED_LOOP, MODE_ZONE) or not (
+            1 <= output.control_input <= len(inputs)
+        ):
+            self.integrals[index] = 0.0
+            return 0.0
+
+        error = setpoint - inputs[output.control_input - 1].kelvin_temperature
+        derivative = (error - self.previous_errors[index]) / dt
+        self.previous_errors[index] = error
+
+        integral = self.integrals[index] + error * dt
+        percent = output.p * (error + output.i * integral + output.d * derivative)
+        percent += output.manual_value
+        if 0.0 < percent < 100.0:
+            # Only integrate while the output is not saturated to avoid wind up.
+            self.integrals[index] = integral
+        return min(max(percent, 0.0), 100.0)
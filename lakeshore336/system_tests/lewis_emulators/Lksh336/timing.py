@@ -0,0 +1,108 @@
+from collections import deque
+
+# A byte on a serial line is a start bit, eight data bits and a stop bit.
+BITS_PER_BYTE = 10
+
+
+class SerialTimingModel(object):
+    """
+    Models how long the controller takes to answer: each command has a processing time and each
+    request and reply is sent at the link's baud rate. Requests are handled one at a time, so a
+    request arriving while the controller is busy waits in a queue; once the queue is full
+    further requests are dropped without a reply, and the client times out.
+
+    The model only works out when each reply is due and keeps the statistics; the server
+    answering the requests holds each reply back until then.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        # Processing time of a command in seconds, and overrides per mnemonic (e.g. b"CRVPT").
+        self.command_latency = 0.01
+        self.command_latencies = {}
+        # The 336 serial port runs at 57600 baud.
+        self.baud_rate = 57600
+        self.max_queue_depth = 16
+
+        self._completion_times = deque()
+        self._busy_until = 0.0
+        self.reset_statistics()
+
+    def reset_statistics(self, now=None):
+        """
+        Args:
+            now: current time in seconds, if known
+        """
+        self._statistics_start = now
+        self.requests = 0
+        self.commands = 0
+        self.dropped_requests = 0
+        self.total_queue_wait = 0.0
+        self.max_queue_wait = 0.0
+        self.busy_time = 0.0
+
+    def service_time(self, mnemonics, num_bytes):
+        """
+        Args:
+            mnemonics: mnemonics of the commands in the request, as bytes
+            num_bytes: bytes sent and received for the request, including terminators
+
+        Returns:
+            seconds the controller is busy with the request
+        """
+        latencies = self.command_latencies
+        latency = sum(latencies.get(mnemonic, self.command_latency) for mnemonic in mnemonics)
+        return latency + num_bytes * BITS_PER_BYTE / float(self.baud_rate)
+
+    def schedule(self, now, mnemonics, num_bytes):
+        """
+        Queue a request.
+
+        Args:
+            now: time the request arrived in seconds, e.g. from time.monotonic()
+            mnemonics: mnemonics of the commands in the request, as bytes
+            num_bytes: bytes sent and received for the request, including terminators
+
+        Returns:
+            time at which the reply is complete, or None if the queue is full
+        """
+        if self._statistics_start is None:
+            self._statistics_start = now
+        while self._completion_times and self._completion_times[0] <= now:
+            self._completion_times.popleft()
+        if len(self._completion_times) >= self.max_queue_depth:
+            self.dropped_requests += 1
+            return None
+
+        start = max(now, self._busy_until)
+        service_time = self.service_time(mnemonics, num_bytes)
+        self._busy_until = start + service_time
+        self._completion_times.append(self._busy_until)
+
+        wait = start - now
+        self.requests += 1
+        self.commands += len(mnemonics)
+        self.total_queue_wait += wait
+        self.max_queue_wait = max(self.max_queue_wait, wait)
+        self.busy_time += service_time
+        return self._busy_until
+
+    def statistics(self, now):
+        """
+        Args:
+            now: current time in seconds
+
+        Returns:
+            dict of the statistics since they were last reset, times in seconds
+        """
+        elapsed = now - self._statistics_start if self._statistics_start is not None else 0.0
+        return {
+            "requests": self.requests,
+            "commands": self.commands,
+            "dropped_requests": self.dropped_requests,
+            "commands_per_second": self.commands / elapsed if elapsed > 0 else 0.0,
+            "mean_queue_wait": self.total_queue_wait / self.requests if self.requests else 0.0,
+            "max_queue_wait": self.max_queue_wait,
+            "queue_depth": sum(1 for time in self._completion_times if time > now),
+            "utilisation": min(self.busy_time / elapsed, 1.0) if elapsed > 0 else 0.0,
+        }
@@ -0,0 +1,106 @@
+from array import array
+from bisect import bisect_left
+
+NUM_ZONES = 10
+
+
+class ZoneTable(object):
+    """
+    The ten zones of an output, each held as one element of an array per ZONE parameter.
+
+    In zone mode the controller uses the first zone whose upper bound is at or above the setpoint
+    and takes its PID, manual output, heater range, control input and ramp rate. Zones are meant
+    to be entered in ascending order, but a running maximum of the upper bounds is kept so that a
+    binary search finds that first zone even when they are not. A table whose upper bounds are
+    all zero has not been set up, and has no zone in use.
+    """
+
+    __slots__ = (
+        "upper_bounds",
+        "p",
+        "i",
+        "d",
+        "manual_outputs",
+        "ranges",
+        "inputs",
+        "rates",
+        "_search_bounds",
+        "_configured",
+    )
+
+    def __init__(self):
+        self.upper_bounds = array("d", [0.0] * NUM_ZONES)
+        self.p = array("d", [0.0] * NUM_ZONES)
+        self.i = array("d", [0.0] * NUM_ZONES)
+        self.d = array("d", [0.0] * NUM_ZONES)
+        self.manual_outputs = array("d", [0.0] * NUM_ZONES)
+        self.ranges = array("b", [0] * NUM_ZONES)
+        self.inputs = array("b", [0] * NUM_ZONES)
+        self.rates = array("d", [0.0] * NUM_ZONES)
+        self._update_search_bounds()
+
+    def _update_search_bounds(self):
+        search_bounds = array("d")
+        highest = float("-inf")
+        for upper_bound in self.upper_bounds:
+            highest = max(highest, upper_bound)
+            search_bounds.append(highest)
+        self._search_bounds = search_bounds
+        self._configured = any(self.upper_bounds)
+
+    def _index(self, zone):
+        if not 1 <= zone <= NUM_ZONES:
+            raise ValueError(f"Zone {zone} does not exist")
+        return zone - 1
+
+    def get(self, zone):
+        """
+        Args:
+            zone: the zone number, from 1
+
+        Returns:
+            tuple of the upper bound, P, I, D, manual output, range, input and ramp rate
+        """
+        index = self._index(zone)
+        return (
+            self.upper_bounds[index],
+            self.p[index],
+            self.i[index],
+            self.d[index],
+            self.manual_outputs[index],
+            self.ranges[index],
+            self.inputs[index],
+            self.rates[index],
+        )
+
+    def set(self, zone, upper_bound, p, i, d, manual_output, range, input, rate):
+        """
+        Set the parameters of a zone, as ZONE does.
+
+        Args:
+            zone: the zone number, from 1
+        """
+        index = self._index(zone)
+        self.upper_bounds[index] = upper_bound
+        self.p[index] = p
+        self.i[index] = i
+        self.d[index] = d
+        self.manual_outputs[index] = manual_output
+        self.ranges[index] = range
+        self.inputs[index] = input
+        self.rates[index] = rate
+        self._update_search_bounds()
+
+    def lookup(self, setpoint):
+        """
+        Args:
+            setpoint: the setpoint of the output
+
+        Returns:
+            index of the zone in use for the setpoint, or None if it is above every zone or no zone
+            has been set
+        """
+        if not self._configured:
+            return None
+        index = bisect_left(self._search_bounds, setpoint)
+        return index if index < NUM_ZONES else None
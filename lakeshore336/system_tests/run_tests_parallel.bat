@@ -0,0 +1,12 @@
+@echo off
+REM Run this directory's tests in parallel workers using the IOC Testing Framework, see
+REM run_tests_parallel.py
+
+SET CurrentDir=%~dp0
+
+call "%~dp0..\..\..\..\..\config_env.bat"
+
+set "PYTHONUNBUFFERED=1"
+
+call %PYTHON3% "%~dp0run_tests_parallel.py" %*
+IF %ERRORLEVEL% NEQ 0 EXIT /b %errorlevel%
@@ -0,0 +1,79 @@
+"""
+Run the Lksh336 system tests in parallel: the IOC test framework is started once per worker, each
+with LKSH336_TEST_WORKERS and LKSH336_TEST_WORKER set so that the worker runs its share of the
+cases against its own IOC and emulator pair (see tests/lksh336.py). Worker N (from 1) uses the
+IOC LKSH336_0N, so the IOC needs an iocLKSH336-IOC-0N boot directory for every worker.
+
+Each worker's output is written to lksh336_worker_N.log in the log directory and printed when the
+worker finishes. The exit status is that of the first worker which failed, or 0.
+
+Run through run_tests_parallel.bat, which sets up the EPICS environment, e.g.
+    run_tests_parallel.bat --workers 2 -tm DEVSIM
+Arguments other than those below are passed on to the framework's run_tests.py.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+SYSTEM_TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def default_framework():
+    kit_root = os.environ.get("EPICS_KIT_ROOT", "")
+    return os.path.join(kit_root, "support", "IocTestFramework", "master", "run_tests.py")
+
+
+def start_worker(framework, worker, num_workers, framework_args, log_dir):
+    """
+    Returns:
+        tuple of the worker's process and the path of its log
+    """
+    env = dict(os.environ, LKSH336_TEST_WORKERS=str(num_workers), LKSH336_TEST_WORKER=str(worker))
+    log_path = os.path.join(log_dir, f"lksh336_worker_{worker + 1}.log")
+    with open(log_path, "w") as log:
+        process = subprocess.Popen(
+            [sys.executable, framework, "--test_and_emulator", SYSTEM_TESTS_DIR, *framework_args],
+            env=env,
+            stdout=log,
+            stderr=subprocess.STDOUT,
+        )
+    return process, log_path
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--workers", type=int, default=2, help="Number of IOC and emulator pairs")
+    parser.add_argument(
+        "--framework", default=default_framework(), help="Path of the framework's run_tests.py"
+    )
+    parser.add_argument("--log-dir", default=os.getcwd(), help="Directory of the workers' logs")
+    args, framework_args = parser.parse_known_args()
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if not os.path.isfile(args.framework):
+        parser.error(f"No IOC test framework at {args.framework}")
+
+    start = time.monotonic()
+    workers = [
+        start_worker(args.framework, worker, args.workers, framework_args, args.log_dir)
+        for worker in range(args.workers)
+    ]
+    status = 0
+    for worker, (process, log_path) in enumerate(workers, 1):
+        returncode = process.wait()
+        with open(log_path) as log:
+            print(f"===== Worker {worker} (LKSH336_{worker:02d}), exit status {returncode} =====")
+            print(log.read())
+        if returncode and not status:
+            status = returncode
+    print(f"{args.workers} workers finished in {time.monotonic() - start:.0f} s")
+    sys.exit(status)
+
+
+if __name__ == "__main__":
+    main()
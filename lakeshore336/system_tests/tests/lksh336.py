@@ -1,20 +1,35 @@
 import contextlib
+import json
+import os
+import tempfile
 import unittest
 
 from parameterized import parameterized
 from utils.channel_access import ChannelAccess
-from utils.ioc_launcher import get_default_ioc_dir
+from utils.ioc_launcher import IOCRegister, get_default_ioc_dir
 from utils.test_modes import TestModes
 from utils.testing import get_running_lewis_and_ioc, parameterized_list, skip_if_recsim
 
-DEVICE_PREFIX = "LKSH336_01"
+# The cases can be run in parallel by run_tests_parallel.bat, which runs this module once per
+# worker with LKSH336_TEST_WORKERS set to the number of workers and LKSH336_TEST_WORKER to the
+# worker's index, from 0. Each worker tests its share of the cases against its own IOC and
+# emulator pair: LKSH336_01 with emulator Lksh336_1, LKSH336_02 with Lksh336_2, and so on.
+NUM_WORKERS = int(os.environ.get("LKSH336_TEST_WORKERS", "1"))
+WORKER = int(os.environ.get("LKSH336_TEST_WORKER", "0"))
+if not 0 <= WORKER < NUM_WORKERS:
+    raise ValueError(f"LKSH336_TEST_WORKER must be from 0 to {NUM_WORKERS - 1}, not {WORKER}")
+
+IOC_NUMBER = WORKER + 1
+DEVICE_PREFIX = f"LKSH336_{IOC_NUMBER:02d}"
+EMULATOR_ID = f"Lksh336_{IOC_NUMBER}"
 
 IOCS = [
     {
         "name": DEVICE_PREFIX,
-        "directory": get_default_ioc_dir("LKSH336"),
+        "directory": get_default_ioc_dir("LKSH336", iocnum=IOC_NUMBER),
         "macros": {},
         "emulator": "Lksh336",
+        "emulator_id": EMULATOR_ID,
     },
 ]
 
@@ -45,8 +60,24 @@ class Lksh336Tests(unittest.TestCase):
     """
 
     def setUp(self):
-        self._lewis, self._ioc = get_running_lewis_and_ioc("Lksh336", DEVICE_PREFIX)
+        self._lewis, self._ioc = get_running_lewis_and_ioc(EMULATOR_ID, DEVICE_PREFIX)
         self.ca = ChannelAccess(device_prefix=DEVICE_PREFIX, default_wait_time=0)
+        if not IOCRegister.uses_rec_sim:
+            # Start every test from the emulator's initial state, whatever ran before it.
+            self._lewis.backdoor_command(["device", "reset"])
+
+    def _apply_updates(self, updates):
+        """
+        Apply a batch of device updates in one backdoor call, see SimulatedLksh336.apply_updates.
+        """
+        self._lewis.backdoor_command(["device", "apply_updates", repr(json.dumps(updates))])
+
+    def _start_replay(self, path, speed):
+        """
+        Start replaying a trace file, see SimulatedLksh336.start_replay. lewis-control evaluates
+        its arguments as Python literals, so the path is passed quoted.
+        """
+        self._lewis.backdoor_command(["device", "start_replay", repr(path), str(speed)])
 
     @skip_if_recsim("Requires lewis backdoor")
     def test_WHEN_id_set_via_backdoor_THEN_id_updates(self):
@@ -76,6 +107,37 @@ class Lksh336Tests(unittest.TestCase):
         self._lewis.backdoor_command(["device", "set_input_kelvin_temperature", input, str(2)])
         self.ca.assert_that_pv_is(f"TEMP_{input}", 2)
 
+    @parameterized.expand(parameterized_list(OUTPUTS))
+    def test_WHEN_output_setpoint_set_THEN_other_output_setpoints_do_not_change(self, _, output):
+        for other_output in OUTPUTS:
+            self.ca.set_pv_value(f"TEMP{other_output}:SP", 1.0)
+        self.ca.set_pv_value(f"TEMP{output}:SP", 3.0)
+
+        self.ca.assert_that_pv_is(f"TEMP{output}:SP:RBV", 3.0)
+        for other_output in OUTPUTS:
+            if other_output != output:
+                self.ca.assert_that_pv_is(f"TEMP{other_output}:SP:RBV", 1.0)
+
+    @parameterized.expand(parameterized_list(INPUTS))
+    @skip_if_recsim("Requires lewis backdoor")
+    def test_WHEN_input_kelvin_temperature_set_via_backdoor_THEN_other_inputs_do_not_change(
+        self, _, input
+    ):
+        temperatures = {other_input: 3 if other_input == input else 1 for other_input in INPUTS}
+        self._apply_updates(
+            {
+                "inputs": {
+                    other_input: {"kelvin_temperature": temperature}
+                    for other_input, temperature in temperatures.items()
+                }
+            }
+        )
+
+        self.ca.assert_that_pv_is(f"TEMP_{input}", 3)
+        for other_input in INPUTS:
+            if other_input != input:
+                self.ca.assert_that_pv_is(f"TEMP_{other_input}", 1)
+
     @parameterized.expand(parameterized_list(INPUTS))
     @skip_if_recsim("Requires lewis backdoor")
     def test_WHEN_input_voltage_input_set_via_backdoor_THEN_input_voltage_input_updates(
@@ -112,6 +174,7 @@ class Lksh336Tests(unittest.TestCase):
 
     @parameterized.expand(parameterized_list(OUTPUTS))
     def test_WHEN_output_mode_set_THEN_output_mode_updates(self, _, output):
+        self.addCleanup(self.ca.set_pv_value, f"OUT_MODE{output}:SP", 0)
         self.ca.set_pv_value(f"OUT_MODE{output}:SP", 2)
         self.ca.assert_that_pv_is(f"OUT_MODE{output}", "Zone")
         self.ca.set_pv_value(f"CTRL_IN{output}:SP", 2)
@@ -136,19 +199,20 @@ class Lksh336Tests(unittest.TestCase):
     @parameterized.expand(parameterized_list(INPUTS))
     @skip_if_recsim("Requires lewis backdoor")
     def test_WHEN_input_alarm_set_via_backdoor_THEN_input_alarm_updates(self, _, input):
-        self._lewis.backdoor_command(
-            [
-                "device",
-                "set_input_alarm",
-                input,
-                str(1),
-                str(2),
-                str(2),
-                str(2),
-                str(1),
-                str(1),
-                str(1),
-            ]
+        self._apply_updates(
+            {
+                "inputs": {
+                    input: {
+                        "alarm_enabled": 1,
+                        "alarm_high_setpoint": 2,
+                        "alarm_low_setpoint": 2,
+                        "alarm_deadband": 2,
+                        "alarm_latching": 1,
+                        "alarm_audible": 1,
+                        "alarm_visible": 1,
+                    }
+                }
+            }
         )
         self.ca.assert_that_pv_is(f"ALARM_{input}:ON", "Enabled")
         self.ca.assert_that_pv_is(f"ALARM_{input}:HIVAL", 2)
@@ -158,6 +222,21 @@ class Lksh336Tests(unittest.TestCase):
         self.ca.assert_that_pv_is(f"ALARM_{input}:AUDIBLE", "Audible")
         self.ca.assert_that_pv_is(f"ALARM_{input}:VISIBLE", "Visible")
 
+    @skip_if_recsim("Requires lewis backdoor")
+    def test_WHEN_batch_with_invalid_value_applied_via_backdoor_THEN_nothing_changes(self):
+        digest = self._lewis.backdoor_run_function_on_device("get_state_digest")
+        # The zone range is out of range, so the whole batch is rejected.
+        self._apply_updates(
+            {
+                "device": {"connected": False},
+                "outputs": {"1": {"setpoint": 12.5}},
+                "zones": {"1": [[10.0, 1.0, 2.0, 3.0, 0.0, 500, 0, 0.0]]},
+            }
+        )
+
+        self.assertEqual(self._lewis.backdoor_run_function_on_device("get_state_digest"), digest)
+        self.ca.assert_that_pv_is("TEMP1:SP:RBV", 0.0)
+
     @parameterized.expand(parameterized_list(INPUTS))
     @skip_if_recsim("Requires lewis backdoor")
     def test_WHEN_input_reading_status_set_via_backdoor_THEN_input_reading_status_updates(
@@ -205,6 +284,48 @@ class Lksh336Tests(unittest.TestCase):
         self.ca.assert_that_pv_is(f"CURVE_{input}:LIM", 2.0)
         self.ca.assert_that_pv_is(f"CURVE_{input}:COEFF", "Positive")
 
+    @parameterized.expand(parameterized_list(INPUTS))
+    @skip_if_recsim("Requires lewis backdoor")
+    def test_WHEN_input_curve_number_set_via_backdoor_THEN_header_of_that_curve_is_read(
+        self, _, input
+    ):
+        self._lewis.backdoor_command(
+            [
+                "device",
+                "set_input_curve_header",
+                str(21),
+                "user".rjust(15, "b"),
+                "sn".rjust(10, "b"),
+                str(2),
+                str(300.0),
+                str(1),
+            ]
+        )
+        self._lewis.backdoor_command(["device", "set_input_curve_number", input, str(21)])
+        try:
+            self.ca.assert_that_pv_is(f"CURVE_{input}:NUM", 21)
+            self.ca.assert_that_pv_is(f"CURVE_{input}:NAME", "user".rjust(15, "b"))
+            self.ca.assert_that_pv_is(f"CURVE_{input}:SERIAL_N", "sn".rjust(10, "b"))
+            self.ca.assert_that_pv_is(f"CURVE_{input}:LIM", 300.0)
+        finally:
+            self._lewis.backdoor_command(["device", "set_input_curve_number", input, str(0)])
+
+    @parameterized.expand(parameterized_list(INPUTS))
+    @skip_if_recsim("Requires lewis backdoor")
+    def test_GIVEN_input_has_curve_WHEN_voltage_set_via_backdoor_THEN_temperature_interpolated(
+        self, _, input
+    ):
+        for index, (units, temperature) in enumerate([(1.0, 300.0), (2.0, 100.0)], 1):
+            self._lewis.backdoor_command(
+                ["device", "set_curve_point", str(22), str(index), str(units), str(temperature)]
+            )
+        self._lewis.backdoor_command(["device", "set_input_curve_number", input, str(22)])
+        try:
+            self._lewis.backdoor_command(["device", "set_input_voltage_input", input, str(1.5)])
+            self.ca.assert_that_pv_is_number(f"TEMP_{input}", 200.0, tolerance=0.001)
+        finally:
+            self._lewis.backdoor_command(["device", "set_input_curve_number", input, str(0)])
+
     @parameterized.expand(parameterized_list(INPUTS))
     @skip_if_recsim("Requires lewis backdoor")
     def test_WHEN_input_type_set_via_backdoor_THEN_input_type_updates(self, _, input):
@@ -217,6 +338,136 @@ class Lksh336Tests(unittest.TestCase):
         self.ca.assert_that_pv_is(f"IN_{input}:COMPENSATION", "On")
         self.ca.assert_that_pv_is(f"IN_{input}:UNITS", "Celcius")
 
+    @parameterized.expand(parameterized_list(OUTPUTS))
+    @skip_if_recsim("Requires lewis backdoor")
+    def test_GIVEN_zones_set_via_backdoor_WHEN_zone_mode_THEN_pid_and_range_follow_setpoint_zone(
+        self, _, output
+    ):
+        zones = [(1, 10.0, 5.0, 1.0, 0.0, 2, "Medium"), (2, 50.0, 20.0, 3.0, 1.0, 3, "High")]
+        for zone, upper_bound, p, i, d, heater_range, _ in zones:
+            self._lewis.backdoor_command(
+                ["device", "set_output_zone", str(output), str(zone), str(upper_bound), str(p)]
+                + [str(i), str(d), str(0.0), str(heater_range), str(0), str(0.0)]
+            )
+        self.addCleanup(self.ca.set_pv_value, f"OUT_MODE{output}:SP", 0)
+        self.ca.set_pv_value(f"OUT_MODE{output}:SP", 2)
+
+        for _, upper_bound, p, i, d, _, range_name in zones:
+            self.ca.set_pv_value(f"TEMP{output}:SP", upper_bound - 1.0)
+            self.ca.assert_that_pv_is(f"P{output}", p)
+            self.ca.assert_that_pv_is(f"I{output}", i)
+            self.ca.assert_that_pv_is(f"D{output}", d)
+            self.ca.assert_that_pv_is(f"HEATER{output}:RANGE", range_name)
+
+    @contextlib.contextmanager
+    def _thermal_simulation(self):
+        self._lewis.backdoor_set_on_device("thermal_simulation", True)
+        try:
+            yield
+        finally:
+            self._lewis.backdoor_set_on_device("thermal_simulation", False)
+
+    @skip_if_recsim("Requires lewis backdoor")
+    def test_GIVEN_thermal_simulation_WHEN_closed_loop_setpoint_set_THEN_temperature_follows(self):
+        self.ca.set_pv_value("OUT_MODE1:SP", 1)
+        self.ca.set_pv_value("CTRL_IN1:SP", 1)
+        self.ca.set_pv_value("HEATER1:RANGE:SP", 3)
+        self.ca.set_pv_value("P1:SP", 50.0)
+        self.ca.set_pv_value("I1:SP", 0.5)
+        self.ca.set_pv_value("D1:SP", 0.0)
+
+        with self._thermal_simulation():
+            self.ca.set_pv_value("TEMP1:SP", 20.0)
+            self.ca.assert_that_pv_is_number("TEMP_A", 20.0, tolerance=0.5, timeout=30)
+            self.ca.assert_that_pv_value_is_greater_than("HEATER1:OUTPUT", 0)
+
+    @skip_if_recsim("Requires lewis backdoor")
+    def test_GIVEN_thermal_simulation_WHEN_autotune_started_THEN_pid_is_tuned(self):
+        self.ca.set_pv_value("OUT_MODE1:SP", 1)
+        self.ca.set_pv_value("CTRL_IN1:SP", 1)
+        self.ca.set_pv_value("HEATER1:RANGE:SP", 2)
+        self.ca.set_pv_value("P1:SP", 1.0)
+        self.ca.set_pv_value("I1:SP", 0.0)
+        self.ca.assert_that_pv_is("P1", 1.0)
+
+        with self._thermal_simulation():
+            self.ca.set_pv_value("AUTOTUNE_MODE1:SP", 1)
+            self.ca.set_pv_value("AUTOTUNE_START1", 1)
+            self.ca.assert_that_pv_is_not("P1", 1.0, timeout=60)
+            self.ca.assert_that_pv_value_is_greater_than("I1", 0)
+
+    @skip_if_recsim("Requires lewis backdoor")
+    def test_WHEN_trace_replayed_via_backdoor_THEN_temperatures_follow_trace(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "trace.csv")
+            with open(path, "w") as trace:
+                trace.write("time,KRDG_A,KRDG_B\n0,1.5,2.5\n1,3.5,4.5\n")
+
+            self._start_replay(path, 10)
+
+            self.ca.assert_that_pv_is("TEMP_A", 3.5)
+            self.ca.assert_that_pv_is("TEMP_B", 4.5)
+
+    @skip_if_recsim("Requires lewis backdoor")
+    def test_WHEN_config_loaded_via_backdoor_THEN_whole_config_updates(self):
+        config = {
+            "outputs": {"1": {"setpoint": 12.5, "p": 40.0, "i": 2.0, "d": 1.0}},
+            "inputs": {
+                "A": {"kelvin_temperature": 4.5, "alarm_enabled": 1, "alarm_high_setpoint": 300.0},
+                "B": {"sensor_name": "stage", "curve_number": 3},
+            },
+        }
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "config.json")
+            with open(path, "w") as config_file:
+                json.dump(config, config_file)
+
+            self._lewis.backdoor_command(["device", "load_config", repr(path)])
+
+        self.ca.assert_that_pv_is("TEMP1:SP:RBV", 12.5)
+        self.ca.assert_that_pv_is("P1", 40.0)
+        self.ca.assert_that_pv_is("I1", 2.0)
+        self.ca.assert_that_pv_is("D1", 1.0)
+        self.ca.assert_that_pv_is("TEMP_A", 4.5)
+        self.ca.assert_that_pv_is("ALARM_A:ON", "Enabled")
+        self.ca.assert_that_pv_is("ALARM_A:HIVAL", 300.0)
+        self.ca.assert_that_pv_is("NAME_B", "stage")
+        self.ca.assert_that_pv_is("CURVE_B:NUM", 3)
+
+    @skip_if_recsim("Requires lewis backdoor")
+    def test_WHEN_snapshot_restored_via_backdoor_THEN_changes_since_it_was_stored_are_undone(self):
+        self._apply_updates(
+            {"outputs": {"1": {"setpoint": 12.5, "p": 40.0}}, "inputs": {"A": {"sensor_name": "a"}}}
+        )
+        self.ca.assert_that_pv_is("TEMP1:SP:RBV", 12.5)
+        self._lewis.backdoor_command(["device", "store_snapshot", "before"])
+
+        self._apply_updates(
+            {"outputs": {"1": {"setpoint": 20.0, "p": 10.0}}, "inputs": {"A": {"sensor_name": "b"}}}
+        )
+        self.ca.assert_that_pv_is("TEMP1:SP:RBV", 20.0)
+        self._lewis.backdoor_command(["device", "restore_snapshot", "before"])
+
+        self.ca.assert_that_pv_is("TEMP1:SP:RBV", 12.5)
+        self.ca.assert_that_pv_is("P1", 40.0)
+        self.ca.assert_that_pv_is("NAME_A", "a")
+
+    @parameterized.expand(parameterized_list(INPUTS))
+    @skip_if_recsim("Requires lewis backdoor")
+    def test_WHEN_reading_status_fault_injected_THEN_alarm_summary_goes_into_alarm_until_it_ends(
+        self, _, input
+    ):
+        self.ca.assert_that_pv_is(f"ALARM_{input}:SUMMARY", "No Alarm")
+
+        # A temperature under range reading status for 10 seconds.
+        self._lewis.backdoor_command(
+            ["device", "schedule_fault", "reading_status", str(0), str(10), input, str(16)]
+        )
+        self.ca.assert_that_pv_is(f"READING_{input}:TEMP_UNDER", "Temp Underrange")
+        self.ca.assert_that_pv_is(f"ALARM_{input}:SUMMARY", "Alarm")
+
+        self.ca.assert_that_pv_is(f"ALARM_{input}:SUMMARY", "No Alarm", timeout=30)
+
     @contextlib.contextmanager
     def _disconnect_device(self):
         self._lewis.backdoor_set_on_device("connected", False)
@@ -235,3 +486,19 @@ class Lksh336Tests(unittest.TestCase):
             self.ca.assert_that_pv_alarm_is(alarm_pv, self.ca.Alarms.INVALID, timeout=30)
 
         self.ca.assert_that_pv_alarm_is(alarm_pv, self.ca.Alarms.NONE, timeout=30)
+
+
+def _test_cases(suite):
+    for test in suite:
+        if isinstance(test, unittest.TestSuite):
+            yield from _test_cases(test)
+        else:
+            yield test
+
+
+def load_tests(loader, tests, pattern):
+    """
+    Keep this worker's share of the cases: every NUM_WORKERS-th case by name, from WORKER.
+    """
+    cases = sorted(_test_cases(tests), key=lambda test: test.id())
+    return unittest.TestSuite(cases[WORKER::NUM_WORKERS])